@@ -0,0 +1,129 @@
+"""Move delivered and cancelled orders older than --months months to the order archive.
+
+Orders are moved in batches of --batch-size, each batch in its own transaction: the orders
+are locked with SKIP LOCKED so that the job never waits on live traffic, copied to
+orderarchive with their items as a JSON array and deleted with their items. The job is
+throttled by sleeping after each batch so that it only works --duty-cycle of the time, and
+stops after --max-orders orders. The API reads the archive when an order is not found in the
+order tables, so the job can run at any time.
+
+Usage:
+    python -m app.commands.archive_orders --months 12
+    python -m app.commands.archive_orders --months 6 --batch-size 200 --duty-cycle 0.1
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date
+from time import perf_counter
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.database import async_engine
+from app.core.partitioning import add_months, month_start
+
+logger = logging.getLogger(__name__)
+
+# No ORDER BY, the scan stops as soon as it found a batch in the partitions before the cutoff
+SELECT_BATCH = """
+    SELECT id, order_date FROM "order"
+    WHERE order_status IN ('delivered', 'cancelled') AND order_date < :cutoff
+    LIMIT :limit FOR UPDATE SKIP LOCKED
+"""
+
+_KEYS = "(SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:dates AS date[])))"
+
+STATEMENTS = [
+    f"""
+    INSERT INTO orderarchive (id, order_date, order_status, shipping_address, cart_id,
+        order_amount, user_id, items, archived_at)
+    SELECT o.id, o.order_date, o.order_status, o.shipping_address, o.cart_id, o.order_amount,
+        o.user_id,
+        COALESCE(
+            (
+                SELECT jsonb_agg(
+                    jsonb_build_object(
+                        'id', oi.id,
+                        'quantity', oi.quantity,
+                        'created_date', oi.created_date,
+                        'product_id', oi.product_id,
+                        'unit_price', oi.unit_price,
+                        'product_name', oi.product_name,
+                        'category_id', oi.category_id
+                    )
+                    ORDER BY oi.id
+                )
+                FROM orderitem oi
+                WHERE oi.order_id = o.id AND oi.order_date = o.order_date
+            ),
+            '[]'::jsonb
+        ),
+        now()
+    FROM "order" o
+    WHERE (o.id, o.order_date) IN {_KEYS}
+    """,
+    f"DELETE FROM orderitem WHERE (order_id, order_date) IN {_KEYS}",
+    f'DELETE FROM "order" WHERE (id, order_date) IN {_KEYS}',
+]
+
+
+def throttle_delay(elapsed: float, duty_cycle: float) -> float:
+    """Return the pause after a batch of elapsed seconds to work duty_cycle of the time."""
+    return elapsed * (1 - duty_cycle) / duty_cycle
+
+
+async def archive_batch(engine: AsyncEngine, cutoff: date, limit: int) -> int:
+    """Archive up to limit orders dated before cutoff, returning their number."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text(SELECT_BATCH), {"cutoff": cutoff, "limit": limit})
+        keys = result.all()
+        if not keys:
+            return 0
+        parameters = {"ids": [key[0] for key in keys], "dates": [key[1] for key in keys]}
+        for statement in STATEMENTS:
+            await conn.execute(text(statement), parameters)
+    return len(keys)
+
+
+async def archive(
+    engine: AsyncEngine, cutoff: date, batch_size: int, duty_cycle: float, max_orders: int | None
+) -> int:
+    """Archive the orders dated before cutoff in throttled batches, returning their number."""
+    archived = 0
+    while max_orders is None or archived < max_orders:
+        limit = batch_size if max_orders is None else min(batch_size, max_orders - archived)
+        began = perf_counter()
+        count = await archive_batch(engine, cutoff, limit)
+        elapsed = perf_counter() - began
+        archived += count
+        if count < limit:
+            break
+        logger.info("Archived %d orders, %d in %.2fs", archived, count, elapsed)
+        await asyncio.sleep(throttle_delay(elapsed, duty_cycle))
+    return archived
+
+
+async def main(args: argparse.Namespace) -> None:
+    cutoff = add_months(month_start(date.today()), -args.months)
+    began = perf_counter()
+    try:
+        count = await archive(
+            async_engine, cutoff, args.batch_size, args.duty_cycle, args.max_orders
+        )
+    finally:
+        await async_engine.dispose()
+    logger.info("Archived %d orders before %s in %.2fs", count, cutoff, perf_counter() - began)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--months", type=int, default=12, help="Months kept in the order tables")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--duty-cycle", type=float, default=0.25, help="Share of time working")
+    parser.add_argument("--max-orders", type=int, help="Stop after archiving that many orders")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,175 @@
+"""Rebuild the sales rollups from the order tables and the order archive.
+
+The date range is split in chunks of --chunk-days which are rebuilt in parallel, each in its
+own transaction. Chunks never share rollup rows since the day is part of every key. A chunk
+runs in repeatable read isolation and is retried when an order written meanwhile touched its
+rows, so the command can run while the application takes orders.
+
+Usage:
+    python -m app.commands.backfill_rollups
+    python -m app.commands.backfill_rollups --start 2024-01-01 --end 2024-12-31 --workers 8
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date, timedelta
+from time import perf_counter
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+SERIALIZATION_FAILURE = "40001"
+MAX_ATTEMPTS = 5
+
+# Orders moved to the archive are still counted, their items are in a JSON array. The date
+# bounds are repeated on the items so that only the partitions of the chunk are scanned. Items
+# keep the price and the category of their product when ordered, the product table is not read
+_ORDER_SOURCE = """(
+    SELECT id, order_date, order_status, order_amount FROM "order"
+    UNION ALL
+    SELECT id, order_date, order_status, order_amount FROM orderarchive
+)"""
+_ITEM_SOURCE = """(
+    SELECT order_id, order_date, product_id, quantity, unit_price, category_id FROM orderitem
+    UNION ALL
+    SELECT a.id, a.order_date, CAST(i->>'product_id' AS integer), CAST(i->>'quantity' AS integer),
+        CAST(i->>'unit_price' AS double precision), CAST(i->>'category_id' AS integer)
+    FROM orderarchive a, jsonb_array_elements(a.items) i
+)"""
+
+_ORDERS = f"""
+    FROM {_ORDER_SOURCE} o
+    JOIN {_ITEM_SOURCE} oi ON oi.order_id = o.id AND oi.order_date = o.order_date
+    WHERE o.order_date >= :start AND o.order_date < :end AND o.order_status != 'cancelled'
+        AND oi.order_date >= :start AND oi.order_date < :end
+"""
+
+# The rebuilt sums go to shard 0, the DELETE removed the other shards of the chunk. Only reached
+# when an order committed after the snapshot of the chunk, which makes repeatable read fail the
+# statement with a serialization error
+_REPLACE = "revenue = EXCLUDED.revenue, order_count = EXCLUDED.order_count, units = EXCLUDED.units"
+
+STATEMENTS = [
+    "DELETE FROM salesdaily WHERE day >= :start AND day < :end",
+    "DELETE FROM salescategorydaily WHERE day >= :start AND day < :end",
+    "DELETE FROM salesproductdaily WHERE day >= :start AND day < :end",
+    f"""
+    WITH units AS (
+        SELECT o.order_date AS day, sum(oi.quantity) AS units
+        FROM {_ORDER_SOURCE} o
+        JOIN {_ITEM_SOURCE} oi ON oi.order_id = o.id AND oi.order_date = o.order_date
+        WHERE o.order_date >= :start AND o.order_date < :end AND o.order_status != 'cancelled'
+            AND oi.order_date >= :start AND oi.order_date < :end
+        GROUP BY o.order_date
+    )
+    INSERT INTO salesdaily (day, shard, revenue, order_count, units)
+    SELECT o.order_date, 0, sum(o.order_amount), count(*), coalesce(min(units.units), 0)
+    FROM {_ORDER_SOURCE} o
+    LEFT JOIN units ON units.day = o.order_date
+    WHERE o.order_date >= :start AND o.order_date < :end AND o.order_status != 'cancelled'
+    GROUP BY o.order_date
+    ON CONFLICT (day, shard) DO UPDATE SET {_REPLACE}
+    """,
+    f"""
+    INSERT INTO salescategorydaily (day, category_id, shard, revenue, order_count, units)
+    SELECT o.order_date, oi.category_id, 0, coalesce(sum(oi.quantity * oi.unit_price), 0),
+        count(DISTINCT o.id), sum(oi.quantity)
+    {_ORDERS}
+        AND oi.category_id IS NOT NULL
+    GROUP BY o.order_date, oi.category_id
+    ON CONFLICT (day, category_id, shard) DO UPDATE SET {_REPLACE}
+    """,
+    f"""
+    INSERT INTO salesproductdaily (day, product_id, shard, revenue, order_count, units)
+    SELECT o.order_date, oi.product_id, 0, coalesce(sum(oi.quantity * oi.unit_price), 0),
+        count(DISTINCT o.id), sum(oi.quantity)
+    {_ORDERS}
+    GROUP BY o.order_date, oi.product_id
+    ON CONFLICT (day, product_id, shard) DO UPDATE SET {_REPLACE}
+    """,
+]
+
+
+def chunks(start: date, end: date, days: int) -> list[tuple[date, date]]:
+    """Split [start, end] in half-open ranges of days."""
+    ranges: list[tuple[date, date]] = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days), end + timedelta(days=1))
+        ranges.append((start, chunk_end))
+        start = chunk_end
+    return ranges
+
+
+async def rebuild_chunk(engine: AsyncEngine, start: date, end: date) -> None:
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+                async with conn.begin():
+                    for statement in STATEMENTS:
+                        await conn.execute(text(statement), {"start": start, "end": end})
+            return
+        except DBAPIError as error:
+            sqlstate = getattr(error.orig, "sqlstate", None)
+            if sqlstate != SERIALIZATION_FAILURE or attempt == MAX_ATTEMPTS:
+                raise
+            logger.info("Retrying rollups of %s to %s after a concurrent order", start, end)
+
+
+async def backfill(
+    engine: AsyncEngine, start: date | None, end: date | None, chunk_days: int, workers: int
+) -> int:
+    """Rebuild the rollups between start and end included, returning the number of chunks."""
+    if start is None or end is None:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"SELECT min(order_date), max(order_date) FROM {_ORDER_SOURCE} o")
+            )
+            first, last = result.one()
+        if first is None:
+            return 0
+        start = start or first
+        end = end or last
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(chunk_start: date, chunk_end: date) -> None:
+        async with semaphore:
+            began = perf_counter()
+            await rebuild_chunk(engine, chunk_start, chunk_end)
+            logger.info(
+                "Rebuilt rollups of %s to %s in %.2fs",
+                chunk_start,
+                chunk_end,
+                perf_counter() - began,
+            )
+
+    ranges = chunks(start, end, chunk_days)
+    await asyncio.gather(*(run(chunk_start, chunk_end) for chunk_start, chunk_end in ranges))
+    return len(ranges)
+
+
+async def main(args: argparse.Namespace) -> None:
+    began = perf_counter()
+    try:
+        count = await backfill(async_engine, args.start, args.end, args.chunk_days, args.workers)
+    finally:
+        await async_engine.dispose()
+    logger.info("Rebuilt %d chunks in %.2fs", count, perf_counter() - began)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--start", type=date.fromisoformat, help="First day, the oldest order")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day, the newest order")
+    parser.add_argument("--chunk-days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=4, help="Chunks rebuilt in parallel")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,223 @@
+"""Rebuild the "frequently bought together" table from the order items, those of the
+archived orders included.
+
+The order items are streamed sorted by order with a binary COPY and decoded with NumPy in
+chunks of --chunk-rows. Each chunk becomes a sparse order by product matrix X and its
+co-occurrences X.T @ X are added to a running sparse matrix. Pairs bought together fewer
+than --min-support times are dropped, the others are normalized with cosine similarity or
+lift and the --top neighbours of each product are stored in the relatedproduct table.
+
+Memory is bounded by the chunk size and the number of product pairs bought together. When
+the pairs do not fit, --blocks splits the products in ranges which are computed in separate
+passes over the order items. The table is replaced in a single transaction, readers keep
+seeing the previous result until the job commits.
+
+Requires the recommendations extra (NumPy and SciPy).
+
+Usage:
+    python -m app.commands.build_related_products --top 20 --measure cosine
+    python -m app.commands.build_related_products --blocks 4 --chunk-rows 2000000
+"""
+
+import argparse
+import asyncio
+import logging
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from scipy import sparse  # type: ignore[import-untyped]
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.database import async_engine, copy_connection
+
+logger = logging.getLogger(__name__)
+
+# Binary COPY rows of two int4 columns: field count, then length and value of each field
+ROW = np.dtype(
+    [
+        ("fields", ">i2"),
+        ("order_length", ">i4"),
+        ("order_id", ">i4"),
+        ("product_length", ">i4"),
+        ("product_id", ">i4"),
+    ]
+)
+HEADER_SIZE = 19
+# Archived orders keep their ids and their items in a JSON array, they count like the others.
+# Their products may have been deleted since, only the products of the matrix are read
+QUERY = """
+    SELECT order_id, product_id FROM (
+        SELECT order_id, product_id FROM orderitem
+        UNION ALL
+        SELECT a.id, CAST(i->>'product_id' AS integer)
+        FROM orderarchive a, jsonb_array_elements(a.items) i
+        WHERE CAST(i->>'product_id' AS integer) IN (SELECT id FROM product)
+    ) items
+    ORDER BY order_id
+"""
+
+IntArray = npt.NDArray[np.int64]
+FloatArray = npt.NDArray[np.float64]
+
+
+class CooccurrenceBuilder:
+    """Count how often the products of [low, high) are bought with every other product."""
+
+    def __init__(self, low: int, high: int, size: int, chunk_rows: int) -> None:
+        self.low = low
+        self.high = high
+        self.size = size
+        self.chunk_rows = chunk_rows
+        self.matrix = sparse.csr_matrix((high - low, size), dtype=np.int32)
+        self.counts: IntArray = np.zeros(size, dtype=np.int64)
+        self.orders = 0
+        self._buffer = bytearray()
+        self._header = False
+        self._carry: tuple[IntArray, IntArray] = (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+        )
+
+    async def feed(self, data: bytes) -> None:
+        self._buffer += data
+        if not self._header:
+            if len(self._buffer) < HEADER_SIZE:
+                return
+            del self._buffer[:HEADER_SIZE]
+            self._header = True
+        if len(self._buffer) >= self.chunk_rows * ROW.itemsize:
+            self._decode(final=False)
+
+    def finish(self) -> None:
+        # Only the 2 bytes of the trailer are left after the last complete row
+        self._decode(final=True)
+
+    def _decode(self, final: bool) -> None:
+        rows = len(self._buffer) // ROW.itemsize
+        records = np.frombuffer(self._buffer, dtype=ROW, count=rows)
+        order_ids = np.concatenate((self._carry[0], records["order_id"].astype(np.int64)))
+        product_ids = np.concatenate((self._carry[1], records["product_id"].astype(np.int64)))
+        del records
+        del self._buffer[: rows * ROW.itemsize]
+        # The items of the last order may continue in the next chunk
+        split = len(order_ids) if final else int(np.searchsorted(order_ids, order_ids[-1]))
+        self._carry = (order_ids[split:], product_ids[split:])
+        self.add(order_ids[:split], product_ids[:split])
+
+    def add(self, order_ids: IntArray, product_ids: IntArray) -> None:
+        """Add complete orders given as parallel arrays of order and product ids."""
+        if not len(order_ids):
+            return
+        orders, order_index = np.unique(order_ids, return_inverse=True)
+        items = sparse.csr_matrix(
+            (np.ones(len(order_ids), dtype=np.int32), (order_index, product_ids)),
+            shape=(len(orders), self.size),
+        )
+        # A product appearing twice in an order counts once
+        items.sum_duplicates()
+        items.data[:] = 1
+        self.orders += len(orders)
+        self.counts += np.asarray(items.sum(axis=0), dtype=np.int64).ravel()
+        block = items[:, slice(self.low, self.high)]
+        self.matrix = self.matrix + (block.T @ items).tocsr()
+
+
+def top_neighbours(
+    matrix: Any,
+    counts: IntArray,
+    orders: int,
+    low: int,
+    top: int,
+    measure: str,
+    min_support: int,
+) -> tuple[IntArray, IntArray, FloatArray, IntArray]:
+    """Return product ids, related product ids, scores and ranks of the best pairs."""
+    pairs = matrix.tocoo()
+    rows = pairs.row.astype(np.int64) + low
+    columns = pairs.col.astype(np.int64)
+    together = pairs.data.astype(np.float64)
+    keep = (rows != columns) & (together >= min_support)
+    rows, columns, together = rows[keep], columns[keep], together[keep]
+    expected = counts[rows].astype(np.float64) * counts[columns]
+    if measure == "lift":
+        scores = together * orders / expected
+    else:
+        scores = together / np.sqrt(expected)
+    # Sort by product then best score first, the rank is the position within the product
+    order = np.lexsort((columns, -scores, rows))
+    rows, columns, scores = rows[order], columns[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else rows
+    ranks = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = ranks < top
+    return rows[keep], columns[keep], scores[keep], ranks[keep]
+
+
+async def build(
+    engine: AsyncEngine,
+    top: int,
+    measure: str,
+    min_support: int,
+    blocks: int,
+    chunk_rows: int,
+) -> int:
+    """Replace the relatedproduct table, returning the number of rows written."""
+    async with engine.connect() as conn:
+        size = ((await conn.execute(text("SELECT max(id) FROM product"))).scalar() or 0) + 1
+    block_size = -(-size // blocks)
+    written = 0
+    async with engine.begin() as writer:
+        await writer.execute(text("DELETE FROM relatedproduct"))
+        target = await copy_connection(writer)
+        for low in range(0, size, block_size):
+            began = perf_counter()
+            builder = CooccurrenceBuilder(low, min(low + block_size, size), size, chunk_rows)
+            async with engine.connect() as reader:
+                source = await copy_connection(reader)
+                await source.copy_from_query(QUERY, output=builder.feed, format="binary")
+            builder.finish()
+            rows, related, scores, ranks = top_neighbours(
+                builder.matrix, builder.counts, builder.orders, low, top, measure, min_support
+            )
+            await target.copy_records_to_table(
+                "relatedproduct",
+                columns=["product_id", "rank", "related_product_id", "score"],
+                records=zip(rows.tolist(), ranks.tolist(), related.tolist(), scores.tolist()),
+            )
+            written += len(rows)
+            logger.info(
+                "Products %d to %d: %d orders, %d pairs, %d rows written in %.2fs",
+                low,
+                builder.high,
+                builder.orders,
+                builder.matrix.nnz,
+                len(rows),
+                perf_counter() - began,
+            )
+    return written
+
+
+async def main(args: argparse.Namespace) -> None:
+    began = perf_counter()
+    try:
+        written = await build(
+            async_engine, args.top, args.measure, args.min_support, args.blocks, args.chunk_rows
+        )
+    finally:
+        await async_engine.dispose()
+    logger.info("Wrote %d related products in %.2fs", written, perf_counter() - began)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--top", type=int, default=20, help="Neighbours kept per product")
+    parser.add_argument("--measure", choices=["cosine", "lift"], default="cosine")
+    parser.add_argument("--min-support", type=int, default=2, help="Minimum orders together")
+    parser.add_argument("--blocks", type=int, default=1, help="Passes over the order items")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,170 @@
+"""Create the monthly partitions of the order tables ahead of time and detach old ones.
+
+The order and orderitem tables are partitioned by month of order_date. Run this command daily:
+it creates the partitions of the current month and of --ahead months after it, so orders never
+land in the default partition. With --retain, partitions of months older than that many months
+are detached and moved to the --schema schema, where they can be dumped and dropped. --explain
+prints the plan of the order listing over a date range, which only scans the partitions of
+the range.
+
+Usage:
+    python -m app.commands.manage_partitions --ahead 3
+    python -m app.commands.manage_partitions --retain 24 --schema archive
+    python -m app.commands.manage_partitions --explain 2024-01-01 2024-02-29
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.database import async_engine
+from app.core.partitioning import (
+    PARTITIONED_TABLES,
+    add_months,
+    default_partition_ddl,
+    month_start,
+    partition_ddl,
+    partition_name,
+)
+from app.models.user import Role, TokenUser
+from app.services.order_service import orders_query
+
+logger = logging.getLogger(__name__)
+
+_MONTH = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+async def partition_months(conn: AsyncConnection, table: str) -> list[date]:
+    """Return the months of the monthly partitions attached to table."""
+    result = await conn.execute(
+        text(
+            """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:table AS regclass)"""
+        ),
+        {"table": f'"{table}"'},
+    )
+    months = []
+    for (name,) in result.all():
+        match = _MONTH.search(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+async def create_partitions(engine: AsyncEngine, first: date, last: date) -> list[str]:
+    """Create the missing partitions of the months from first to last, returning their names."""
+    created = []
+    async with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            await conn.execute(text(default_partition_ddl(table)))
+            existing = set(await partition_months(conn, table))
+            month = month_start(first)
+            while month <= last:
+                if month not in existing:
+                    # Attaching a partition fails when the default partition has rows of its range
+                    result = await conn.execute(
+                        text(
+                            f'SELECT EXISTS (SELECT 1 FROM "{table}_default" '
+                            "WHERE order_date >= :start AND order_date < :end)"
+                        ),
+                        {"start": month, "end": add_months(month, 1)},
+                    )
+                    if result.scalar():
+                        logger.error(
+                            "%s_default has rows of %s, not creating %s",
+                            table,
+                            month,
+                            partition_name(table, month),
+                        )
+                    else:
+                        await conn.execute(text(partition_ddl(table, month)))
+                        created.append(partition_name(table, month))
+                month = add_months(month, 1)
+    return created
+
+
+async def detach_partitions(engine: AsyncEngine, before: date, schema: str) -> list[str]:
+    """Detach the partitions of the months before the month of before into schema."""
+    detached = []
+    async with engine.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+        months = await partition_months(conn, "order")
+        for month in months:
+            if add_months(month, 1) > month_start(before):
+                break
+            # The items go first, a detached item partition keeps its foreign key to the order
+            # table which has to be dropped before the orders of the month can leave it
+            item_table = partition_name("orderitem", month)
+            await conn.execute(text(f'ALTER TABLE orderitem DETACH PARTITION "{item_table}"'))
+            result = await conn.execute(
+                text(
+                    """SELECT conname FROM pg_constraint WHERE contype = 'f'
+                    AND conrelid = CAST(:table AS regclass) AND confrelid = '"order"'::regclass"""
+                ),
+                {"table": f'"{item_table}"'},
+            )
+            for (constraint,) in result.all():
+                await conn.execute(
+                    text(f'ALTER TABLE "{item_table}" DROP CONSTRAINT "{constraint}"')
+                )
+            order_table = partition_name("order", month)
+            await conn.execute(text(f'ALTER TABLE "order" DETACH PARTITION "{order_table}"'))
+            for table in (item_table, order_table):
+                await conn.execute(text(f'ALTER TABLE "{table}" SET SCHEMA "{schema}"'))
+                detached.append(table)
+            # The export marks the orders of the month as removed from the order tables
+            await conn.execute(
+                text(
+                    "INSERT INTO detachedmonth (month, schema_name, detached_at) "
+                    "VALUES (:month, :schema, now())"
+                ),
+                {"month": month, "schema": schema},
+            )
+    return detached
+
+
+async def explain_orders(
+    engine: AsyncEngine, start: date, end: date, user: TokenUser | None = None
+) -> str:
+    """Return the plan of the order listing of user between start and end, admin by default."""
+    user = user or TokenUser(username="", id=0, role=Role.admin)
+    query = orders_query(user, start, end)
+    dialect = postgresql.dialect()  # type: ignore[no-untyped-call]
+    sql = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    async with engine.connect() as conn:
+        result = await conn.execute(text(f"EXPLAIN {sql}"))
+        return "\n".join(line for (line,) in result.all())
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        if args.explain:
+            print(await explain_orders(async_engine, *args.explain))
+            return
+        current = month_start(date.today())
+        created = await create_partitions(async_engine, current, add_months(current, args.ahead))
+        logger.info("Created %d partitions %s", len(created), " ".join(created))
+        if args.retain is not None:
+            before = add_months(current, -args.retain)
+            detached = await detach_partitions(async_engine, before, args.schema)
+            logger.info("Detached %d partitions %s", len(detached), " ".join(detached))
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--ahead", type=int, default=3, help="Months created after this one")
+    parser.add_argument("--retain", type=int, help="Months kept attached before this one")
+    parser.add_argument("--schema", default="archive", help="Schema of detached partitions")
+    parser.add_argument("--explain", type=date.fromisoformat, nargs=2, metavar=("START", "END"))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, Sequence, TypeVar
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BATCH_BUCKETS: tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+batch_size = registry.histogram(
+    "batch_size", "Items processed together by a micro-batcher", ("batcher",), BATCH_BUCKETS
+)
+batch_queue_full = registry.counter(
+    "batch_queue_full_total", "Items rejected because a batcher queue was full", ("batcher",)
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Handlers return one result or exception per item, in the order of the items
+BatchHandler = Callable[[list[T]], Awaitable[Sequence[R | BaseException]]]
+
+
+class BatcherFull(Exception):
+    pass
+
+
+class MicroBatcher(Generic[T, R]):
+    """Group items submitted concurrently and process them together.
+
+    A worker takes the first waiting item and collects more for up to max_wait seconds or
+    until max_batch items, then hands the batch to the handler. While a batch is processed
+    the next one fills up, so the batches grow with the load and the wait only adds latency
+    when the load is low. Each submitter gets the result of its own item.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: BatchHandler[T, R],
+        max_batch: int,
+        max_wait: float,
+        max_queue: int,
+        workers: int = 1,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self._queue: asyncio.Queue[tuple[T, asyncio.Future[R]]] = asyncio.Queue(max_queue)
+        self._tasks: list[asyncio.Task[None]] = []
+        registry.gauge(
+            f"{name}_queue_depth",
+            f"Items waiting in the {name} batcher",
+            function=self._queue.qsize,
+        )
+
+    def enqueue(self, item: T) -> asyncio.Future[R]:
+        """Queue an item and return the future of its result, raise BatcherFull when full."""
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            batch_queue_full.inc((self.name,))
+            raise BatcherFull(self.name)
+        return future
+
+    async def submit(self, item: T) -> R:
+        return await self.enqueue(item)
+
+    async def _collect(self) -> list[tuple[T, asyncio.Future[R]]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _process(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        batch_size.observe(len(batch), (self.name,))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as error:
+            logger.exception("The %s batch handler failed", self.name)
+            results = [error] * len(batch)
+        for (_, future), result in zip(batch, results):
+            self._queue.task_done()
+            # The submitter may have given up waiting
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            await self._process(batch)
+
+    def start(self) -> None:
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers once the items already queued are processed."""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.log import bind_request_stats, release_request_stats
+from app.core.metrics import UNMATCHED_ROUTE, route_template
+
+capture_logger = logging.getLogger("app.capture")
+
+MAX_BODY_SIZE = 64 * 1024
+MAX_QUERY_VALUE_LENGTH = 64
+
+
+def body_shape(value: Any) -> Any:
+    """Replace the strings of a JSON document by their length, keeping its structure.
+
+    Strings are where personal data lives (names, emails, addresses, passwords), numbers and
+    booleans are ids, quantities and prices which replays need to hit the same rows.
+    """
+    if isinstance(value, dict):
+        return {key: body_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [body_shape(item) for item in value]
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    return value
+
+
+def _request_body_shape(content_type: str, body: bytes) -> Any:
+    if not body:
+        return None
+    if content_type.startswith("application/json"):
+        try:
+            return body_shape(json.loads(body))
+        except ValueError:
+            return "<invalid-json>"
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return {"__form__": body_shape(dict(parse_qsl(body.decode("latin-1"))))}
+    return f"<bytes:{len(body)}>"
+
+
+def setup_capture(path: str, max_bytes: int, backups: int) -> QueueListener:
+    """Write captured requests to a rotating file from a background thread."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    capture_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(capture_queue, file_handler)
+    capture_logger.handlers = [QueueHandler(capture_queue)]
+    capture_logger.setLevel(logging.INFO)
+    # Captured requests must not end up in the application log
+    capture_logger.propagate = False
+    listener.start()
+    return listener
+
+
+class CaptureMiddleware:
+    """Record sanitized metadata of requests so that the traffic can be replayed later.
+
+    Each line holds the time, route template, method, path parameters, query parameters, the
+    shape of the body, the role and id of the user and the duration. Headers, and therefore
+    tokens, are never recorded.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (
+            self.sample_rate < 1 and random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks: list[bytes] = []
+        body_size = [0]
+        status_code = [500]
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                body: bytes = message.get("body", b"")
+                body_size[0] += len(body)
+                if body_size[0] <= MAX_BODY_SIZE:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        stats, token = bind_request_stats()
+        timestamp = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            release_request_stats(token)
+            route = route_template(scope)
+            if route != UNMATCHED_ROUTE:
+                content_type = ""
+                for name, value in scope["headers"]:
+                    if name == b"content-type":
+                        content_type = value.decode("latin-1")
+                        break
+                shape = (
+                    _request_body_shape(content_type, b"".join(chunks))
+                    if body_size[0] <= MAX_BODY_SIZE
+                    else f"<bytes:{body_size[0]}>"
+                )
+                query = {
+                    key: value[:MAX_QUERY_VALUE_LENGTH]
+                    for key, value in parse_qsl(scope["query_string"].decode("latin-1"))
+                }
+                record = {
+                    "ts": round(timestamp, 6),
+                    "method": scope["method"],
+                    "route": route,
+                    "path_params": scope.get("path_params", {}),
+                    "query": query,
+                    "body": shape,
+                    "role": stats.role,
+                    "user_id": stats.user_id,
+                    "status": status_code[0],
+                    "duration_ms": round(duration * 1000, 3),
+                }
+                capture_logger.info(json.dumps(record, separators=(",", ":"), default=str))
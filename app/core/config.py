@@ -11,12 +11,67 @@ class Config:
     db_username: str
     db_password: str
     db_name: str
+    db_echo: bool
+    log_level: str
+    access_log_enabled: bool
+    sql_log_sample_rate: float
+    sql_slow_threshold: float
+    metrics_enabled: bool
+    profiling_enabled: bool
+    profile_dir: str
+    profile_ring_size: int
+    profile_sample_rate: float
+    loop_monitor_enabled: bool
+    loop_monitor_interval: float
+    loop_lag_threshold: float
+    capture_enabled: bool
+    capture_file: str
+    capture_max_bytes: int
+    capture_backups: int
+    capture_sample_rate: float
+    tracing_enabled: bool
+    trace_sample_rate: float
+    trace_export_file: str
+    trace_export_url: str
+    trace_batch_size: int
+    trace_flush_interval: float
+    popularity_flush_interval: float
+    popularity_top_k: int
+    sse_max_connections: int
+    sse_heartbeat_interval: float
+    sse_queue_size: int
+    checkout_batching: bool
+    checkout_batch_size: int
+    checkout_batch_wait: float
+    checkout_queue_size: int
+    checkout_ticket_ttl: float
+    rollup_shards: int
+    cart_coalescing: bool
+    cart_coalesce_size: int
+    cart_coalesce_wait: float
+    cart_queue_size: int
+    export_enabled: bool
+    cart_sweep_enabled: bool
+    cart_ttl_days: float
+    cart_sweep_interval: float
+    cart_sweep_batch: int
+    export_dir: str
+    export_batch_rows: int
+    export_lag: float
+    db_retry_attempts: int
+    db_retry_base_delay: float
+    db_retry_max_delay: float
+    db_retry_budget_ratio: float
+    db_retry_budget_capacity: float
+    request_timeout: float
+    route_timeouts: dict[str, float]
+    deadline_grace: float
 
 
 def read_config_file(filename: str) -> Config:
     filepath = os.path.join(os.path.dirname(__file__), f"../../{filename}")
     with open(filepath, "r") as file:
-        data: dict[str, str] = json.load(file)
+        data: dict[str, Any] = json.load(file)
     config = Config()
     config.secret_key = data.get("secret_key", "Secretkey")
     config.algorithm = data.get("algorithm", "HS256")
@@ -25,6 +80,63 @@ def read_config_file(filename: str) -> Config:
     config.db_username = data.get("db_username", "postgres")
     config.db_password = data.get("db_password", "password")
     config.db_name = data.get("db_name", "ecommerce")
+    config.db_echo = bool(data.get("db_echo", False))
+    config.log_level = data.get("log_level", "INFO")
+    config.access_log_enabled = bool(data.get("access_log_enabled", True))
+    config.sql_log_sample_rate = float(data.get("sql_log_sample_rate", 0.01))
+    config.sql_slow_threshold = float(data.get("sql_slow_threshold", 0.1))
+    config.metrics_enabled = bool(data.get("metrics_enabled", True))
+    config.profiling_enabled = bool(data.get("profiling_enabled", False))
+    config.profile_dir = data.get("profile_dir", "profiles")
+    config.profile_ring_size = int(data.get("profile_ring_size", 20))
+    config.profile_sample_rate = float(data.get("profile_sample_rate", 0.0))
+    config.loop_monitor_enabled = bool(data.get("loop_monitor_enabled", False))
+    config.loop_monitor_interval = float(data.get("loop_monitor_interval", 0.1))
+    config.loop_lag_threshold = float(data.get("loop_lag_threshold", 0.2))
+    config.capture_enabled = bool(data.get("capture_enabled", False))
+    config.capture_file = data.get("capture_file", "capture/traffic.jsonl")
+    config.capture_max_bytes = int(data.get("capture_max_bytes", 50 * 1024 * 1024))
+    config.capture_backups = int(data.get("capture_backups", 5))
+    config.capture_sample_rate = float(data.get("capture_sample_rate", 1.0))
+    config.tracing_enabled = bool(data.get("tracing_enabled", False))
+    config.trace_sample_rate = float(data.get("trace_sample_rate", 0.01))
+    config.trace_export_file = data.get("trace_export_file", "traces.jsonl")
+    config.trace_export_url = data.get("trace_export_url", "")
+    config.trace_batch_size = int(data.get("trace_batch_size", 512))
+    config.trace_flush_interval = float(data.get("trace_flush_interval", 1.0))
+    config.popularity_flush_interval = float(data.get("popularity_flush_interval", 30.0))
+    config.popularity_top_k = int(data.get("popularity_top_k", 100))
+    config.sse_max_connections = int(data.get("sse_max_connections", 1000))
+    config.sse_heartbeat_interval = float(data.get("sse_heartbeat_interval", 15.0))
+    config.sse_queue_size = int(data.get("sse_queue_size", 32))
+    config.checkout_batching = bool(data.get("checkout_batching", False))
+    config.checkout_batch_size = int(data.get("checkout_batch_size", 100))
+    config.checkout_batch_wait = float(data.get("checkout_batch_wait", 0.005))
+    config.checkout_queue_size = int(data.get("checkout_queue_size", 10000))
+    config.checkout_ticket_ttl = float(data.get("checkout_ticket_ttl", 600.0))
+    config.rollup_shards = max(1, int(data.get("rollup_shards", 16)))
+    config.cart_coalescing = bool(data.get("cart_coalescing", False))
+    config.cart_coalesce_size = int(data.get("cart_coalesce_size", 200))
+    config.cart_coalesce_wait = float(data.get("cart_coalesce_wait", 0.005))
+    config.cart_queue_size = int(data.get("cart_queue_size", 10000))
+    config.export_enabled = bool(data.get("export_enabled", False))
+    config.cart_sweep_enabled = bool(data.get("cart_sweep_enabled", True))
+    config.cart_ttl_days = float(data.get("cart_ttl_days", 30.0))
+    config.cart_sweep_interval = float(data.get("cart_sweep_interval", 3600.0))
+    config.cart_sweep_batch = int(data.get("cart_sweep_batch", 1000))
+    config.export_dir = data.get("export_dir", "export")
+    config.export_batch_rows = int(data.get("export_batch_rows", 100000))
+    config.export_lag = float(data.get("export_lag", 300.0))
+    config.db_retry_attempts = int(data.get("db_retry_attempts", 4))
+    config.db_retry_base_delay = float(data.get("db_retry_base_delay", 0.01))
+    config.db_retry_max_delay = float(data.get("db_retry_max_delay", 0.2))
+    config.db_retry_budget_ratio = float(data.get("db_retry_budget_ratio", 0.1))
+    config.db_retry_budget_capacity = float(data.get("db_retry_budget_capacity", 20.0))
+    config.request_timeout = float(data.get("request_timeout", 10.0))
+    # "METHOD /path/template" to seconds, 0 for no deadline. The event stream stays open
+    route_timeouts = {"GET /order/events": 0.0, **data.get("route_timeouts", {})}
+    config.route_timeouts = {route: float(seconds) for route, seconds in route_timeouts.items()}
+    config.deadline_grace = float(data.get("deadline_grace", 1.0))
     return config
 
 
@@ -1,19 +1,65 @@
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, cast
 
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import QueuePool
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import config
+from app.core.deadline import DeadlineQueuePool, apply_statement_timeout
+from app.core.metrics import registry
 
 db_connection_str = f"postgresql+asyncpg://{config.db_username}:{config.db_password}@\
 {config.db_host}:{config.db_port}/{config.db_name}"
-async_engine = create_async_engine(db_connection_str, echo=True)
+async_engine = create_async_engine(
+    db_connection_str, echo=config.db_echo, poolclass=DeadlineQueuePool
+)
+
+
+def _pool() -> QueuePool:
+    # The engine creates a new pool when it is disposed, so always look it up from the engine
+    return cast(QueuePool, async_engine.pool)
+
+
+registry.gauge(
+    "db_pool_size", "Configured size of the connection pool", function=lambda: _pool().size()
+)
+registry.gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    function=lambda: _pool().checkedout(),
+)
+registry.gauge(
+    "db_pool_checked_in",
+    "Idle connections available in the pool",
+    function=lambda: _pool().checkedin(),
+)
+registry.gauge(
+    "db_pool_overflow",
+    "Connections opened beyond the pool size",
+    function=lambda: _pool().overflow(),
+)
+
+
+async_session_maker = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Each transaction of a request only runs until the deadline of the request
+event.listen(AsyncSession.sync_session_class, "after_begin", apply_statement_timeout)
 
 
 # Get asynchroneous session for database
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session = async_sessionmaker(
-        bind=async_engine, class_=AsyncSession, expire_on_commit=False
-    )
-    async with async_session() as session:
+    async with async_session_maker() as session:
         yield session
+
+
+async def copy_connection(conn: AsyncConnection) -> Any:
+    # The asyncpg connection behind the SQLAlchemy one, for the COPY protocol
+    raw = await conn.get_raw_connection()
+    return raw.driver_connection
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import registry, route_template
+from app.core.tracing import TracedAsyncQueuePool
+
+logger = logging.getLogger(__name__)
+
+# query_canceled, raised by Postgres when a statement runs past the statement_timeout
+QUERY_CANCELED = "57014"
+
+deadline_exceeded = registry.counter(
+    "request_deadline_exceeded_total",
+    "Requests answered 504 because their time budget ran out",
+    ("route",),
+)
+
+# time.monotonic() at which the work of the current request has to stop
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining() -> float | None:
+    """Return the seconds left to the current request, None when it has no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Run the block with a deadline in seconds, or within the current one when it is earlier."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def apply_statement_timeout(session: Any, transaction: Any, connection: Any) -> None:
+    """Limit the statements of a session transaction to the time left to the request.
+
+    Registered as an after_begin listener of the sessions. set_config with is_local is SET
+    LOCAL as a function, it can take a parameter and only lasts until the transaction ends, so
+    the pooled connection gets its default timeout back.
+    """
+    budget = remaining()
+    if budget is None:
+        return
+    if budget <= 0:
+        raise DeadlineExceeded()
+    connection.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": f"{max(1, int(budget * 1000))}ms"},
+    )
+
+
+class DeadlineQueuePool(TracedAsyncQueuePool):
+    """Connection pool waiting for a connection at most until the deadline of the request.
+
+    QueuePool has no timeout per checkout, it waits for the timeout it stores in _timeout. That
+    attribute is computed from the deadline instead, SQLAlchemy is pinned to the 2.0 series and
+    test_pool_checkout_deadline checks the behaviour on a pool that is exhausted.
+    """
+
+    @property
+    def _timeout(self) -> float:
+        budget = remaining()
+        if budget is None:
+            return self._pool_timeout
+        return max(0.0, min(self._pool_timeout, budget))
+
+    @_timeout.setter
+    def _timeout(self, value: float) -> None:
+        self._pool_timeout = value
+
+
+def _is_timeout(error: BaseException) -> bool:
+    if isinstance(error, DBAPIError):
+        return getattr(error.orig, "sqlstate", None) == QUERY_CANCELED
+    return isinstance(error, (asyncio.TimeoutError, DeadlineExceeded, PoolTimeoutError))
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware running each request within the time budget of its route.
+
+    The deadline is kept in a context variable: transactions limit their statements to the
+    time left and the pool waits for a connection at most that long, so the database cancels
+    the work. The request itself is cancelled grace seconds after the deadline, in case it
+    waits on something else. Either way the client gets a 504 unless the response started.
+    Routes given a budget of 0 have no deadline.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: list[BaseRoute],
+        default: float,
+        timeouts: dict[str, float],
+        grace: float,
+    ) -> None:
+        self.app = app
+        self.routes = routes
+        self.default = default
+        self.timeouts = timeouts
+        self.grace = grace
+        self._budgets: list[tuple[BaseRoute, float]] | None = None
+
+    def _route_budgets(self) -> list[tuple[BaseRoute, float]]:
+        # Resolved on the first request, once all the routers are included
+        budgets = []
+        for key, seconds in self.timeouts.items():
+            method, _, path = key.partition(" ")
+            routes = [
+                route
+                for route in self.routes
+                if getattr(route, "path", None) == path
+                and method in (getattr(route, "methods", None) or ())
+            ]
+            if not routes:
+                logger.warning("No route %s for its timeout", key)
+            budgets += [(route, seconds) for route in routes]
+        return budgets
+
+    def budget(self, scope: Scope) -> float:
+        """Return the time budget in seconds of the route of the request."""
+        if self._budgets is None:
+            self._budgets = self._route_budgets()
+        for route, seconds in self._budgets:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return seconds
+        return self.default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = self.budget(scope)
+        if budget <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            with deadline_scope(budget):
+                await asyncio.wait_for(self.app(scope, receive, send_wrapper), budget + self.grace)
+        except Exception as error:
+            if not _is_timeout(error):
+                raise
+            route = route_template(scope)
+            deadline_exceeded.inc((route,))
+            logger.warning("%s %s exceeded its budget of %.1fs", scope["method"], route, budget)
+            if not started:
+                response = JSONResponse({"detail": "Deadline exceeded"}, status_code=504)
+                await response(scope, receive, send)
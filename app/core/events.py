@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from typing import Any, AsyncIterator
+
+import asyncpg  # type: ignore[import-untyped]
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+events_dropped = registry.counter(
+    "events_dropped_total", "Events not delivered because a subscriber queue was full"
+)
+
+RECONNECT_DELAY = 5.0
+
+
+class Subscription:
+    """Events of one user (None for all users), optionally of a single order."""
+
+    def __init__(self, user_id: int | None, order_id: int | None, queue_size: int) -> None:
+        self.user_id = user_id
+        self.order_id = order_id
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(queue_size)
+        # Set when an event was dropped, the stream then ends so the client reloads the state
+        self.overflowed = False
+
+
+class EventBroker:
+    """In-process publish/subscribe of per-user events, bridged across workers by LISTEN/NOTIFY.
+
+    Publishers add a pg_notify to their transaction with notify() and call publish() after
+    committing. Subscribers of this process get the event right away, the other processes
+    receive the notification on their listening connection once the transaction commits.
+    Notifications carry the id of the sending process which ignores its own.
+    """
+
+    def __init__(self, channel: str, max_subscribers: int, queue_size: int) -> None:
+        self.channel = channel
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.origin = uuid.uuid4().hex
+        self._subscribers: dict[int | None, set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, user_id: int | None, order_id: int | None = None) -> Subscription | None:
+        """Return a new subscription, or None when the process has too many subscribers."""
+        if self.full:
+            return None
+        subscription = Subscription(user_id, order_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def publish(self, event: dict[str, Any]) -> None:
+        """Deliver an event with user_id and order_id keys to the subscribers of this process."""
+        for key in (event["user_id"], None):
+            for subscription in self._subscribers.get(key, ()):
+                if subscription.order_id is not None and subscription.order_id != event["order_id"]:
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    events_dropped.inc()
+
+    async def notify(self, db: AsyncSession, event: dict[str, Any]) -> None:
+        """Send the event to the other processes when the transaction of db commits."""
+        payload = json.dumps({**event, "origin": self.origin}, default=str)
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": self.channel, "payload": payload},
+        )
+
+    def _on_notification(self, _: Any, __: int, ___: str, payload: str) -> None:
+        event: dict[str, Any] = json.loads(payload)
+        if event.pop("origin", None) != self.origin:
+            self.publish(event)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    host=config.db_host,
+                    port=int(config.db_port),
+                    user=config.db_username,
+                    password=config.db_password,
+                    database=config.db_name,
+                )
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("Failed to connect the %s listener", self.channel)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                await connection.add_listener(self.channel, self._on_notification)
+                # Notifications arrive through the callback, only watch for a lost connection
+                while not connection.is_closed():
+                    await asyncio.sleep(RECONNECT_DELAY)
+                logger.warning("Lost the %s listener connection, reconnecting", self.channel)
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("The %s listener failed, reconnecting", self.channel)
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+async def event_stream(
+    broker: EventBroker,
+    user_id: int | None,
+    order_id: int | None,
+    initial: dict[str, Any] | None,
+    heartbeat: float,
+) -> AsyncIterator[str]:
+    """Format the events of a subscription as Server-Sent Events until the client leaves.
+
+    The subscription is made when the response starts streaming, so that it is always
+    released by the generator. A comment line is sent when no event arrived for heartbeat
+    seconds, keeping proxies from closing the connection and detecting dead clients. A client
+    too slow to keep up gets an overflow event and the stream ends, it should reconnect and
+    read the current state.
+    """
+    subscription = broker.subscribe(user_id, order_id)
+    if subscription is None:
+        yield "event: overflow\ndata: {}\n\n"
+        return
+    if initial is not None:
+        subscription.queue.put_nowait(initial)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps(event, default=str)}\n\n"
+            if subscription.overflowed and subscription.queue.empty():
+                yield "event: overflow\ndata: {}\n\n"
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+order_events = EventBroker("order_events", config.sse_max_connections, config.sse_queue_size)
+
+registry.gauge(
+    "sse_connections",
+    "Open Server-Sent Events streams of this process",
+    function=lambda: order_events.subscriber_count,
+)
@@ -0,0 +1,214 @@
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+from app.core.metrics import route_template
+from app.core.tracing import current_span
+
+access_logger = logging.getLogger("app.access")
+sql_logger = logging.getLogger("app.sql")
+
+# Attributes of every LogRecord, anything else was passed through "extra"
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+MAX_STATEMENT_LENGTH = 2048
+
+
+@dataclass
+class RequestStats:
+    """Statistics of the current request, shared with dependencies and database events."""
+
+    user_id: int | None = None
+    role: str | None = None
+    db_time: float = 0.0
+    db_queries: int = 0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def request_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+def bind_request_stats() -> tuple[RequestStats, Token[RequestStats | None] | None]:
+    """Return the stats of the current request, starting them if no middleware did yet.
+
+    The token is only returned when new stats were bound, to be reset by the caller.
+    """
+    stats = _request_stats.get()
+    if stats is not None:
+        return stats, None
+    stats = RequestStats()
+    return stats, _request_stats.set(stats)
+
+
+def release_request_stats(token: Token[RequestStats | None] | None) -> None:
+    if token is not None:
+        _request_stats.reset(token)
+
+
+def record_user(user_id: int, role: str) -> None:
+    # Dependencies may run in a worker thread with a copy of the context, the stats object
+    # itself is shared so the update is still seen by the access log
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.user_id = user_id
+        stats.role = role
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including the fields passed in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments on the calling thread, the JSON formatting is left to the
+        # listener thread. Exception info stays as is since the queue never leaves the process.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def setup_logging(level: str) -> QueueListener:
+    """Send all records through a queue to a background thread writing JSON lines to stdout.
+
+    Logging calls from the event loop then only cost a queue put, the formatting and the
+    blocking write happen in the listener thread.
+    """
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    return listener
+
+
+def _before_cursor_execute(conn: Connection, *args: Any, **kwargs: Any) -> None:
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, *args: Any
+) -> None:
+    starts: list[float] | None = conn.info.get("query_start")
+    if not starts:
+        return
+    duration = perf_counter() - starts.pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_time += duration
+        stats.db_queries += 1
+    # Slow statements are always logged, the others only at the configured sample rate
+    if duration >= config.sql_slow_threshold:
+        level = logging.WARNING
+    elif config.sql_log_sample_rate > 0 and random.random() < config.sql_log_sample_rate:
+        level = logging.INFO
+    else:
+        return
+    sql_logger.log(
+        level,
+        "SQL statement",
+        extra={
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "duration_ms": round(duration * 1000, 3),
+            "slow": level == logging.WARNING,
+        },
+    )
+
+
+def _handle_error(context: Any) -> None:
+    conn: Connection | None = context.connection
+    starts: list[float] | None = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_sql_logging(engine: Engine) -> None:
+    """Time the statements of the engine for the access log and log a sample of them."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class AccessLogMiddleware:
+    """Write one access log record per request with its route, user and database usage."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        status_code = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        token = _request_stats.set(stats)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = perf_counter() - start
+            _request_stats.reset(token)
+            span = current_span()
+            access_logger.info(
+                "%s %s %d",
+                scope["method"],
+                scope["path"],
+                status_code[0],
+                extra={
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "path": scope["path"],
+                    "status": status_code[0],
+                    "duration_ms": round(duration * 1000, 3),
+                    "user_id": stats.user_id,
+                    "role": stats.role,
+                    "db_time_ms": round(stats.db_time * 1000, 3),
+                    "db_queries": stats.db_queries,
+                    "trace_id": span.trace_id if span is not None else None,
+                },
+            )
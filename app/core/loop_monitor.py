@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.core.config import config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and its execution", (), LAG_BUCKETS
+)
+event_loop_blocked = registry.counter(
+    "event_loop_blocked_total", "Times the event loop was blocked longer than the threshold"
+)
+
+
+class LoopMonitor:
+    """Measure event loop scheduling lag and log the stack of the code blocking the loop.
+
+    A task on the loop sleeps for a fixed interval and records how late it wakes up. It also
+    updates a heartbeat, which a watchdog thread checks: while the loop is blocked the task
+    cannot run, so the thread captures the loop thread's stack with sys._current_frames and
+    logs the code path holding the loop.
+    """
+
+    def __init__(self, interval: float, threshold: float) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, loop.time() - expected))
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported = False
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked <= self.threshold:
+                reported = False
+                continue
+            # Report each stall once, with the stack at the time the threshold was crossed
+            if reported or self._loop_thread_id is None:
+                continue
+            reported = True
+            event_loop_blocked.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>\n"
+            logger.warning("Event loop blocked for %.3fs, loop thread stack:\n%s", blocked, stack)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._thread is not None:
+            self._thread.join()
+        self._task = None
+        self._thread = None
+
+
+loop_monitor = LoopMonitor(config.loop_monitor_interval, config.loop_lag_threshold)
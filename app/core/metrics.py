@@ -0,0 +1,318 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+Labels = tuple[str, ...]
+
+# Latency buckets in seconds, tuned for an API that should answer in tens of milliseconds
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS: tuple[float, ...] = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """Base class of the metrics, values are kept per tuple of label values.
+
+    Metrics are updated from the event loop without locking: a single update is a dict lookup
+    and an addition, so recording a request costs well under a microsecond.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Return the lines of the metric in the Prometheus text format."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in list(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        function: Callable[[], float] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        # A gauge backed by a function is evaluated only when the metrics are scraped
+        self._function = function
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> list[str]:
+        if self._function is not None:
+            self._values[()] = self._function()
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: one count per bucket plus +Inf, followed by the sum of observations
+        self._values: dict[Labels, list[float]] = {}
+
+    def state(self, labels: Labels = ()) -> list[float]:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        return state
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        state = self.state(labels)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        state = self._values.get(labels)
+        return int(sum(state[:-1])) if state else 0
+
+    def samples(self) -> list[str]:
+        lines: list[str] = []
+        names = self.labelnames + ("le",)
+        for labels, state in list(self._values.items()):
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += bucket_count
+                label_str = _format_labels(names, labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{label_str} {_format_value(cumulative)}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_str} {_format_value(cumulative)}")
+        return lines
+
+
+class HistogramCounter(Metric):
+    """Counter exported from the number of observations of a histogram.
+
+    Saves a separate update on hot paths that already observe the histogram.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, histogram: Histogram) -> None:
+        super().__init__(name, documentation, histogram.labelnames)
+        self.histogram = histogram
+
+    def value(self, labels: Labels = ()) -> float:
+        return self.histogram.count(labels)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(sum(state[:-1]))}"
+            for labels, state in list(self.histogram._values.items())
+        ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.register(metric)
+        return metric
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        function: Callable[[], float] | None = None,
+    ) -> Gauge:
+        metric = Gauge(name, documentation, labelnames, function)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+
+registry = Registry()
+
+# HTTP metrics, labelled by route template instead of raw path to keep cardinality bounded
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+http_requests = HistogramCounter(
+    "http_requests_total", "Total HTTP requests", http_request_duration
+)
+registry.register(http_requests)
+http_request_size = registry.histogram(
+    "http_request_size_bytes", "HTTP request body size", ("method", "route", "status"), SIZE_BUCKETS
+)
+http_response_size = registry.histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    ("method", "route", "status"),
+    SIZE_BUCKETS,
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)
+)
+
+# Service level metrics
+orders_created = registry.counter("orders_created_total", "Orders created")
+carts_created = registry.counter("carts_created_total", "Carts created")
+login_failures = registry.counter("login_failures_total", "Failed login attempts")
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    """Return the path template of the route matched for the request, e.g. /order/order/{order_id}.
+
+    The router stores the matched route in the scope, requests that match no route are grouped
+    together so that random paths cannot create new time series.
+    """
+    route = scope.get("route")
+    path: str | None = getattr(route, "path", None)
+    return path if path is not None else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count, latency, sizes and in-flight requests.
+
+    The histogram states of each label set are cached together, so a finished request costs a
+    single dict lookup followed by three bucket increments.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._states: dict[Labels, tuple[list[float], list[float], list[float]]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method: str = scope["method"]
+        in_flight_labels = (method,)
+        sizes = [0, 0]
+        status_code = [500]
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes[0] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes[1] += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc(in_flight_labels)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = perf_counter() - start
+            http_requests_in_flight.dec(in_flight_labels)
+            labels = (method, route_template(scope), str(status_code[0]))
+            states = self._states.get(labels)
+            if states is None:
+                states = self._states[labels] = (
+                    http_request_duration.state(labels),
+                    http_request_size.state(labels),
+                    http_response_size.state(labels),
+                )
+            duration_state, request_state, response_state = states
+            duration_state[bisect_left(http_request_duration.buckets, duration)] += 1
+            duration_state[-1] += duration
+            request_state[bisect_left(SIZE_BUCKETS, sizes[0])] += 1
+            request_state[-1] += sizes[0]
+            response_state[bisect_left(SIZE_BUCKETS, sizes[1])] += 1
+            response_state[-1] += sizes[1]
@@ -0,0 +1,37 @@
+import re
+from datetime import date
+
+# Tables partitioned by month of order_date, orderitem carries a copy of the date of its order
+PARTITIONED_TABLES = ("order", "orderitem")
+
+_PARTITION_NAME = re.compile(r"^(order|orderitem)_(y\d{4}m\d{2}|default)$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def is_partition(name: str) -> bool:
+    return _PARTITION_NAME.match(name) is not None
+
+
+def partition_ddl(table: str, month: date) -> str:
+    """Return the statement creating the partition of table for the month starting at month."""
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+
+
+def default_partition_ddl(table: str) -> str:
+    # Rows outside of the monthly partitions, e.g. backdated orders, land in the default one
+    return f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'
@@ -0,0 +1,128 @@
+import asyncio
+import cProfile
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from itertools import islice
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import config
+from app.core.metrics import route_template
+from app.services.auth_service import get_admin_user, get_current_user
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY = "profile"
+PROFILE_SUFFIX = ".pstats"
+# Values of the header and the query flag asking for a profile, anything else is ignored
+PROFILE_VALUES = frozenset({"1", "true", "yes", "on"})
+_name_pattern = re.compile(r"^[\w.-]+\.pstats$")
+
+
+@dataclass
+class ProfileInfo:
+    name: str
+    size: int
+    created: float
+
+
+class ProfileRing:
+    """Bounded directory of pstats files, the oldest profiles are removed first."""
+
+    def __init__(self, directory: str, size: int) -> None:
+        self.directory = directory
+        self.size = size
+
+    def save(self, profiler: cProfile.Profile, method: str, route: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^\w-]+", "_", route).strip("_") or "root"
+        name = f"{time.time_ns()}-{method}-{slug}{PROFILE_SUFFIX}"
+        profiler.dump_stats(os.path.join(self.directory, name))
+        self.prune()
+        return name
+
+    def prune(self) -> None:
+        for profile in islice(self.list(), self.size, None):
+            try:
+                os.remove(os.path.join(self.directory, profile.name))
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> list[ProfileInfo]:
+        """Return the stored profiles, most recent first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles: list[ProfileInfo] = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+                    stat = entry.stat()
+                    profiles.append(ProfileInfo(entry.name, stat.st_size, stat.st_mtime))
+        return sorted(profiles, key=lambda profile: profile.name, reverse=True)
+
+    def path(self, name: str) -> str | None:
+        # Only plain file names from the ring can be downloaded, never arbitrary paths
+        if not _name_pattern.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+profile_ring = ProfileRing(config.profile_dir, config.profile_ring_size)
+
+
+def _is_admin_request(headers: Headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        get_admin_user(get_current_user(token))
+    except HTTPException:
+        return False
+    return True
+
+
+class ProfilingMiddleware:
+    """Run requests under cProfile when asked by an admin or picked by the global sample rate.
+
+    Only installed when profiling is enabled in the config, so it costs nothing otherwise.
+    cProfile traces the whole event loop thread, a profile may therefore also contain frames of
+    requests running concurrently, and only one request is profiled at a time.
+    """
+
+    def __init__(self, app: ASGIApp, ring: ProfileRing, sample_rate: float) -> None:
+        self.app = app
+        self.ring = ring
+        self.sample_rate = sample_rate
+        self._active = False
+
+    def _should_profile(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        flag = headers.get(PROFILE_HEADER)
+        if flag is None and PROFILE_QUERY.encode() in scope["query_string"]:
+            flag = QueryParams(scope["query_string"]).get(PROFILE_QUERY)
+        requested = flag is not None and flag.strip().lower() in PROFILE_VALUES
+        if requested:
+            return _is_admin_request(headers)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._active or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+            self._active = False
+            await asyncio.to_thread(
+                self.ring.save, profiler, scope["method"], route_template(scope)
+            )
@@ -0,0 +1,384 @@
+import asyncio
+import enum
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, TypeVar, cast
+
+import fastapi.routing
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+from app.core.metrics import registry, route_template
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACEPARENT_HEADER = b"traceparent"
+SERVICE_NAME = "ecommerce-api"
+MAX_STATEMENT_LENGTH = 1024
+
+spans_dropped = registry.counter(
+    "trace_spans_dropped_total", "Spans dropped because the export queue was full"
+)
+
+
+class SpanKind(int, enum.Enum):
+    # Values of the OTLP SpanKind enumeration
+    internal = 1
+    server = 2
+    client = 3
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    kind: SpanKind = SpanKind.internal
+    start: int = field(default_factory=time.time_ns)
+    end: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def finish(self) -> None:
+        self.end = time.time_ns()
+        span_exporter.export(self)
+
+    def to_otlp(self) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": int(self.kind),
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end or self.start),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def parse_traceparent(value: str) -> tuple[str, str, bool] | None:
+    """Parse a W3C traceparent header into trace id, parent span id and sampled flag."""
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    # Version 00 has exactly four fields, later versions may append more
+    if version == "00" and len(parts) != 4:
+        return None
+    if len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(parent_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id.lower(), parent_id.lower(), sampled
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def should_sample(trace_id: str, rate: float) -> bool:
+    # Decide from the trace id so that every service sampling at the same rate agrees
+    return int(trace_id[16:], 16) < rate * 2**64
+
+
+@contextmanager
+def start_span(
+    name: str, kind: SpanKind = SpanKind.internal, attributes: dict[str, Any] | None = None
+) -> Iterator[Span | None]:
+    """Start a child of the current span, does nothing outside of a sampled request."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(name, parent.trace_id, _new_span_id(), parent.span_id, kind)
+    if attributes:
+        span.attributes.update(attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.finish()
+
+
+def traced(name: str | None = None) -> Callable[[F], F]:
+    """Decorate a function, sync or async, to run it in a span named after the function."""
+
+    def decorator(func: F) -> F:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with start_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return cast(F, async_wrapper)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(span_name):
+                return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+class BatchSpanExporter:
+    """Export finished spans in batches from a background thread.
+
+    Each batch is appended to a JSON lines file as an OTLP/JSON ExportTraceServiceRequest and,
+    when a collector URL is configured, posted to its /v1/traces endpoint. The queue is bounded:
+    spans are dropped rather than slowing down requests when the exporter falls behind.
+    """
+
+    def __init__(self, path: str, url: str, batch_size: int, interval: float) -> None:
+        self.path = path
+        self.url = url.rstrip("/")
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.Queue[Span | None] = queue.Queue(maxsize=batch_size * 8)
+        self._thread: threading.Thread | None = None
+
+    def export(self, span: Span) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            spans_dropped.inc()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                pass
+            else:
+                if span is None:
+                    self._flush(batch)
+                    return
+                batch.append(span)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.interval
+
+    def _flush(self, batch: list[Span]) -> None:
+        if not batch:
+            return
+        payload = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                            ]
+                        },
+                        "scopeSpans": [
+                            {"scope": {"name": __name__}, "spans": [s.to_otlp() for s in batch]}
+                        ],
+                    }
+                ]
+            },
+            separators=(",", ":"),
+        )
+        try:
+            if self.path:
+                with open(self.path, "a") as file:
+                    file.write(payload + "\n")
+            if self.url:
+                request = urllib.request.Request(
+                    f"{self.url}/v1/traces",
+                    data=payload.encode(),
+                    headers={"Content-Type": "application/json"},
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except OSError:
+            logger.exception("Could not export %d spans", len(batch))
+
+
+span_exporter = BatchSpanExporter(
+    config.trace_export_file,
+    config.trace_export_url,
+    config.trace_batch_size,
+    config.trace_flush_interval,
+)
+
+
+class TracingMiddleware:
+    """Start a server span for each sampled request, continuing an incoming W3C trace."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming: tuple[str, str, bool] | None = None
+        for name, value in scope["headers"]:
+            if name == TRACEPARENT_HEADER:
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = _new_trace_id(), None
+            sampled = should_sample(trace_id, self.sample_rate)
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(f"{scope['method']} {scope['path']}", trace_id, _new_span_id(), parent_id)
+        span.kind = SpanKind.server
+        span.attributes["http.method"] = scope["method"]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        token = _current_span.set(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            span.error = repr(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = route_template(scope)
+            span.name = f"{scope['method']} {route}"
+            span.attributes["http.route"] = route
+            span.finish()
+
+
+class TracedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Connection pool recording the time spent waiting for a connection as a span."""
+
+    def connect(self) -> PoolProxiedConnection:
+        if _current_span.get() is None:
+            return super().connect()
+        with start_span("db.checkout", SpanKind.client):
+            return super().connect()
+
+
+def _before_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, *args: Any, **kwargs: Any
+) -> None:
+    parent = _current_span.get()
+    if parent is None:
+        return
+    span = Span("db.statement", parent.trace_id, _new_span_id(), parent.span_id, SpanKind.client)
+    span.attributes["db.system"] = "postgresql"
+    span.attributes["db.statement"] = statement[:MAX_STATEMENT_LENGTH]
+    conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_cursor_execute(conn: Connection, *args: Any, **kwargs: Any) -> None:
+    spans: list[Span] | None = conn.info.get("trace_spans")
+    if spans:
+        spans.pop().finish()
+
+
+def _handle_error(context: Any) -> None:
+    conn: Connection | None = context.connection
+    spans: list[Span] | None = conn.info.get("trace_spans") if conn is not None else None
+    if spans:
+        span = spans.pop()
+        span.error = repr(context.original_exception)
+        span.finish()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record a span for each SQL statement executed by the engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def instrument_fastapi() -> None:
+    """Record the validation and serialization of response models as a span.
+
+    The request handlers of FastAPI look serialize_response up from their module at call time,
+    so replacing it there is enough to trace every route.
+    """
+    serialize_response = fastapi.routing.serialize_response
+    if not hasattr(serialize_response, "__wrapped__"):
+        fastapi.routing.serialize_response = traced("serialize_response")(serialize_response)
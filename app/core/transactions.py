@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import logging
+import random
+from typing import Any, Callable, TypeVar, cast
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# serialization_failure and deadlock_detected, the transaction was rolled back and running it
+# again can succeed
+RETRYABLE_SQLSTATES = frozenset({"40001", "40P01"})
+
+transaction_retries = registry.counter(
+    "db_transaction_retries_total",
+    "Transactional units run again after a retryable error",
+    ("operation", "sqlstate"),
+)
+transaction_retries_exhausted = registry.counter(
+    "db_transaction_retries_exhausted_total",
+    "Retryable errors returned because the attempts or the retry budget were exhausted",
+    ("operation", "reason"),
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def retryable_sqlstate(error: BaseException) -> str | None:
+    """Return the SQLSTATE of error when running its transaction again can succeed."""
+    if not isinstance(error, DBAPIError):
+        return None
+    sqlstate = getattr(error.orig, "sqlstate", None)
+    return sqlstate if sqlstate in RETRYABLE_SQLSTATES else None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Return the pause before retry number attempt, with full jitter.
+
+    The delay is drawn between 0 and base * 2 ** (attempt - 1), capped, so that the
+    transactions that conflicted are not retried together and conflict again.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Limit the retries to ratio of the transactional units run, plus a burst of capacity.
+
+    Each unit run deposits ratio tokens and each retry withdraws one, the tokens are capped at
+    capacity. When the database is overloaded most units fail and the budget runs out, the
+    errors are then returned instead of multiplying the load with retries.
+    """
+
+    def __init__(self, ratio: float, capacity: float) -> None:
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def deposit(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+retry_budget = RetryBudget(config.db_retry_budget_ratio, config.db_retry_budget_capacity)
+
+
+def _find_session(args: tuple[Any, ...], kwargs: dict[str, Any]) -> AsyncSession:
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, AsyncSession):
+            return value
+    raise TypeError("A transactional unit takes the session as an argument")
+
+
+def transactional(
+    operation: str, budget: RetryBudget | None = None, max_attempts: int | None = None
+) -> Callable[[F], F]:
+    """Decorate an async service function to run it again on serialization failures and
+    deadlocks.
+
+    The function is a transactional unit: it takes the session as an argument and commits it.
+    On a retryable error the session is rolled back and the whole function runs again after a
+    jittered exponential backoff, as long as the attempts and the retry budget allow it.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            db = _find_session(args, kwargs)
+            retries = budget or retry_budget
+            attempts = max_attempts or config.db_retry_attempts
+            retries.deposit()
+            attempt = 1
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except DBAPIError as error:
+                    sqlstate = retryable_sqlstate(error)
+                    if sqlstate is None:
+                        raise
+                    await db.rollback()
+                    if attempt >= attempts:
+                        transaction_retries_exhausted.inc((operation, "attempts"))
+                        raise
+                    if not retries.withdraw():
+                        transaction_retries_exhausted.inc((operation, "budget"))
+                        raise
+                    transaction_retries.inc((operation, sqlstate))
+                    logger.info("Retrying %s after SQLSTATE %s", operation, sqlstate)
+                    await asyncio.sleep(
+                        backoff_delay(
+                            attempt, config.db_retry_base_delay, config.db_retry_max_delay
+                        )
+                    )
+                    attempt += 1
+
+        return cast(F, wrapper)
+
+    return decorator
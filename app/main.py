@@ -1,20 +1,121 @@
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
 from fastapi import FastAPI
 
+from app.core.capture import CaptureMiddleware, setup_capture
+from app.core.config import config
+from app.core.database import async_engine
+from app.core.deadline import DeadlineMiddleware
+from app.core.events import order_events
+from app.core.log import AccessLogMiddleware, instrument_sql_logging, setup_logging
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware, profile_ring
+from app.core.tracing import (
+    TracingMiddleware,
+    instrument_engine,
+    instrument_fastapi,
+    span_exporter,
+)
 from app.routers import (
+    analytics_api,
     auth_api,
     cart_api,
     category_api,
+    metrics_api,
     order_api,
     product_api,
+    profile_api,
     user_api,
 )
+from app.services.cart_service import cart_writes
+from app.services.cart_sweep_service import cart_sweeper
+from app.services.checkout_service import checkout_batcher
+from app.services.popularity_service import popularity
+
+
+# Start and stop the background workers together with the application
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+    log_listener = setup_logging(config.log_level)
+    capture_listener = (
+        setup_capture(config.capture_file, config.capture_max_bytes, config.capture_backups)
+        if config.capture_enabled
+        else None
+    )
+    if config.loop_monitor_enabled:
+        loop_monitor.start()
+    if config.tracing_enabled:
+        span_exporter.start()
+    await popularity.start()
+    order_events.start()
+    checkout_batcher.start()
+    cart_writes.start()
+    if config.cart_sweep_enabled:
+        cart_sweeper.start()
+    yield
+    if config.export_enabled:
+        from app.services.export_service import exporter
 
-app = FastAPI()
+        await exporter.stop()
+    await cart_sweeper.stop()
+    await cart_writes.stop()
+    await checkout_batcher.stop()
+    await order_events.stop()
+    await popularity.stop()
+    await loop_monitor.stop()
+    span_exporter.shutdown()
+    if capture_listener is not None:
+        capture_listener.stop()
+    log_listener.stop()
 
 
+app = FastAPI(lifespan=lifespan)
+
+instrument_sql_logging(async_engine.sync_engine)
+
+# Added first so that the metrics and the access log record the 504 of a request out of time
+app.add_middleware(
+    DeadlineMiddleware,
+    routes=app.routes,
+    default=config.request_timeout,
+    timeouts=config.route_timeouts,
+    grace=config.deadline_grace,
+)
+
+if config.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_api.router)
+
+# Added before the access log so that both share the statistics of the request
+if config.capture_enabled:
+    app.add_middleware(CaptureMiddleware, sample_rate=config.capture_sample_rate)
+
+if config.access_log_enabled:
+    app.add_middleware(AccessLogMiddleware)
+
+if config.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware, ring=profile_ring, sample_rate=config.profile_sample_rate
+    )
+    app.include_router(profile_api.router)
+
+if config.tracing_enabled:
+    instrument_engine(async_engine.sync_engine)
+    instrument_fastapi()
+    app.add_middleware(TracingMiddleware, sample_rate=config.trace_sample_rate)
+
 app.include_router(auth_api.router)
 app.include_router(user_api.router)
 app.include_router(category_api.router)
 app.include_router(product_api.router)
 app.include_router(cart_api.router)
 app.include_router(order_api.router)
+app.include_router(analytics_api.router)
+
+# pyarrow is an optional dependency, only imported when the export is enabled
+if config.export_enabled:
+    from app.routers import export_api
+
+    app.include_router(export_api.router)
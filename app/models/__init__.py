@@ -1,6 +1,11 @@
 # Models need to be imported here to be used in the app
+from app.models.analytics import SalesCategoryDaily, SalesDaily, SalesProductDaily
+from app.models.archive import DetachedMonth, OrderArchive
 from app.models.cart import Cart, CartItem
+from app.models.catalog import CatalogTombstone
 from app.models.category import Category
 from app.models.order import Order, OrderItem
+from app.models.popularity import ProductPopularity
 from app.models.product import Product
+from app.models.recommendation import RelatedProduct
 from app.models.user import User
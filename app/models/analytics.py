@@ -0,0 +1,56 @@
+from datetime import date
+
+from sqlmodel import Field, SQLModel
+
+# Rollups of the orders which are not cancelled, maintained when orders are created or change
+# status and rebuilt by app.commands.backfill_rollups. They have no foreign keys so that they
+# keep the history of deleted products and categories.
+# Each key is spread over rollup_shards rows so that concurrent orders of the same day do not
+# all wait for the lock of one row, the reads sum the shards.
+
+
+class SalesDaily(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    shard: int = Field(default=0, primary_key=True)
+    revenue: float = 0
+    order_count: int = 0
+    units: int = 0
+
+
+class SalesCategoryDaily(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    category_id: int = Field(primary_key=True)
+    shard: int = Field(default=0, primary_key=True)
+    revenue: float = 0
+    order_count: int = 0
+    units: int = 0
+
+
+class SalesProductDaily(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    product_id: int = Field(primary_key=True)
+    shard: int = Field(default=0, primary_key=True)
+    revenue: float = 0
+    order_count: int = 0
+    units: int = 0
+
+
+class DailySales(SQLModel):
+    day: date
+    revenue: float
+    order_count: int
+    units: int
+
+
+class CategorySales(SQLModel):
+    category_id: int
+    revenue: float
+    order_count: int
+    units: int
+
+
+class ProductSales(SQLModel):
+    product_id: int
+    revenue: float
+    order_count: int
+    units: int
@@ -0,0 +1,61 @@
+from datetime import date, datetime
+from typing import Any, Optional
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Column, DateTime, Enum, Field, SQLModel
+
+from app.models.order import Order, OrderItem, Status
+from app.models.timestamps import utc_now
+
+
+# Delivered or cancelled order moved out of the order tables with its items, kept as one row
+# with the items in a JSON array. Ids are the ids the order and its items had
+class OrderArchive(SQLModel, table=True):
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_date: date = Field(index=True)
+    order_status: Status = Field(sa_column=Column(Enum(Status), nullable=False))
+    shipping_address: str
+    cart_id: Optional[int] = None
+    order_amount: float
+    user_id: int = Field(index=True)
+    items: list[dict[str, Any]] = Field(sa_column=Column(JSONB, nullable=False))
+    archived_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+
+    def to_order(self) -> Order:
+        """Return the archived order as a detached Order with its items."""
+        order = Order(
+            id=self.id,
+            order_date=self.order_date,
+            order_status=self.order_status,
+            shipping_address=self.shipping_address,
+            cart_id=self.cart_id,
+            order_amount=self.order_amount,
+            user_id=self.user_id,
+        )
+        order.order_items = [
+            OrderItem(
+                id=item["id"],
+                quantity=item["quantity"],
+                created_date=date.fromisoformat(item["created_date"]),
+                product_id=item["product_id"],
+                # Null for items archived before the snapshot whose product was then deleted
+                unit_price=item.get("unit_price") or 0.0,
+                product_name=item.get("product_name") or "",
+                category_id=item.get("category_id"),
+                order_id=self.id,
+                order_date=self.order_date,
+            )
+            for item in self.items
+        ]
+        return order
+
+
+# Month of the order tables detached by manage_partitions, its orders and items left the order
+# tables for schema_name. Kept so that the export can tell its readers
+class DetachedMonth(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: date = Field(index=True)
+    schema_name: str
+    detached_at: datetime = Field(
+        default_factory=utc_now, sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
@@ -1,10 +1,12 @@
-from datetime import date
+from datetime import date, datetime
 from typing import TYPE_CHECKING, Optional
 
+from sqlalchemy import func
 from sqlalchemy.orm import relationship
-from sqlmodel import Field, Relationship, SQLModel
+from sqlmodel import Column, DateTime, Field, Relationship, SQLModel
 
 from app.models.product import Product
+from app.models.timestamps import utc_now
 from app.models.user import User
 
 if TYPE_CHECKING:
@@ -18,6 +20,17 @@ class CartBase(SQLModel):
 class Cart(CartBase, table=True):
     id: Optional[int] = Field(primary_key=True)
     user_id: int = Field(foreign_key="user.id")
+    # Last change of the cart items, carts left alone for cart_ttl_days are swept
+    last_activity: datetime = Field(
+        default_factory=utc_now,
+        sa_column=Column(
+            DateTime(timezone=True), nullable=False, index=True, server_default=func.now()
+        ),
+    )
+    # Totals of the items at the current prices, changed in the transaction of every item or
+    # price change
+    item_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    subtotal: float = Field(default=0.0, sa_column_kwargs={"server_default": "0"})
     user: User = Relationship(back_populates="carts")
     cart_items: list["CartItem"] = Relationship(
         sa_relationship=relationship(
@@ -36,6 +49,8 @@ class CartCreate(CartBase):
 class CartPublic(CartBase):
     id: int
     user_id: int
+    item_count: int = 0
+    subtotal: float = 0.0
 
 
 class CartItemBase(SQLModel):
@@ -60,3 +75,20 @@ class CartItemPublic(CartItemBase):
 
 class CartPublicWithItems(CartPublic):
     cart_items: list[CartItemPublic] = []
+
+
+class CartQuoteLine(SQLModel):
+    product_id: int
+    name: str
+    unit_price: float
+    quantity: int
+    amount: float
+
+
+class CartQuote(SQLModel):
+    cart_id: int
+    lines: list[CartQuoteLine] = []
+    item_count: int
+    subtotal: float
+    # Pass it to the checkout to be charged this subtotal while the prices did not change
+    catalog_version: int
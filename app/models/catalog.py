@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Sequence
+from sqlmodel import Column, DateTime, Field, SQLModel
+
+from app.models.timestamps import utc_now
+
+# Numbers the changes of products and categories, deletions included. Catalog writes take
+# CATALOG_LOCK until they commit so that the numbers become visible in increasing order
+catalog_change_seq = Sequence("catalog_change_seq", metadata=SQLModel.metadata)
+CATALOG_LOCK = 4_270_817
+
+
+def change_seq_column() -> Column[int]:
+    """Return a column numbered from catalog_change_seq on every insert and update."""
+    return Column(
+        BigInteger,
+        catalog_change_seq,
+        nullable=False,
+        index=True,
+        server_default=catalog_change_seq.next_value(),
+        onupdate=catalog_change_seq.next_value(),
+    )
+
+
+# A deleted product or category, kept so that replicas of the catalog learn about the deletion
+class CatalogTombstone(SQLModel, table=True):
+    entity: str = Field(primary_key=True)
+    entity_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    change_seq: int = Field(sa_column=change_seq_column())
+    deleted_at: datetime = Field(
+        default_factory=utc_now, sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+
+
+class CatalogDeletion(SQLModel):
+    entity: str
+    id: int
+    change_seq: int
+
+
+class CatalogProduct(SQLModel):
+    id: int
+    name: str
+    quantity: int
+    description: str
+    price: float
+    category_id: int
+    updated_at: datetime
+    change_seq: int
+
+
+class CatalogCategory(SQLModel):
+    id: int
+    name: str
+    updated_at: datetime
+    change_seq: int
+
+
+class CatalogChanges(SQLModel):
+    products: list[CatalogProduct] = []
+    categories: list[CatalogCategory] = []
+    deleted: list[CatalogDeletion] = []
+    # Pass it as since to get the next changes
+    next_since: int
+    has_more: bool
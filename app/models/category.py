@@ -1,7 +1,11 @@
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
 from sqlmodel import Field, Relationship, SQLModel
 
+from app.models.catalog import change_seq_column
+from app.models.timestamps import updated_at_column, utc_now
+
 # Solve the circular import problem by using TYPE_CHECKING
 if TYPE_CHECKING:
     from app.models.product import Product
@@ -13,6 +17,8 @@ class CategoryBase(SQLModel):
 
 class Category(CategoryBase, table=True):
     id: Optional[int] = Field(primary_key=True)
+    updated_at: datetime = Field(default_factory=utc_now, sa_column=updated_at_column())
+    change_seq: Optional[int] = Field(default=None, sa_column=change_seq_column())
     products: list["Product"] = Relationship(back_populates="category")
 
 
@@ -1,11 +1,14 @@
 import enum
-from datetime import date
+from datetime import date, datetime
 from typing import Optional
 
+from sqlalchemy import DDL, ForeignKeyConstraint, Integer, event
 from sqlalchemy.orm import relationship
 from sqlmodel import Column, Enum, Field, Relationship, SQLModel
 
+from app.core.partitioning import default_partition_ddl
 from app.models.cart import Cart
+from app.models.timestamps import updated_at_column, utc_now
 from app.models.user import User
 
 
@@ -23,13 +26,24 @@ class OrderBase(SQLModel):
         sa_column=Column(Enum(Status), default=Status.pending, nullable=False)
     )
     shipping_address: str
-    cart_id: Optional[int] = Field(default=None, foreign_key="cart.id")
+    cart_id: Optional[int] = Field(default=None, foreign_key="cart.id", index=True)
+
+
+# Incremented by every update, which only applies to the version it was read at
+_order_version = Column("version", Integer, nullable=False, server_default="1")
 
 
 class Order(OrderBase, table=True):
-    id: Optional[int] = Field(primary_key=True)
+    # Partitioned by month of order_date, which is therefore part of the primary key
+    __table_args__ = {"postgresql_partition_by": "RANGE (order_date)"}
+    __mapper_args__ = {"version_id_col": _order_version}
+
+    id: Optional[int] = Field(primary_key=True, sa_column_kwargs={"autoincrement": True})
+    order_date: Optional[date] = Field(default_factory=date.today, primary_key=True)
     order_amount: float
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
+    updated_at: datetime = Field(default_factory=utc_now, sa_column=updated_at_column(index=True))
+    version: int = Field(default=1, sa_column=_order_version)
     user: User = Relationship(back_populates="orders")
     # Delete Order, all OrderItem related to this Order will be deleted
     # Delete Cart, Order will be set to None
@@ -56,14 +70,34 @@ class OrderItemBase(SQLModel):
     quantity: int
     created_date: Optional[date] = Field(default_factory=date.today, nullable=False)
     product_id: int = Field(foreign_key="product.id")
+    # Price and name of the product when ordered, an order reads without the product table
+    unit_price: float
+    product_name: str
 
 
 class OrderItem(OrderItemBase, table=True):
-    id: Optional[int] = Field(primary_key=True)
-    order_id: int = Field(foreign_key="order.id")
+    # Partitioned like Order on the date of its order, copied from the order when inserted
+    __table_args__ = (
+        ForeignKeyConstraint(["order_id", "order_date"], ["order.id", "order.order_date"]),
+        {"postgresql_partition_by": "RANGE (order_date)"},
+    )
+
+    id: Optional[int] = Field(primary_key=True, sa_column_kwargs={"autoincrement": True})
+    # Indexed for loading the items of orders and streaming them grouped by order
+    order_id: int = Field(index=True)
+    order_date: date = Field(primary_key=True)
+    # Category of the product when ordered, the sales of the item stay in its category rollup
+    category_id: int
     order: Order = Relationship(back_populates="order_items")
 
 
+# Tables created from the metadata get a default partition, the migrations and the
+# manage_partitions command create the monthly ones
+for _table in (Order.__table__, OrderItem.__table__):  # type: ignore[attr-defined]
+    _ddl = DDL(default_partition_ddl(_table.name))  # type: ignore[no-untyped-call]
+    event.listen(_table, "after_create", _ddl)
+
+
 class OrderItemCreate(OrderItemBase):
     pass
 
@@ -74,3 +108,16 @@ class OrderItemPublic(OrderItemBase):
 
 class OrderPublicWithItems(OrderPublic):
     order_items: list[OrderItemPublic] = []
+
+
+class CheckoutAccepted(SQLModel):
+    ticket_id: str
+    status_url: str
+
+
+class CheckoutStatus(SQLModel):
+    ticket_id: str
+    # pending, created or failed
+    status: str
+    order_id: Optional[int] = None
+    detail: Optional[str] = None
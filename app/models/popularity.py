@@ -0,0 +1,32 @@
+import enum
+from datetime import datetime
+
+from sqlmodel import Column, DateTime, Field, SQLModel
+
+from app.models.product import ProductPublic
+
+
+class PopularityWindow(str, enum.Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+# Half-life of the sales counters of each window in seconds
+WINDOW_HALF_LIFE: dict[PopularityWindow, float] = {
+    PopularityWindow.day: 24 * 3600,
+    PopularityWindow.week: 7 * 24 * 3600,
+    PopularityWindow.month: 30 * 24 * 3600,
+}
+
+
+# Decayed units sold of a product, score is its value at updated_at
+class ProductPopularity(SQLModel, table=True):
+    product_id: int = Field(primary_key=True)
+    time_window: str = Field(primary_key=True)
+    score: float = 0
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+
+
+class ProductRanked(ProductPublic):
+    score: float
@@ -1,8 +1,15 @@
+from datetime import datetime
 from typing import Optional
 
-from sqlmodel import Field, Relationship, SQLModel
+from sqlalchemy import Integer, Sequence
+from sqlmodel import Column, Field, Relationship, SQLModel
 
+from app.models.catalog import change_seq_column
 from app.models.category import Category
+from app.models.timestamps import updated_at_column, utc_now
+
+# Incremented by every price change, a quote made at the current value still has right prices
+catalog_version_seq = Sequence("catalog_version_seq", metadata=SQLModel.metadata)
 
 
 class ProductBase(SQLModel):
@@ -13,8 +20,17 @@ class ProductBase(SQLModel):
     category_id: int = Field(foreign_key="category.id")
 
 
+# Incremented by every update, which only applies to the version it was read at
+_product_version = Column("version", Integer, nullable=False, server_default="1")
+
+
 class Product(ProductBase, table=True):
+    __mapper_args__ = {"version_id_col": _product_version}
+
     id: Optional[int] = Field(primary_key=True)
+    version: int = Field(default=1, sa_column=_product_version)
+    updated_at: datetime = Field(default_factory=utc_now, sa_column=updated_at_column())
+    change_seq: Optional[int] = Field(default=None, sa_column=change_seq_column())
     category: Category = Relationship(back_populates="products")
 
 
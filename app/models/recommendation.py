@@ -0,0 +1,10 @@
+from sqlmodel import Field, SQLModel
+
+
+# Products most often bought together with product_id, rebuilt by
+# app.commands.build_related_products, rank 0 is the closest
+class RelatedProduct(SQLModel, table=True):
+    product_id: int = Field(primary_key=True)
+    rank: int = Field(primary_key=True)
+    related_product_id: int
+    score: float
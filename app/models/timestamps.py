@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlmodel import Column, DateTime
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def updated_at_column(index: bool = False) -> Column[datetime]:
+    """Return a column holding the time of the last change of its row, for incremental exports.
+
+    The model sets it when a row is created or updated, rows written with SQL get the time of
+    their transaction from the server default.
+    """
+    return Column(
+        DateTime(timezone=True),
+        nullable=False,
+        index=index,
+        onupdate=utc_now,
+        server_default=func.now(),
+    )
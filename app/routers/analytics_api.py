@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.database import get_async_session
+from app.models.analytics import CategorySales, DailySales, ProductSales
+from app.models.user import TokenUser
+from app.services.analytics_service import (
+    get_category_sales,
+    get_daily_sales,
+    get_product_sales,
+)
+from app.services.auth_service import get_admin_user
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+DEFAULT_DAYS = 30
+
+
+def date_range(start_date: date | None = None, end_date: date | None = None) -> tuple[date, date]:
+    # Both dates are included, the last 30 days by default
+    end = end_date or date.today()
+    start = start_date or end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="start_date is after end_date"
+        )
+    return start, end
+
+
+# Revenue, order count and units sold per day, only admin can access this API
+@router.get("/daily", status_code=status.HTTP_200_OK, response_model=list[DailySales])
+async def get_daily(
+    dates: tuple[date, date] = Depends(date_range),
+    _: TokenUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_session),
+) -> list[DailySales]:
+    return await get_daily_sales(db, *dates)
+
+
+# Sales per category over the date range, only admin can access this API
+@router.get("/category", status_code=status.HTTP_200_OK, response_model=list[CategorySales])
+async def get_by_category(
+    dates: tuple[date, date] = Depends(date_range),
+    _: TokenUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_session),
+) -> list[CategorySales]:
+    return await get_category_sales(db, *dates)
+
+
+# Best selling products by revenue over the date range, only admin can access this API
+@router.get("/product", status_code=status.HTTP_200_OK, response_model=list[ProductSales])
+async def get_by_product(
+    limit: int = Query(default=50, ge=1, le=1000),
+    dates: tuple[date, date] = Depends(date_range),
+    _: TokenUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_session),
+) -> list[ProductSales]:
+    return await get_product_sales(db, *dates, limit)
@@ -7,6 +7,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
 from app.core.database import get_async_session
+from app.core.metrics import login_failures
 from app.schemas.auth_schema import Token
 from app.services.auth_service import authenticate_user, create_access_token
 
@@ -22,6 +23,7 @@ async def login_for_access_token(
 ) -> Token:
     user = await authenticate_user(form_data.username, form_data.password, db)
     if user is None:
+        login_failures.inc()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials"
         )
@@ -2,17 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
+from app.core.config import config
 from app.core.database import get_async_session
-from app.models.cart import Cart, CartCreate, CartItemCreate, CartPublicWithItems
+from app.models.cart import (
+    Cart,
+    CartCreate,
+    CartItemCreate,
+    CartPublicWithItems,
+    CartQuote,
+)
 from app.models.user import TokenUser
 from app.services.auth_service import get_current_user
 from app.services.cart_service import (
+    CartWrite,
     add_item,
     create_new_cart,
     delete_cart_by_id,
     delete_item,
     get_cart_by_id,
+    get_cart_quote,
     get_carts,
+    submit_cart_write,
 )
 
 router = APIRouter(prefix="/cart", tags=["cart"])
@@ -53,7 +63,19 @@ async def get_cart_id(
     return cart
 
 
+# Price the cart items at the current prices with the total, user can get a quote of their
+# carts, admin of any cart. The catalog_version tells whether prices changed since the quote
+@router.get("/cart/{cart_id}/quote", status_code=status.HTTP_200_OK, response_model=CartQuote)
+async def get_quote(
+    cart_id: int,
+    user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> CartQuote:
+    return await get_cart_quote(cart_id, session, user)
+
+
 # Add item to cart, only login user can add item to their cart
+# With cart_coalescing the item is inserted with other concurrent cart writes in one transaction
 @router.post("/cart/{cart_id}/item", status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
     cart_id: int,
@@ -61,6 +83,9 @@ async def add_item_to_cart(
     user: TokenUser = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> None:
+    if config.cart_coalescing:
+        await submit_cart_write(CartWrite(cart_id, user.id, item=item_request))
+        return
     await add_item(cart_id, item_request, session, user.id)
 
 
@@ -72,6 +97,9 @@ async def delete_item_from_cart(
     user: TokenUser = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> None:
+    if config.cart_coalescing:
+        await submit_cart_write(CartWrite(cart_id, user.id, item_id=item_id))
+        return
     await delete_item(cart_id, item_id, session, user.id)
 
 
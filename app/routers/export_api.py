@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from starlette import status
+
+from app.models.user import TokenUser
+from app.services.auth_service import get_admin_user
+from app.services.export_service import ExportStatus, exporter
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+# Start exporting the rows changed since the last export to Parquet, only admin can access
+# this API
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def start_export(_: TokenUser = Depends(get_admin_user)) -> ExportStatus:
+    if not exporter.start():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="An export is already running"
+        )
+    return exporter.status()
+
+
+# State of the running or last export and the watermarks, only admin can access this API
+@router.get("", status_code=status.HTTP_200_OK)
+async def get_export(_: TokenUser = Depends(get_admin_user)) -> ExportStatus:
+    return exporter.status()
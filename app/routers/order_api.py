@@ -1,62 +1,149 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.config import config
 from app.core.database import get_async_session
-from app.models.order import Order, OrderCreate, OrderPublicWithItems
-from app.models.user import TokenUser
+from app.core.events import event_stream, order_events
+from app.models.order import (
+    CheckoutAccepted,
+    CheckoutStatus,
+    Order,
+    OrderCreate,
+    OrderPublicWithItems,
+)
+from app.models.user import Role, TokenUser
 from app.services.auth_service import get_admin_user, get_current_user
+from app.services.checkout_service import (
+    enqueue_order,
+    get_checkout_status,
+    submit_order,
+)
 from app.services.order_service import (
     create_new_order,
     get_order_by_id,
     get_orders,
+    order_status_event,
     update_order_status_by_order_id,
 )
+from app.utils.etag_utils import if_match_versions, version_etag
 
 router = APIRouter(prefix="/order", tags=["order"])
 
 
 # For login user: create order from cart, add all cart items into order items
+# With checkout_batching the order is created with other concurrent checkouts in one transaction
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=Order)
 async def create_order_from_cart(
     order_request: OrderCreate,
     user: TokenUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ) -> Order:
+    if config.checkout_batching:
+        return await submit_order(order_request, user.id)
     order: Order = await create_new_order(order_request, db, user.id)
     return order
 
 
+# For login user: queue the order for the next checkout batch and return right away,
+# the status URL tells when the order is created
+@router.post("/async", status_code=status.HTTP_202_ACCEPTED, response_model=CheckoutAccepted)
+async def create_order_async(
+    order_request: OrderCreate,
+    request: Request,
+    user: TokenUser = Depends(get_current_user),
+) -> CheckoutAccepted:
+    ticket_id = enqueue_order(order_request, user.id)
+    status_url = str(request.url_for("get_checkout", ticket_id=ticket_id))
+    return CheckoutAccepted(ticket_id=ticket_id, status_url=status_url)
+
+
+# Get the state of a queued checkout, only for the user who placed it
+@router.get(
+    "/checkout/{ticket_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=CheckoutStatus,
+    name="get_checkout",
+)
+async def get_checkout(
+    ticket_id: str, user: TokenUser = Depends(get_current_user)
+) -> CheckoutStatus:
+    return get_checkout_status(ticket_id, user.id)
+
+
 # Get all orders for login user, admin can see orders of all users
+# start_date and end_date (included) limit the orders to a range of order dates
 @router.get("", status_code=status.HTTP_200_OK, response_model=list[Order])
 async def get_all_orders(
+    start_date: date | None = None,
+    end_date: date | None = None,
     user: TokenUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ) -> list[Order] | None:
-    orders: list[Order] | None = await get_orders(db, user)
+    orders: list[Order] | None = await get_orders(db, user, start_date, end_date)
     return orders
 
 
+# Stream the status changes of the login user's orders as Server-Sent Events, admin gets the
+# changes of all orders. With order_id only that order is streamed, starting with its status
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def stream_order_events(
+    order_id: int | None = None,
+    user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    initial = None
+    if order_id is not None:
+        order: Order | None = await get_order_by_id(order_id, session, user)
+        if order is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        initial = order_status_event(order)
+    if order_events.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event streams",
+            headers={"Retry-After": "5"},
+        )
+    user_id = None if user.role == Role.admin else user.id
+    return StreamingResponse(
+        event_stream(order_events, user_id, order_id, initial, config.sse_heartbeat_interval),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Get order by id, user can get order created by themselves, admin can get any order
+# The ETag is the version of the order, to send as If-Match when updating it
 @router.get(
     "/order/{order_id}", status_code=status.HTTP_200_OK, response_model=OrderPublicWithItems
 )
 async def get_order_id(
     order_id: int,
+    response: Response,
     user: TokenUser = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> Order:
     order: Order | None = await get_order_by_id(order_id, session, user)
     if order is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    response.headers["ETag"] = version_etag(order.version)
     return order
 
 
 # Update order status by order id, only admin can update order status
+# With If-Match the order is only updated at that version, 412 when it changed since
 @router.put("/order/{order_id}", status_code=status.HTTP_200_OK)
 async def update_order_status(
     order_id: int,
     order_status: str,
+    response: Response,
+    if_match: str | None = Header(default=None),
     user: TokenUser = Depends(get_admin_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> None:
-    await update_order_status_by_order_id(order_id, order_status, session, user)
+    order = await update_order_status_by_order_id(
+        order_id, order_status, session, user, if_match_versions(if_match)
+    )
+    response.headers["ETag"] = version_etag(order.version)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
+from app.core.config import config
 from app.core.database import get_async_session
+from app.models.catalog import CatalogChanges
+from app.models.popularity import PopularityWindow, ProductRanked
 from app.models.product import Product, ProductCreate, ProductPublic, ProductUpdate
 from app.models.user import TokenUser
 from app.services.auth_service import get_admin_user, get_current_user
+from app.services.catalog_service import get_catalog_changes
+from app.services.popularity_service import get_top_products
 from app.services.product_service import (
     create_new_product,
     delete_product_by_id,
@@ -13,6 +18,8 @@ from app.services.product_service import (
     get_product_by_id,
     update_product_info,
 )
+from app.services.recommendation_service import get_related_products
+from app.utils.etag_utils import if_match_versions, version_etag
 
 router = APIRouter(prefix="/product", tags=["product"])
 
@@ -38,28 +45,75 @@ async def get_products(
     return products
 
 
+# Changes of the products and categories numbered after since, deletions included, all users
+# can access this API. Start with since=0 and pass next_since until has_more is false
+@router.get("/changes", status_code=status.HTTP_200_OK, response_model=CatalogChanges)
+async def get_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    _: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> CatalogChanges:
+    return await get_catalog_changes(session, since, limit)
+
+
+# Best selling products with sales decaying over the window (day for trending), optionally in a
+# category, all users can access this API
+@router.get("/top", status_code=status.HTTP_200_OK, response_model=list[ProductRanked])
+async def get_top(
+    window: PopularityWindow = PopularityWindow.week,
+    category_id: int | None = None,
+    limit: int = Query(default=10, ge=1, le=config.popularity_top_k),
+    _: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> list[ProductRanked]:
+    return await get_top_products(session, window, category_id, limit)
+
+
 # Get product by id, all users can access this API
+# The ETag is the version of the product, to send as If-Match when updating it
 @router.get("/product/{product_id}", status_code=status.HTTP_200_OK, response_model=ProductPublic)
 async def get_product_id(
     product_id: int,
+    response: Response,
     _: TokenUser = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> Product:
     product: Product | None = await get_product_by_id(product_id, session)
     if product is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    response.headers["ETag"] = version_etag(product.version)
     return product
 
 
+# Products frequently bought together with this product, all users can access this API
+@router.get(
+    "/product/{product_id}/related",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ProductRanked],
+)
+async def get_related(
+    product_id: int,
+    limit: int = Query(default=10, ge=1, le=100),
+    _: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> list[ProductRanked]:
+    return await get_related_products(product_id, session, limit)
+
+
 # Update product information, only admin can access this API
+# With If-Match the product is only updated at that version, 412 when it changed since
 @router.put("/product/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def change_product(
     product_view: ProductUpdate,
     product_id: int,
+    response: Response,
+    if_match: str | None = Header(default=None),
     _: TokenUser = Depends(get_admin_user),
     db: AsyncSession = Depends(get_async_session),
 ) -> None:
-    await update_product_info(product_view, product_id, db)
+    product = await update_product_info(product_view, product_id, db, if_match_versions(if_match))
+    response.headers["ETag"] = version_etag(product.version)
 
 
 # Delete product by id, only admin can access this API
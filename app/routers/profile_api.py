@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from starlette import status
+
+from app.core.profiling import ProfileInfo, profile_ring
+from app.models.user import TokenUser
+from app.services.auth_service import get_admin_user
+
+router = APIRouter(prefix="/profile", tags=["profile"])
+
+
+# List the stored request profiles, most recent first, only admin can access this API
+@router.get("", status_code=status.HTTP_200_OK)
+async def get_profiles(_: TokenUser = Depends(get_admin_user)) -> list[ProfileInfo]:
+    return profile_ring.list()
+
+
+# Download a profile as a pstats file, only admin can access this API
+@router.get("/{name}", status_code=status.HTTP_200_OK)
+async def download_profile(name: str, _: TokenUser = Depends(get_admin_user)) -> FileResponse:
+    path: str | None = profile_ring.path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
@@ -0,0 +1,199 @@
+import random
+from collections import defaultdict
+from datetime import date
+from typing import Any, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import SQLModel, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import config
+from app.core.tracing import traced
+from app.models.analytics import (
+    CategorySales,
+    DailySales,
+    ProductSales,
+    SalesCategoryDaily,
+    SalesDaily,
+    SalesProductDaily,
+)
+from app.models.order import Order, OrderItem
+
+MEASURES = ("revenue", "order_count", "units")
+
+
+def order_rollup_rows(
+    order: Order, order_items: Sequence[OrderItem], sign: int, shard: int = 0
+) -> tuple[dict[str, Any], list[dict[str, Any]], list[dict[str, Any]]]:
+    """Return the changes of the daily, category and product rollups for an order.
+
+    sign is 1 when the order starts counting and -1 when it stops (cancelled). The daily revenue
+    is the order amount, the category and product revenues use the prices and categories stored
+    on the items, so an order is taken out of the rows it was added to even when the product
+    changed since. The rows go to shard, the sums over the shards do not depend on it.
+    """
+    day = order.order_date
+    daily = {
+        "day": day,
+        "shard": shard,
+        "revenue": sign * order.order_amount,
+        "order_count": sign,
+        "units": sign * sum(item.quantity for item in order_items),
+    }
+    by_category: dict[int, dict[str, Any]] = {}
+    by_product: dict[int, dict[str, Any]] = defaultdict(
+        lambda: {"revenue": 0.0, "order_count": sign, "units": 0}
+    )
+    for item in order_items:
+        row = by_product[item.product_id]
+        row["revenue"] += sign * item.quantity * item.unit_price
+        row["units"] += sign * item.quantity
+        category = by_category.setdefault(
+            item.category_id, {"revenue": 0.0, "order_count": sign, "units": 0}
+        )
+        category["revenue"] += sign * item.quantity * item.unit_price
+        category["units"] += sign * item.quantity
+    return (
+        daily,
+        [
+            {"day": day, "category_id": category_id, "shard": shard, **by_category[category_id]}
+            for category_id in sorted(by_category)
+        ],
+        [
+            {"day": day, "product_id": product_id, "shard": shard, **by_product[product_id]}
+            for product_id in sorted(by_product)
+        ],
+    )
+
+
+async def _add_to_rollup(
+    db: AsyncSession, table: type[SQLModel], keys: list[str], rows: list[dict[str, Any]]
+) -> None:
+    if not rows:
+        return
+    statement = insert(table).values(rows)
+    columns = statement.table.c
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: columns[name] + statement.excluded[name] for name in MEASURES},
+    )
+    await db.execute(statement)
+
+
+def _merge(rows: list[dict[str, Any]], keys: list[str]) -> list[dict[str, Any]]:
+    merged: dict[tuple[Any, ...], dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        for name in MEASURES:
+            merged[key][name] += row[name]
+    # Rows are sorted by key so that concurrent orders lock them in the same order
+    return [merged[key] for key in sorted(merged)]
+
+
+@traced()
+async def apply_orders_to_rollups(
+    db: AsyncSession,
+    orders: Sequence[tuple[Order, Sequence[OrderItem]]],
+    sign: int = 1,
+) -> None:
+    """Add orders to the rollups with one statement per rollup, in the transaction of the caller.
+
+    The transaction writes to one shard picked at random, so concurrent transactions of the same
+    day mostly update different rows.
+    """
+    shard = random.randrange(config.rollup_shards)
+    daily: list[dict[str, Any]] = []
+    categories: list[dict[str, Any]] = []
+    product_rows: list[dict[str, Any]] = []
+    for order, order_items in orders:
+        order_daily, order_categories, order_products = order_rollup_rows(
+            order, order_items, sign, shard
+        )
+        daily.append(order_daily)
+        categories += order_categories
+        product_rows += order_products
+    keys = ["day", "shard"]
+    await _add_to_rollup(db, SalesDaily, keys, _merge(daily, keys))
+    keys = ["day", "category_id", "shard"]
+    await _add_to_rollup(db, SalesCategoryDaily, keys, _merge(categories, keys))
+    keys = ["day", "product_id", "shard"]
+    await _add_to_rollup(db, SalesProductDaily, keys, _merge(product_rows, keys))
+
+
+async def apply_order_to_rollups(
+    db: AsyncSession,
+    order: Order,
+    order_items: Sequence[OrderItem],
+    sign: int = 1,
+) -> None:
+    """Add an order to the rollups, in the transaction of the caller."""
+    await apply_orders_to_rollups(db, [(order, order_items)], sign)
+
+
+@traced()
+async def get_daily_sales(db: AsyncSession, start_date: date, end_date: date) -> list[DailySales]:
+    result = await db.exec(
+        select(
+            col(SalesDaily.day),
+            func.sum(SalesDaily.revenue),
+            func.sum(SalesDaily.order_count),
+            func.sum(SalesDaily.units),
+        )
+        .where(SalesDaily.day >= start_date)
+        .where(SalesDaily.day <= end_date)
+        .group_by(col(SalesDaily.day))
+        .order_by(col(SalesDaily.day))
+    )
+    return [
+        DailySales(day=day, revenue=revenue, order_count=count, units=units)
+        for day, revenue, count, units in result.all()
+    ]
+
+
+@traced()
+async def get_category_sales(
+    db: AsyncSession, start_date: date, end_date: date
+) -> list[CategorySales]:
+    result = await db.exec(
+        select(
+            SalesCategoryDaily.category_id,
+            func.sum(SalesCategoryDaily.revenue),
+            func.sum(SalesCategoryDaily.order_count),
+            func.sum(SalesCategoryDaily.units),
+        )
+        .where(SalesCategoryDaily.day >= start_date)
+        .where(SalesCategoryDaily.day <= end_date)
+        .group_by(col(SalesCategoryDaily.category_id))
+        .order_by(func.sum(SalesCategoryDaily.revenue).desc())
+    )
+    return [
+        CategorySales(category_id=category_id, revenue=revenue, order_count=count, units=units)
+        for category_id, revenue, count, units in result.all()
+    ]
+
+
+@traced()
+async def get_product_sales(
+    db: AsyncSession, start_date: date, end_date: date, limit: int
+) -> list[ProductSales]:
+    result = await db.exec(
+        select(
+            SalesProductDaily.product_id,
+            func.sum(SalesProductDaily.revenue),
+            func.sum(SalesProductDaily.order_count),
+            func.sum(SalesProductDaily.units),
+        )
+        .where(SalesProductDaily.day >= start_date)
+        .where(SalesProductDaily.day <= end_date)
+        .group_by(col(SalesProductDaily.product_id))
+        .order_by(func.sum(SalesProductDaily.revenue).desc())
+        .limit(limit)
+    )
+    return [
+        ProductSales(product_id=product_id, revenue=revenue, order_count=count, units=units)
+        for product_id, revenue, count, units in result.all()
+    ]
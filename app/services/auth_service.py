@@ -8,11 +8,14 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
 from app.core.config import config
+from app.core.log import record_user
+from app.core.tracing import traced
 from app.models import User
 from app.models.user import Role, TokenUser
 from app.utils.auth_utils import bcrypt_context, oauth2_bearer
 
 
+@traced()
 async def authenticate_user(email: str, password: str, db: AsyncSession) -> User | None:
     result = await db.exec(select(User).where(User.email == email))
     user = result.first()
@@ -23,6 +26,7 @@ async def authenticate_user(email: str, password: str, db: AsyncSession) -> User
     return user
 
 
+@traced()
 def create_access_token(username: str, user_id: int, role: str, expires_delta: timedelta) -> str:
     encode = {
         "sub": username,
@@ -33,6 +37,7 @@ def create_access_token(username: str, user_id: int, role: str, expires_delta: t
     return jwt.encode(encode, config.secret_key, algorithm=config.algorithm)
 
 
+@traced()
 def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> TokenUser:
     try:
         payload = jwt.decode(token, config.secret_key, algorithms=[config.algorithm])
@@ -47,6 +52,7 @@ def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> TokenUser
         token_user = TokenUser(
             str(payload.get("sub")), int(str(payload.get("id"))), Role(str(payload.get("role")))
         )
+        record_user(token_user.id, token_user.role.value)
         return token_user
     except JWTError:
         raise HTTPException(
@@ -54,6 +60,7 @@ def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> TokenUser
         )
 
 
+@traced()
 def get_admin_user(logged_in_user: TokenUser = Depends(get_current_user)) -> TokenUser:
     if logged_in_user.role != Role.admin:
         raise HTTPException(
@@ -62,6 +69,7 @@ def get_admin_user(logged_in_user: TokenUser = Depends(get_current_user)) -> Tok
     return logged_in_user
 
 
+@traced()
 def check_admin_or_current_user(
     user_id: int, logged_in_user: TokenUser = Depends(get_current_user)
 ) -> TokenUser:
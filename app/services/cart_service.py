@@ -1,22 +1,125 @@
+import itertools
+import logging
+from dataclasses import dataclass
+
 from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, text, tuple_
 from sqlalchemy.engine import ScalarResult
-from sqlmodel import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.cart import Cart, CartCreate, CartItem, CartItemCreate
+from app.core.batching import BatcherFull, MicroBatcher
+from app.core.config import config
+from app.core.database import async_session_maker
+from app.core.metrics import carts_created
+from app.core.tracing import traced
+from app.core.transactions import transactional
+from app.models.cart import (
+    Cart,
+    CartCreate,
+    CartItem,
+    CartItemCreate,
+    CartQuote,
+    CartQuoteLine,
+)
 from app.models.user import Role, TokenUser
 from app.utils.auth_utils import check_cart_owner
 
+logger = logging.getLogger(__name__)
+
+# Prices are locked until the transaction ends, so that a price change either happens before
+# the totals are adjusted or waits and counts the new items when repricing the carts
+LOCK_PRICES = """
+    SELECT id FROM product WHERE id = ANY(CAST(:product_ids AS integer[])) ORDER BY id FOR SHARE
+"""
+
+ADJUST_CART_TOTALS = """
+    UPDATE cart SET item_count = cart.item_count + CAST(:sign AS integer) * delta.count,
+        subtotal = cart.subtotal + CAST(:sign AS integer) * delta.amount,
+        last_activity = now()
+    FROM (
+        SELECT changes.cart_id, count(*) AS count, sum(p.price) AS amount
+        FROM unnest(CAST(:cart_ids AS integer[]), CAST(:product_ids AS integer[]))
+            AS changes (cart_id, product_id)
+        JOIN product p ON p.id = changes.product_id
+        GROUP BY changes.cart_id
+    ) delta
+    WHERE cart.id = delta.cart_id
+"""
+
+REPRICE_CARTS = """
+    UPDATE cart SET subtotal = cart.subtotal + :delta * items.count
+    FROM (
+        SELECT cart_id, count(*) AS count FROM cartitem WHERE product_id = :product_id
+        GROUP BY cart_id
+    ) items
+    WHERE cart.id = items.cart_id
+"""
+
+CATALOG_VERSION = "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM catalog_version_seq"
+
+# The cart, its priced lines and the catalog version in one statement, so one snapshot
+QUOTE = f"""
+    SELECT c.user_id, c.item_count, c.subtotal, p.id AS product_id, p.name, p.price,
+        count(ci.id) AS quantity, ({CATALOG_VERSION}) AS catalog_version
+    FROM cart c
+    LEFT JOIN cartitem ci ON ci.cart_id = c.id
+    LEFT JOIN product p ON p.id = ci.product_id
+    WHERE c.id = :cart_id
+    GROUP BY c.id, p.id
+    ORDER BY p.id
+"""
+
+
+async def adjust_cart_totals(db: AsyncSession, items: list[tuple[int, int]], sign: int) -> None:
+    """Add to the totals of their carts the items given as (cart_id, product_id), or remove
+    them with sign -1, at the current prices."""
+    if not items:
+        return
+    product_ids = [product_id for _, product_id in items]
+    await db.execute(text(LOCK_PRICES), {"product_ids": sorted(set(product_ids))})
+    await db.execute(
+        text(ADJUST_CART_TOTALS),
+        {"sign": sign, "cart_ids": [cart_id for cart_id, _ in items], "product_ids": product_ids},
+    )
+
+
+async def reprice_carts(db: AsyncSession, product_id: int, delta: float) -> None:
+    """Apply the price change delta of a product to the carts holding it."""
+    await db.execute(text(REPRICE_CARTS), {"product_id": product_id, "delta": delta})
 
+
+async def bump_catalog_version(db: AsyncSession) -> None:
+    await db.execute(text("SELECT nextval('catalog_version_seq')"))
+
+
+async def lock_cart(db: AsyncSession, cart_id: int | None, read: bool = False) -> Cart | None:
+    """Load the cart locked against its deletion until the end of the transaction.
+
+    FOR NO KEY UPDATE, or FOR KEY SHARE with read, conflicts with the FOR UPDATE of the cart
+    sweeper but not with the other writers of the cart. A cart deleted by the sweeper while
+    waiting for the lock is None, so the caller answers 404 instead of failing a foreign key.
+    """
+    result = await db.exec(
+        select(Cart).where(Cart.id == cart_id).with_for_update(read=read, key_share=True)
+    )
+    return result.first()
+
+
+@traced()
+@transactional("create_cart")
 async def create_new_cart(cart_request: CartCreate, db: AsyncSession, user_id: int) -> Cart:
     cart = Cart(**cart_request.model_dump())
     cart.user_id = user_id
     db.add(cart)
     await db.commit()
     await db.refresh(cart)
+    carts_created.inc()
     return cart
 
 
+@traced()
 async def get_carts(db: AsyncSession, user: TokenUser) -> list[Cart] | None:
     result: ScalarResult[Cart] | None = None
     if user.role == Role.admin:
@@ -26,6 +129,7 @@ async def get_carts(db: AsyncSession, user: TokenUser) -> list[Cart] | None:
     return list(result.all())
 
 
+@traced()
 async def get_cart_by_id(cart_id: int, db: AsyncSession, user: TokenUser) -> Cart | None:
     result: ScalarResult[Cart] | None = None
     if user.role == Role.admin:
@@ -37,33 +141,191 @@ async def get_cart_by_id(cart_id: int, db: AsyncSession, user: TokenUser) -> Car
     return result.first()
 
 
+@traced()
+@transactional("add_cart_item")
 async def add_item(
     cart_id: int, item_request: CartItemCreate, db: AsyncSession, user_id: int
 ) -> None:
-    cart: Cart | None = await db.get(Cart, cart_id)
+    cart: Cart | None = await lock_cart(db, cart_id)
     if not cart:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
     check_cart_owner(cart, user_id, "You can only add item to your cart")
     cart_item = CartItem(**item_request.model_dump())
     cart_item.cart_id = cart_id
     db.add(cart_item)
+    await db.flush()
+    await adjust_cart_totals(db, [(cart_id, cart_item.product_id)], 1)
     await db.commit()
 
 
+@traced()
+@transactional("delete_cart_item")
 async def delete_item(cart_id: int, item_id: int, db: AsyncSession, user_id: int) -> None:
-    cart: Cart | None = await db.get(Cart, cart_id)
+    cart: Cart | None = await lock_cart(db, cart_id)
     if not cart:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
     check_cart_owner(cart, user_id, "You can only delete item from your cart")
     item: CartItem | None = await db.get(CartItem, item_id)
+    if item is None or item.cart_id != cart_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
     await db.delete(item)
+    await db.flush()
+    await adjust_cart_totals(db, [(cart_id, item.product_id)], -1)
     await db.commit()
 
 
+@traced()
+@transactional("delete_cart")
 async def delete_cart_by_id(cart_id: int, db: AsyncSession, user_id: int) -> None:
-    cart: Cart | None = await db.get(Cart, cart_id)
+    cart: Cart | None = await lock_cart(db, cart_id)
     if not cart:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
     check_cart_owner(cart, user_id, "You can only delete your cart")
     await db.delete(cart)
     await db.commit()
+
+
+@traced()
+async def get_cart_quote(cart_id: int, db: AsyncSession, user: TokenUser) -> CartQuote:
+    """Price the items of the cart at the current prices with a single query."""
+    result = await db.execute(text(QUOTE), {"cart_id": cart_id})
+    rows = result.all()
+    if not rows or (user.role != Role.admin and rows[0].user_id != user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
+    lines = [
+        CartQuoteLine(
+            product_id=row.product_id,
+            name=row.name,
+            unit_price=row.price,
+            quantity=row.quantity,
+            amount=row.price * row.quantity,
+        )
+        for row in rows
+        if row.product_id is not None
+    ]
+    return CartQuote(
+        cart_id=cart_id,
+        lines=lines,
+        item_count=rows[0].item_count,
+        subtotal=rows[0].subtotal,
+        catalog_version=rows[0].catalog_version,
+    )
+
+
+@dataclass
+class CartWrite:
+    """An item added to a cart (item is set) or removed from it (item_id is set)."""
+
+    cart_id: int
+    user_id: int
+    item: CartItemCreate | None = None
+    item_id: int | None = None
+
+
+def group_cart_writes(writes: list[CartWrite]) -> list[list[CartWrite]]:
+    """Split writes into runs of consecutive additions or removals, in their order."""
+    return [list(run) for _, run in itertools.groupby(writes, key=lambda write: write.item is None)]
+
+
+@transactional("apply_cart_writes")
+async def _apply_cart_writes(db: AsyncSession, writes: list[CartWrite]) -> list[Exception | None]:
+    errors: dict[int, Exception] = {}
+    # Locked in the order of their ids like lock_cart does, carts swept meanwhile are not found
+    result = await db.exec(
+        select(Cart.id, Cart.user_id)
+        .where(col(Cart.id).in_({write.cart_id for write in writes}))
+        .order_by(col(Cart.id))
+        .with_for_update(key_share=True)
+    )
+    owners = dict(result.all())
+    allowed: list[CartWrite] = []
+    for write in writes:
+        owner = owners.get(write.cart_id)
+        if owner is None:
+            errors[id(write)] = HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found"
+            )
+        elif owner != write.user_id:
+            action = "add item to" if write.item is not None else "delete item from"
+            errors[id(write)] = HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail=f"You can only {action} your cart"
+            )
+        else:
+            allowed.append(write)
+
+    # Each run is one statement and the runs are executed in order, so the writes to a cart
+    # are applied in the order they arrived
+    for run in group_cart_writes(allowed):
+        if run[0].item is not None:
+            rows = [
+                {**write.item.model_dump(), "cart_id": write.cart_id}
+                for write in run
+                if write.item is not None
+            ]
+            await db.execute(insert(CartItem).values(rows))
+            added = [(row["cart_id"], row["product_id"]) for row in rows]
+            await adjust_cart_totals(db, added, 1)
+            continue
+        pairs = [(write.item_id, write.cart_id) for write in run]
+        deleted = await db.execute(
+            delete(CartItem)
+            .where(tuple_(col(CartItem.id), col(CartItem.cart_id)).in_(pairs))
+            .returning(col(CartItem.id), col(CartItem.cart_id), col(CartItem.product_id))
+        )
+        removed = deleted.all()
+        await adjust_cart_totals(
+            db, [(cart_id, product_id) for _, cart_id, product_id in removed], -1
+        )
+        found = {item_id for item_id, _, _ in removed}
+        for write in run:
+            if write.item_id not in found:
+                errors[id(write)] = HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found"
+                )
+    await db.commit()
+    return [errors.get(id(write)) for write in writes]
+
+
+@traced()
+async def apply_cart_writes(writes: list[CartWrite]) -> list[Exception | None]:
+    """Apply cart writes with one statement per run of additions or removals and one commit.
+
+    Each write gets None once committed, or its own error. When the transaction fails, the
+    writes are applied again one at a time so that one bad write does not fail the others.
+    """
+    async with async_session_maker() as db:
+        try:
+            return await _apply_cart_writes(db, writes)
+        except SQLAlchemyError:
+            if len(writes) == 1:
+                raise
+            logger.exception("Failed to apply %d cart writes, retrying one by one", len(writes))
+    results = []
+    for write in writes:
+        try:
+            results += await apply_cart_writes([write])
+        except SQLAlchemyError as error:
+            results.append(error)
+    return results
+
+
+# A single worker keeps the batches, and so the writes to each cart, in arrival order
+cart_writes: MicroBatcher[CartWrite, None] = MicroBatcher(
+    "cart_writes",
+    apply_cart_writes,
+    max_batch=config.cart_coalesce_size,
+    max_wait=config.cart_coalesce_wait,
+    max_queue=config.cart_queue_size,
+)
+
+
+async def submit_cart_write(write: CartWrite) -> None:
+    """Apply the write with the next batch of cart writes and wait until it is committed."""
+    try:
+        await cart_writes.submit(write)
+    except BatcherFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending cart changes",
+            headers={"Retry-After": "1"},
+        )
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import config
+from app.core.database import async_engine
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+carts_swept = registry.counter("cart_sweep_carts_total", "Expired carts deleted by the sweeper")
+cart_items_swept = registry.counter(
+    "cart_sweep_items_total", "Items of expired carts deleted by the sweeper"
+)
+cart_sweep_batches = registry.counter("cart_sweep_batches_total", "Cart sweeper batches")
+cart_sweep_last_run = registry.gauge(
+    "cart_sweep_last_run_timestamp_seconds", "End of the last complete cart sweep"
+)
+
+# Carts are locked with SKIP LOCKED, a cart being changed is left to the next sweep and the
+# processes of the application can sweep together. Carts of an order are kept
+SWEEP_BATCH = """
+    WITH expired AS (
+        SELECT c.id FROM cart c
+        WHERE c.last_activity < :cutoff
+            AND NOT EXISTS (SELECT 1 FROM "order" o WHERE o.cart_id = c.id)
+        LIMIT :limit FOR UPDATE SKIP LOCKED
+    ),
+    items AS (
+        DELETE FROM cartitem WHERE cart_id IN (SELECT id FROM expired) RETURNING id
+    ),
+    carts AS (
+        DELETE FROM cart WHERE id IN (SELECT id FROM expired) RETURNING id
+    )
+    SELECT (SELECT count(*) FROM carts), (SELECT count(*) FROM items)
+"""
+
+
+class CartSweeper:
+    """Delete the carts without activity for ttl_days with their items, every interval seconds.
+
+    Each batch of at most batch_size carts is deleted in its own short transaction, so the
+    sweep never holds many locks or a long snapshot.
+    """
+
+    def __init__(self, engine: AsyncEngine, ttl_days: float, interval: float, batch_size: int):
+        self.engine = engine
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task[None] | None = None
+
+    async def sweep_batch(self, cutoff: datetime) -> tuple[int, int]:
+        """Delete a batch of carts idle since before cutoff, returning the carts and items."""
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                text(SWEEP_BATCH), {"cutoff": cutoff, "limit": self.batch_size}
+            )
+            carts, items = result.one()
+        cart_sweep_batches.inc()
+        carts_swept.inc(amount=carts)
+        cart_items_swept.inc(amount=items)
+        return carts, items
+
+    async def sweep(self) -> int:
+        """Delete all the expired carts, returning their number."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.ttl_days)
+        swept = 0
+        while True:
+            carts, _ = await self.sweep_batch(cutoff)
+            swept += carts
+            if carts < self.batch_size:
+                break
+            # Let the requests run between the batches
+            await asyncio.sleep(0)
+        cart_sweep_last_run.set(time.time())
+        return swept
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                swept = await self.sweep()
+                if swept:
+                    logger.info("Deleted %d expired carts", swept)
+            except Exception:
+                logger.exception("Failed to sweep the expired carts")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+cart_sweeper = CartSweeper(
+    async_engine, config.cart_ttl_days, config.cart_sweep_interval, config.cart_sweep_batch
+)
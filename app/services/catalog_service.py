@@ -0,0 +1,65 @@
+from typing import Any
+
+from sqlalchemy import text
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.tracing import traced
+from app.models.catalog import (
+    CATALOG_LOCK,
+    CatalogCategory,
+    CatalogChanges,
+    CatalogDeletion,
+    CatalogProduct,
+    CatalogTombstone,
+)
+from app.models.category import Category
+from app.models.product import Product
+
+
+async def lock_catalog(db: AsyncSession) -> None:
+    """Serialize the catalog writes until the transaction ends.
+
+    Change numbers are then taken and committed in the same order, a change that is not
+    visible yet always gets a number above the visible ones and is never skipped by replicas.
+    """
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CATALOG_LOCK})
+
+
+def record_deletion(db: AsyncSession, entity: str, entity_id: int) -> None:
+    db.add(CatalogTombstone(entity=entity, entity_id=entity_id))
+
+
+@traced()
+async def get_catalog_changes(db: AsyncSession, since: int, limit: int) -> CatalogChanges:
+    """Return up to limit changes of the catalog numbered after since, in order."""
+    # One snapshot for the three reads, a change committed between two of them could be
+    # skipped otherwise
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    changes: list[tuple[int, Any]] = []
+    models: tuple[Any, ...] = (Product, Category, CatalogTombstone)
+    for model in models:
+        result = await db.exec(
+            select(model)
+            .where(col(model.change_seq) > since)
+            .order_by(col(model.change_seq))
+            .limit(limit + 1)
+        )
+        changes += [(row.change_seq, row) for row in result.all()]
+    changes.sort(key=lambda change: change[0])
+    page = changes[:limit]
+    response = CatalogChanges(
+        next_since=page[-1][0] if page else since, has_more=len(changes) > limit
+    )
+    for _, row in page:
+        if isinstance(row, Product):
+            response.products.append(CatalogProduct.model_validate(row, from_attributes=True))
+        elif isinstance(row, Category):
+            response.categories.append(CatalogCategory.model_validate(row, from_attributes=True))
+        else:
+            response.deleted.append(
+                CatalogDeletion(entity=row.entity, id=row.entity_id, change_seq=row.change_seq)
+            )
+    # Nothing was written, ending the transaction releases the snapshot
+    await db.rollback()
+    return response
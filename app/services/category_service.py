@@ -5,27 +5,34 @@ from sqlalchemy.engine import ScalarResult
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.tracing import traced
 from app.models.category import Category, CategoryCreate, CategoryUpdate
+from app.services.catalog_service import lock_catalog, record_deletion
 
 
+@traced()
 async def create_new_category(category_request: CategoryCreate, db: AsyncSession) -> Category:
     category = Category(**category_request.model_dump())
+    await lock_catalog(db)
     db.add(category)
     await db.commit()
     await db.refresh(category)
     return category
 
 
+@traced()
 async def get_all_categories(db: AsyncSession) -> list[Category]:
     result: ScalarResult[Category] = await db.exec(select(Category))
     return list(result.all())
 
 
+@traced()
 async def get_category_by_id(category_id: int, db: AsyncSession) -> Category | None:
     result: Category | None = await db.get(Category, category_id)
     return result
 
 
+@traced()
 async def update_category_info(
     category_view: CategoryUpdate, category_id: int, db: AsyncSession
 ) -> Category:
@@ -33,6 +40,7 @@ async def update_category_info(
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     category_data: dict[str, Any] = category_view.model_dump(exclude_unset=True)
+    await lock_catalog(db)
     db_category.sqlmodel_update(category_data)
     db.add(db_category)
     await db.commit()
@@ -40,9 +48,12 @@ async def update_category_info(
     return db_category
 
 
+@traced()
 async def delete_category_by_id(category_id: int, db: AsyncSession) -> None:
     db_category: Category | None = await db.get(Category, category_id)
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    await lock_catalog(db)
     await db.delete(db_category)
+    record_deletion(db, "category", category_id)
     await db.commit()
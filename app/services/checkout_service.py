@@ -0,0 +1,93 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+
+from app.core.batching import BatcherFull, MicroBatcher
+from app.core.config import config
+from app.models.order import CheckoutStatus, Order, OrderCreate
+from app.services.order_service import create_orders_batch
+
+checkout_batcher: MicroBatcher[tuple[OrderCreate, int], Order] = MicroBatcher(
+    "checkout",
+    create_orders_batch,
+    max_batch=config.checkout_batch_size,
+    max_wait=config.checkout_batch_wait,
+    max_queue=config.checkout_queue_size,
+)
+
+
+@dataclass
+class CheckoutTicket:
+    user_id: int
+    created: float
+    status: str = "pending"
+    order_id: int | None = None
+    detail: str | None = None
+
+
+# Tickets of the accepted checkouts, oldest first. They only live in the process that accepted
+# the checkout and are forgotten checkout_ticket_ttl seconds after they were created
+tickets: OrderedDict[str, CheckoutTicket] = OrderedDict()
+
+
+def _expire_tickets(now: float) -> None:
+    while tickets:
+        ticket = next(iter(tickets.values()))
+        if ticket.status == "pending" or now - ticket.created < config.checkout_ticket_ttl:
+            return
+        tickets.popitem(last=False)
+
+
+def _queue_full() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many pending checkouts",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def submit_order(order_request: OrderCreate, user_id: int) -> Order:
+    """Create the order with the next checkout batch and wait until it is committed."""
+    try:
+        return await checkout_batcher.submit((order_request, user_id))
+    except BatcherFull:
+        raise _queue_full()
+
+
+def enqueue_order(order_request: OrderCreate, user_id: int) -> str:
+    """Queue the order for the next checkout batch and return the id of its ticket."""
+    now = time.monotonic()
+    _expire_tickets(now)
+    try:
+        future = checkout_batcher.enqueue((order_request, user_id))
+    except BatcherFull:
+        raise _queue_full()
+    ticket_id = uuid.uuid4().hex
+    ticket = CheckoutTicket(user_id=user_id, created=now)
+    tickets[ticket_id] = ticket
+
+    def resolve(future: asyncio.Future[Order]) -> None:
+        error = future.exception()
+        if error is None:
+            ticket.status = "created"
+            ticket.order_id = future.result().id
+        else:
+            ticket.status = "failed"
+            ticket.detail = error.detail if isinstance(error, HTTPException) else "Checkout failed"
+
+    future.add_done_callback(resolve)
+    return ticket_id
+
+
+def get_checkout_status(ticket_id: str, user_id: int) -> CheckoutStatus:
+    ticket = tickets.get(ticket_id)
+    # Tickets of other users are reported missing, like their orders
+    if ticket is None or ticket.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Checkout not found")
+    return CheckoutStatus(
+        ticket_id=ticket_id, status=ticket.status, order_id=ticket.order_id, detail=ticket.detail
+    )
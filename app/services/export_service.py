@@ -0,0 +1,391 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import config
+from app.core.database import async_engine, copy_connection
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+exported_rows = registry.counter(
+    "export_rows_total", "Rows written to the Parquet export", ("table",)
+)
+
+WATERMARK_FILE = "_watermarks.json"
+STAGING_DIR = ".staging"
+# Above every id, the first batch then starts after all the rows changed at the watermark
+MAX_KEY = 2**31 - 1
+
+
+@dataclass
+class ExportTable:
+    """A table exported to Parquet, the rows changed since the last export each run."""
+
+    name: str
+    columns: str
+    source: str
+    # Time of the last change of a row and the unique key ordering the rows changed together
+    changed: str
+    key: str
+    schema: pa.Schema
+    # Column of the Hive style directories the files are split in
+    partition: str | None = None
+
+    def batch_query(self) -> str:
+        """Return the COPY query of the next batch of rows changed in a time range.
+
+        Rows are read in (changed, key) order from after the last row of the previous batch
+        ($1 microseconds since the epoch and $2) up to $3, at most $4 rows.
+        """
+        return f"""
+            SELECT {self.columns},
+                CAST(extract(epoch FROM {self.changed}) * 1000000 AS bigint) AS changed_at
+            FROM {self.source}
+            WHERE ({self.changed}, {self.key}) > (to_timestamp(CAST($1 AS bigint) / 1000000.0), $2)
+                AND {self.changed} <= to_timestamp(CAST($3 AS bigint) / 1000000.0)
+            ORDER BY {self.changed}, {self.key}
+            LIMIT $4
+        """
+
+
+_ORDER_MONTH = "to_char({}.order_date, 'YYYY-MM') AS order_month"
+
+EXPORT_TABLES = [
+    ExportTable(
+        name="order",
+        columns="o.id, o.order_date, o.order_status, o.shipping_address, o.cart_id, "
+        f"o.order_amount, o.user_id, {_ORDER_MONTH.format('o')}",
+        source='"order" o',
+        changed="o.updated_at",
+        key="o.id",
+        schema=pa.schema(
+            [
+                ("id", pa.int32()),
+                ("order_date", pa.date32()),
+                ("order_status", pa.string()),
+                ("shipping_address", pa.string()),
+                ("cart_id", pa.int32()),
+                ("order_amount", pa.float64()),
+                ("user_id", pa.int32()),
+                ("order_month", pa.string()),
+            ]
+        ),
+        partition="order_month",
+    ),
+    # Items are exported again with their order whenever it changes
+    ExportTable(
+        name="orderitem",
+        columns="oi.id, oi.order_id, oi.order_date, oi.product_id, oi.quantity, "
+        "oi.unit_price, oi.product_name, oi.category_id, oi.created_date, "
+        f"{_ORDER_MONTH.format('oi')}",
+        source='"order" o JOIN orderitem oi '
+        "ON oi.order_id = o.id AND oi.order_date = o.order_date",
+        changed="o.updated_at",
+        key="oi.id",
+        schema=pa.schema(
+            [
+                ("id", pa.int32()),
+                ("order_id", pa.int32()),
+                ("order_date", pa.date32()),
+                ("product_id", pa.int32()),
+                ("quantity", pa.int32()),
+                ("unit_price", pa.float64()),
+                ("product_name", pa.string()),
+                ("category_id", pa.int32()),
+                ("created_date", pa.date32()),
+                ("order_month", pa.string()),
+            ]
+        ),
+        partition="order_month",
+    ),
+    # Orders moved to the archive, items stay a JSON array
+    ExportTable(
+        name="orderarchive",
+        columns="a.id, a.order_date, a.order_status, a.shipping_address, a.cart_id, "
+        f"a.order_amount, a.user_id, CAST(a.items AS text), {_ORDER_MONTH.format('a')}",
+        source="orderarchive a",
+        changed="a.archived_at",
+        key="a.id",
+        schema=pa.schema(
+            [
+                ("id", pa.int32()),
+                ("order_date", pa.date32()),
+                ("order_status", pa.string()),
+                ("shipping_address", pa.string()),
+                ("cart_id", pa.int32()),
+                ("order_amount", pa.float64()),
+                ("user_id", pa.int32()),
+                ("items", pa.string()),
+                ("order_month", pa.string()),
+            ]
+        ),
+        partition="order_month",
+    ),
+    # Orders removed from the order tables, their rows of order and orderitem are deleted.
+    # Archived orders are the only ones removed one by one, they then live on in orderarchive
+    ExportTable(
+        name="order_deleted",
+        columns=f"a.id, a.order_date, 'archived', {_ORDER_MONTH.format('a')}",
+        source="orderarchive a",
+        changed="a.archived_at",
+        key="a.id",
+        schema=pa.schema(
+            [
+                ("id", pa.int32()),
+                ("order_date", pa.date32()),
+                ("reason", pa.string()),
+                ("order_month", pa.string()),
+            ]
+        ),
+        partition="order_month",
+    ),
+    # Months detached from the order tables, all their rows of order and orderitem are deleted
+    ExportTable(
+        name="order_month_detached",
+        columns="d.id, to_char(d.month, 'YYYY-MM'), d.schema_name",
+        source="detachedmonth d",
+        changed="d.detached_at",
+        key="d.id",
+        schema=pa.schema(
+            [("id", pa.int32()), ("order_month", pa.string()), ("schema_name", pa.string())]
+        ),
+    ),
+    ExportTable(
+        name="product",
+        columns="p.id, p.name, p.quantity, p.description, p.price, p.category_id",
+        source="product p",
+        changed="p.updated_at",
+        key="p.id",
+        schema=pa.schema(
+            [
+                ("id", pa.int32()),
+                ("name", pa.string()),
+                ("quantity", pa.int32()),
+                ("description", pa.string()),
+                ("price", pa.float64()),
+                ("category_id", pa.int32()),
+            ]
+        ),
+    ),
+    ExportTable(
+        name="category",
+        columns="c.id, c.name",
+        source="category c",
+        changed="c.updated_at",
+        key="c.id",
+        schema=pa.schema([("id", pa.int32()), ("name", pa.string())]),
+    ),
+]
+
+
+def read_batch(data: bytes, table: ExportTable) -> pa.Table:
+    """Parse a COPY CSV batch of table into Arrow columns, with changed_at as a timestamp."""
+    names = table.schema.names + ["changed_at"]
+    types = {**{item.name: item.type for item in table.schema}, "changed_at": pa.int64()}
+    batch = pa_csv.read_csv(
+        pa.BufferReader(data),
+        read_options=pa_csv.ReadOptions(column_names=names),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        # COPY writes NULL as an empty field and an empty string as ""
+        convert_options=pa_csv.ConvertOptions(
+            column_types=types, strings_can_be_null=True, quoted_strings_can_be_null=False
+        ),
+    )
+    changed = batch.column("changed_at").cast(pa.timestamp("us", tz="UTC"))
+    return batch.set_column(len(names) - 1, "changed_at", changed)
+
+
+def write_batch(data: bytes, table: ExportTable, directory: str, name: str) -> tuple[int, int, Any]:
+    """Write a batch as Parquet files, returning its size and the changed_at and key of its
+    last row."""
+    batch = read_batch(data, table)
+    partitioning = None
+    if table.partition is not None:
+        partitioning = ds.partitioning(
+            pa.schema([batch.schema.field(table.partition)]), flavor="hive"
+        )
+    ds.write_dataset(
+        batch,
+        os.path.join(directory, table.name),
+        format="parquet",
+        partitioning=partitioning,
+        basename_template=f"{name}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    last = batch.num_rows - 1
+    key = table.key.split(".")[-1]
+    return batch.num_rows, batch.column("changed_at")[last].value, batch.column(key)[last].as_py()
+
+
+async def export_table(
+    source: Any, table: ExportTable, since: int, until: int, batch_rows: int, directory: str
+) -> int:
+    """Write the rows of table changed after since up to until (microseconds since the epoch)
+    to directory, returning their number."""
+    query = table.batch_query()
+    last_changed, last_key = since, MAX_KEY
+    rows = 0
+    index = 0
+    while True:
+        chunks: list[bytes] = []
+
+        async def collect(data: bytes) -> None:
+            chunks.append(data)
+
+        # COPY streams the batch as CSV which Arrow parses into columns, no row is ever a
+        # Python object. Each batch is a keyset query, a COPY cannot read from a cursor
+        await source.copy_from_query(
+            query, last_changed, last_key, until, batch_rows, output=collect, format="csv"
+        )
+        data = b"".join(chunks)
+        if not data:
+            break
+        count, last_changed, last_key = await asyncio.to_thread(
+            write_batch, data, table, directory, f"part-{index}"
+        )
+        rows += count
+        index += 1
+        exported_rows.inc((table.name,), count)
+        if count < batch_rows:
+            break
+    return rows
+
+
+def read_watermarks(directory: str) -> dict[str, int]:
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        watermarks: dict[str, int] = json.load(file)
+    return watermarks
+
+
+def _write_watermarks(directory: str, watermarks: dict[str, int]) -> None:
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(watermarks, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def _publish(staging: str, directory: str, run_id: str) -> None:
+    # Files are named after the run so that they never replace the files of other runs
+    for root, _, files in os.walk(staging):
+        target = os.path.join(directory, os.path.relpath(root, staging))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target, f"{run_id}-{name}"))
+    shutil.rmtree(staging)
+
+
+async def export_tables(
+    engine: AsyncEngine, directory: str, batch_rows: int, lag: float
+) -> dict[str, int]:
+    """Export the rows changed since the last run to Parquet files in directory.
+
+    All tables are read from one snapshot, up to lag seconds before it: a row changed by a
+    transaction still running at the snapshot is only missed if it runs for longer than that.
+    The files are written to a staging directory and moved in place once all tables are
+    exported, then the watermarks are saved, so that a failed run is simply run again.
+    Returns the number of rows exported per table.
+    """
+    watermarks = read_watermarks(directory)
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(directory, STAGING_DIR, run_id)
+    rows: dict[str, int] = {}
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            result = await conn.execute(
+                text("SELECT CAST(extract(epoch FROM now()) * 1000000 AS bigint) - :lag"),
+                {"lag": int(lag * 1_000_000)},
+            )
+            until: int = result.scalar_one()
+            source = await copy_connection(conn)
+            for table in EXPORT_TABLES:
+                since = watermarks.get(table.name, 0)
+                rows[table.name] = await export_table(
+                    source, table, since, until, batch_rows, staging
+                )
+    await asyncio.to_thread(_publish, staging, directory, run_id)
+    _write_watermarks(directory, {table.name: until for table in EXPORT_TABLES})
+    return rows
+
+
+@dataclass
+class ExportRun:
+    started: datetime
+    finished: datetime | None = None
+    rows: dict[str, int] = field(default_factory=dict)
+    error: str | None = None
+
+
+@dataclass
+class ExportStatus:
+    running: bool
+    last: ExportRun | None
+    # Rows changed up to these times are exported
+    watermarks: dict[str, datetime]
+
+
+class ExportRunner:
+    """Run exports in the background of the application, one at a time."""
+
+    def __init__(self) -> None:
+        self.last: ExportRun | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        """Start an export, return False when one is already running."""
+        if self.running:
+            return False
+        self.last = ExportRun(started=datetime.now(timezone.utc))
+        self._task = asyncio.get_running_loop().create_task(self._run(self.last))
+        return True
+
+    def status(self) -> ExportStatus:
+        watermarks = {
+            name: datetime.fromtimestamp(value / 1_000_000, timezone.utc)
+            for name, value in read_watermarks(config.export_dir).items()
+        }
+        return ExportStatus(running=self.running, last=self.last, watermarks=watermarks)
+
+    async def _run(self, run: ExportRun) -> None:
+        try:
+            run.rows = await export_tables(
+                async_engine, config.export_dir, config.export_batch_rows, config.export_lag
+            )
+        except Exception as error:
+            logger.exception("The Parquet export failed")
+            run.error = str(error)
+        finally:
+            run.finished = datetime.now(timezone.utc)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+exporter = ExportRunner()
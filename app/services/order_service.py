@@ -1,56 +1,233 @@
+import logging
 from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any
 
 from fastapi import HTTPException, status
 from sqlalchemy.engine import ScalarResult
-from sqlmodel import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import col, select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.models.cart import Cart
+from app.core.database import async_session_maker
+from app.core.events import order_events
+from app.core.metrics import orders_created
+from app.core.tracing import traced
+from app.core.transactions import transactional
+from app.models.archive import OrderArchive
+from app.models.cart import Cart, CartItem
 from app.models.order import Order, OrderCreate, OrderItem, Status
 from app.models.product import Product
 from app.models.user import Role, TokenUser
+from app.services.analytics_service import (
+    apply_order_to_rollups,
+    apply_orders_to_rollups,
+)
+from app.services.cart_service import lock_cart
+from app.services.popularity_service import popularity
 from app.utils.auth_utils import check_cart_owner
+from app.utils.etag_utils import check_version
 
+logger = logging.getLogger(__name__)
 
-async def create_new_order(order_request: OrderCreate, db: AsyncSession, user_id: int) -> Order:
-    cart: Cart | None = await db.get(Cart, order_request.cart_id)
-    if not cart:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
-    check_cart_owner(cart, user_id, "You can only create order based on your cart")
 
+def calculate_order_items(
+    cart_items: list[CartItem], products: dict[int, Product]
+) -> tuple[float, list[OrderItem]]:
     # Get a list of product_id from cart items and count the quantity of each product_id
     # to calculate the order amount and update the order item
-    cart_item_product: list[int] = [item.product_id for item in cart.cart_items]
+    cart_item_product: list[int] = [item.product_id for item in cart_items]
     dict_items = dict(Counter(cart_item_product))
     order_amount: float = 0
     order_items: list[OrderItem] = []
     for prod_id, quantity in dict_items.items():
-        product: Product | None = await db.get(Product, prod_id)
+        product: Product | None = products.get(prod_id)
         if not product:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
         order_amount += quantity * product.price
-        order_items.append(OrderItem(quantity=quantity, product_id=prod_id))
+        order_items.append(
+            OrderItem(
+                quantity=quantity,
+                product_id=prod_id,
+                unit_price=product.price,
+                product_name=product.name,
+                category_id=product.category_id,
+            )
+        )
+    return order_amount, order_items
+
+
+def order_status_event(order: Order) -> dict[str, Any]:
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "status": order.order_status.value,
+        "time": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def check_order_cart(cart: Cart | None, user_id: int) -> Cart:
+    if not cart:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
+    check_cart_owner(cart, user_id, "You can only create order based on your cart")
+    return cart
+
 
+def build_order(
+    order_request: OrderCreate, user_id: int, cart: Cart, products: dict[int, Product]
+) -> Order:
+    # The amount is always the sum of the items, at the prices they are stored with
+    order_amount, order_items = calculate_order_items(cart.cart_items, products)
     order = Order(**order_request.model_dump())
     order.user_id = user_id
     order.order_amount = order_amount
     order.order_items = order_items
+    return order
+
+
+async def load_products(db: AsyncSession, product_ids: set[int]) -> dict[int, Product]:
+    result = await db.exec(select(Product).where(col(Product.id).in_(product_ids)))
+    return {product.id: product for product in result.all() if product.id is not None}
+
+
+@traced()
+@transactional("create_order")
+async def create_new_order(order_request: OrderCreate, db: AsyncSession, user_id: int) -> Order:
+    # The cart stays until the order referencing it is committed, the sweeper skips it
+    cart = check_order_cart(await lock_cart(db, order_request.cart_id, read=True), user_id)
+
+    # Load all products of the cart in a single query
+    products = await load_products(db, {item.product_id for item in cart.cart_items})
+    order = build_order(order_request, user_id, cart, products)
     db.add(order)
+    # The rollups are updated in the same transaction so that they never miss an order
+    if order.order_status != Status.cancelled:
+        await apply_order_to_rollups(db, order, order.order_items or [])
     await db.commit()
     await db.refresh(order)
+    orders_created.inc()
+    popularity.record_order(order.order_items or [], products)
     return order
 
 
-async def get_orders(db: AsyncSession, user: TokenUser) -> list[Order] | None:
-    result: ScalarResult[Order] | None = None
-    if user.role == Role.admin:
-        result = await db.exec(select(Order))
-    else:
-        result = await db.exec(select(Order).where(Order.user_id == user.id))
-    return list(result.all())
+async def _create_orders_one_by_one(
+    requests: list[tuple[OrderCreate, int]],
+) -> list[Order | Exception]:
+    results: list[Order | Exception] = []
+    for order_request, user_id in requests:
+        async with async_session_maker() as db:
+            try:
+                results.append(await create_new_order(order_request, db, user_id))
+            except (HTTPException, SQLAlchemyError) as error:
+                results.append(error)
+    return results
+
+
+@traced()
+async def create_orders_batch(requests: list[tuple[OrderCreate, int]]) -> list[Order | Exception]:
+    """Create the orders of (order request, user id) pairs in a single transaction.
+
+    The carts and the products of the whole batch are loaded with one query each and the
+    rollups are updated with one statement each, so a batch costs about the round trips and the
+    commit of a single order. Each request gets its order or its own error. When the transaction
+    fails, the orders are created again one at a time so that one bad order does not fail the
+    others.
+    """
+    results: list[Order | Exception] = []
+    orders: list[Order] = []
+    async with async_session_maker() as db:
+        cart_ids = {request.cart_id for request, _ in requests if request.cart_id is not None}
+        result = await db.exec(
+            select(Cart)
+            .where(col(Cart.id).in_(cart_ids))
+            .order_by(col(Cart.id))
+            .with_for_update(read=True, key_share=True)
+        )
+        carts = {cart.id: cart for cart in result.all()}
+        product_ids = {item.product_id for cart in carts.values() for item in cart.cart_items}
+        products = await load_products(db, product_ids)
+        for order_request, user_id in requests:
+            try:
+                cart = check_order_cart(carts.get(order_request.cart_id), user_id)
+                order = build_order(order_request, user_id, cart, products)
+            except HTTPException as error:
+                results.append(error)
+                continue
+            results.append(order)
+            orders.append(order)
+        if not orders:
+            return results
+        db.add_all(orders)
+        counted = [
+            (order, order.order_items or [])
+            for order in orders
+            if order.order_status != Status.cancelled
+        ]
+        try:
+            await apply_orders_to_rollups(db, counted)
+            await db.commit()
+        except SQLAlchemyError:
+            logger.exception(
+                "Failed to create a batch of %d orders, retrying one by one", len(orders)
+            )
+            await db.rollback()
+            return await _create_orders_one_by_one(requests)
+    for order in orders:
+        orders_created.inc()
+        popularity.record_order(order.order_items or [], products)
+    return results
+
+
+def orders_query(
+    user: TokenUser, start_date: date | None = None, end_date: date | None = None
+) -> SelectOfScalar[Order]:
+    """Return the query of the orders visible to the user, optionally between two dates.
 
+    The date bounds let PostgreSQL only scan the monthly partitions of the range.
+    """
+    query = select(Order)
+    if user.role != Role.admin:
+        query = query.where(Order.user_id == user.id)
+    if start_date is not None:
+        query = query.where(col(Order.order_date) >= start_date)
+    if end_date is not None:
+        query = query.where(col(Order.order_date) <= end_date)
+    return query
 
-async def get_order_by_id(order_id: int, db: AsyncSession, user: TokenUser) -> Order | None:
+
+def archived_orders_query(
+    user: TokenUser, start_date: date | None = None, end_date: date | None = None
+) -> SelectOfScalar[OrderArchive]:
+    query = select(OrderArchive)
+    if user.role != Role.admin:
+        query = query.where(OrderArchive.user_id == user.id)
+    if start_date is not None:
+        query = query.where(col(OrderArchive.order_date) >= start_date)
+    if end_date is not None:
+        query = query.where(col(OrderArchive.order_date) <= end_date)
+    return query
+
+
+@traced()
+async def get_orders(
+    db: AsyncSession,
+    user: TokenUser,
+    start_date: date | None = None,
+    end_date: date | None = None,
+) -> list[Order] | None:
+    result: ScalarResult[Order] = await db.exec(orders_query(user, start_date, end_date))
+    orders = list(result.all())
+    # Old delivered and cancelled orders are moved to the archive, listed after the others
+    archived = await db.exec(archived_orders_query(user, start_date, end_date))
+    return orders + [order.to_order() for order in archived.all()]
+
+
+@traced()
+async def get_order_by_id(
+    order_id: int, db: AsyncSession, user: TokenUser, include_archive: bool = True
+) -> Order | None:
     result: ScalarResult[Order] | None = None
     if user.role == Role.admin:
         result = await db.exec(select(Order).where(Order.id == order_id))
@@ -58,14 +235,54 @@ async def get_order_by_id(order_id: int, db: AsyncSession, user: TokenUser) -> O
         result = await db.exec(
             select(Order).where(Order.id == order_id).where(Order.user_id == user.id)
         )
-    return result.first()
+    order = result.first()
+    if order is not None or not include_archive:
+        return order
+    archived = await db.get(OrderArchive, order_id)
+    if archived is None or (user.role != Role.admin and archived.user_id != user.id):
+        return None
+    return archived.to_order()
 
 
+@traced()
+@transactional("update_order_status")
 async def update_order_status_by_order_id(
-    order_id: int, order_status: str, db: AsyncSession, user: TokenUser
-) -> None:
-    order: Order | None = await get_order_by_id(order_id, db, user)
+    order_id: int,
+    order_status: str,
+    db: AsyncSession,
+    user: TokenUser,
+    versions: set[int] | None = None,
+) -> Order:
+    """Change the status of the order, only when its version is one of versions if given.
+
+    The update applies to the version read, a concurrent change of the order makes it fail with
+    412 and roll back, so that two changes never both update the rollups.
+    """
+    # Archived orders are delivered or cancelled for long and cannot change anymore
+    order: Order | None = await get_order_by_id(order_id, db, user, include_archive=False)
     if order is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-    order.order_status = Status(order_status)
-    await db.commit()
+    check_version(order.version, versions, "Order was changed")
+    new_status = Status(order_status)
+    if new_status == order.order_status:
+        return order
+    old_status = order.order_status
+    order.order_status = new_status
+    try:
+        # The conditional update goes first, a conflict fails before touching the rollups
+        await db.flush()
+        # Cancelled orders are not counted in the rollups
+        if (old_status == Status.cancelled) != (new_status == Status.cancelled):
+            order_items: list[OrderItem] = order.order_items or []
+            sign = -1 if new_status == Status.cancelled else 1
+            await apply_order_to_rollups(db, order, order_items, sign)
+        # Other workers are notified when the transaction commits, this one right after
+        event = order_status_event(order)
+        await order_events.notify(db, event)
+        await db.commit()
+    except StaleDataError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Order was changed concurrently"
+        )
+    order_events.publish(event)
+    return order
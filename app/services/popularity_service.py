@@ -0,0 +1,251 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Sequence
+
+from sqlalchemy import Float, cast, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import config
+from app.core.database import async_session_maker
+from app.core.tracing import traced
+from app.models.order import OrderItem
+from app.models.popularity import (
+    WINDOW_HALF_LIFE,
+    PopularityWindow,
+    ProductPopularity,
+    ProductRanked,
+)
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+# Counters are rebased before 2 ** exponent gets anywhere near the float range
+REBASE_EXPONENT = 64.0
+
+# Ranked products of a window, for all products (None) or a category, as (-score, product_id)
+TopKey = tuple[PopularityWindow, int | None]
+
+
+class PopularityCounters:
+    """Units sold per product with exponential time decay, ranked overall and per category.
+
+    Counters are stored relative to an origin time: a sale of q units at time t adds
+    q * 2 ** ((t - origin) / half_life). All counters then decay together without being
+    updated and the ranking only changes for the product that sold, which keeps the top-k
+    lists exact since a product can only enter one when its own counter grows.
+
+    Sales since the last flush are upserted to the productpopularity table periodically, so
+    that each process adds its own share, and the counters are reloaded from it on startup.
+    """
+
+    def __init__(
+        self, session_maker: async_sessionmaker[AsyncSession], top_k: int, flush_interval: float
+    ) -> None:
+        self.session_maker = session_maker
+        self.top_k = top_k
+        self.flush_interval = flush_interval
+        self._task: asyncio.Task[None] | None = None
+        self._reset(time.time())
+
+    def _reset(self, now: float) -> None:
+        self._origin: dict[PopularityWindow, float] = {window: now for window in PopularityWindow}
+        self._scores: dict[PopularityWindow, dict[int, float]] = {w: {} for w in PopularityWindow}
+        self._pending: dict[PopularityWindow, dict[int, float]] = {w: {} for w in PopularityWindow}
+        self._top: dict[TopKey, list[tuple[float, int]]] = {}
+
+    def _rebase(self, window: PopularityWindow, now: float) -> None:
+        factor = 2.0 ** (-(now - self._origin[window]) / WINDOW_HALF_LIFE[window])
+        for counters in (self._scores[window], self._pending[window]):
+            for product_id in counters:
+                counters[product_id] *= factor
+        for key, top in self._top.items():
+            if key[0] == window:
+                top[:] = [(score * factor, product_id) for score, product_id in top]
+        self._origin[window] = now
+
+    def _rank(self, key: TopKey, product_id: int, score: float) -> None:
+        top = self._top.setdefault(key, [])
+        for index, (_, ranked_id) in enumerate(top):
+            if ranked_id == product_id:
+                del top[index]
+                break
+        if len(top) < self.top_k or -score < top[-1][0]:
+            bisect.insort(top, (-score, product_id))
+            if len(top) > self.top_k:
+                top.pop()
+
+    def record(
+        self, product_id: int, category_id: int, quantity: int, now: float | None = None
+    ) -> None:
+        now = time.time() if now is None else now
+        for window, half_life in WINDOW_HALF_LIFE.items():
+            if abs(now - self._origin[window]) / half_life > REBASE_EXPONENT:
+                self._rebase(window, now)
+            amount = quantity * 2.0 ** ((now - self._origin[window]) / half_life)
+            scores = self._scores[window]
+            scores[product_id] = score = scores.get(product_id, 0.0) + amount
+            pending = self._pending[window]
+            pending[product_id] = pending.get(product_id, 0.0) + amount
+            self._rank((window, None), product_id, score)
+            self._rank((window, category_id), product_id, score)
+
+    def record_order(self, order_items: Sequence[OrderItem], products: dict[int, Product]) -> None:
+        now = time.time()
+        for item in order_items:
+            self.record(item.product_id, products[item.product_id].category_id, item.quantity, now)
+
+    def top(
+        self,
+        window: PopularityWindow,
+        category_id: int | None,
+        limit: int,
+        now: float | None = None,
+    ) -> list[tuple[int, float]]:
+        """Return up to limit (product_id, score) of the window, highest score first."""
+        now = time.time() if now is None else now
+        factor = 2.0 ** (-(now - self._origin[window]) / WINDOW_HALF_LIFE[window])
+        return [
+            (product_id, -score * factor)
+            for score, product_id in self._top.get((window, category_id), [])[:limit]
+        ]
+
+    async def load(self) -> None:
+        async with self.session_maker() as session:
+            result = await session.exec(
+                select(ProductPopularity, Product.category_id).join(
+                    Product, col(Product.id) == ProductPopularity.product_id
+                )
+            )
+            rows = result.all()
+        now = time.time()
+        self._reset(now)
+        by_category: dict[TopKey, list[tuple[float, int]]] = defaultdict(list)
+        for popularity, category_id in rows:
+            window = PopularityWindow(popularity.time_window)
+            age = now - popularity.updated_at.timestamp()
+            score = popularity.score * 2.0 ** (-age / WINDOW_HALF_LIFE[window])
+            self._scores[window][popularity.product_id] = score
+            by_category[(window, None)].append((-score, popularity.product_id))
+            by_category[(window, category_id)].append((-score, popularity.product_id))
+        for key, ranked in by_category.items():
+            self._top[key] = heapq.nsmallest(self.top_k, ranked)
+        logger.info("Loaded %d product popularity counters", len(rows))
+
+    async def flush(self) -> int:
+        """Add the sales since the last flush to the table, returning the number of rows."""
+        now = time.time()
+        updated_at = datetime.fromtimestamp(now, timezone.utc)
+        pending, self._pending = self._pending, {window: {} for window in PopularityWindow}
+        origins = dict(self._origin)
+        rows: dict[PopularityWindow, list[dict[str, Any]]] = {}
+        for window, amounts in pending.items():
+            factor = 2.0 ** (-(now - origins[window]) / WINDOW_HALF_LIFE[window])
+            # Sorted so that processes flushing together lock the rows in the same order
+            rows[window] = [
+                {
+                    "product_id": product_id,
+                    "time_window": window.value,
+                    "score": amounts[product_id] * factor,
+                    "updated_at": updated_at,
+                }
+                for product_id in sorted(amounts)
+            ]
+        try:
+            async with self.session_maker() as session:
+                for window, window_rows in rows.items():
+                    if window_rows:
+                        await session.execute(self._upsert(window, window_rows))
+                await session.commit()
+        except Exception:
+            # Keep the sales for the next flush, rebased if the origin moved meanwhile
+            for window, amounts in pending.items():
+                factor = 2.0 ** (
+                    (origins[window] - self._origin[window]) / WINDOW_HALF_LIFE[window]
+                )
+                counters = self._pending[window]
+                for product_id, amount in amounts.items():
+                    counters[product_id] = counters.get(product_id, 0.0) + amount * factor
+            raise
+        return sum(len(window_rows) for window_rows in rows.values())
+
+    @staticmethod
+    def _upsert(window: PopularityWindow, rows: list[dict[str, Any]]) -> Any:
+        statement = insert(ProductPopularity).values(rows)
+        columns = statement.table.c
+        excluded = statement.excluded
+        elapsed = cast(
+            func.greatest(func.extract("epoch", excluded.updated_at - columns.updated_at), 0),
+            Float,
+        )
+        return statement.on_conflict_do_update(
+            index_elements=["product_id", "time_window"],
+            set_={
+                "score": columns.score * func.power(2.0, -elapsed / WINDOW_HALF_LIFE[window])
+                + excluded.score,
+                "updated_at": func.greatest(excluded.updated_at, columns.updated_at),
+            },
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush the product popularity counters")
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        try:
+            await self.load()
+        except Exception:
+            # The ranking then starts empty, the application must still start
+            logger.exception("Failed to load the product popularity counters")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush the product popularity counters")
+
+
+popularity = PopularityCounters(
+    async_session_maker, config.popularity_top_k, config.popularity_flush_interval
+)
+
+
+@traced()
+async def get_top_products(
+    db: AsyncSession, window: PopularityWindow, category_id: int | None, limit: int
+) -> list[ProductRanked]:
+    ranking = popularity.top(window, category_id, limit)
+    if not ranking:
+        return []
+    result = await db.exec(
+        select(Product).where(col(Product.id).in_([product_id for product_id, _ in ranking]))
+    )
+    products = {product.id: product for product in result.all()}
+    # Deleted products are skipped until they decay out of the ranking
+    return [
+        ProductRanked.model_validate({**products[product_id].model_dump(), "score": score})
+        for product_id, score in ranking
+        if product_id in products
+    ]
@@ -2,47 +2,82 @@ from typing import Any
 
 from fastapi import HTTPException, status
 from sqlalchemy.engine import ScalarResult
+from sqlalchemy.orm.exc import StaleDataError
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.tracing import traced
 from app.models.product import Product, ProductCreate, ProductUpdate
+from app.services.cart_service import bump_catalog_version, reprice_carts
+from app.services.catalog_service import lock_catalog, record_deletion
+from app.utils.etag_utils import check_version
 
 
+@traced()
 async def create_new_product(product_request: ProductCreate, db: AsyncSession) -> Product:
     product = Product(**product_request.model_dump())
+    await lock_catalog(db)
     db.add(product)
     await db.commit()
     await db.refresh(product)
     return product
 
 
+@traced()
 async def get_all_products(db: AsyncSession) -> list[Product]:
     result: ScalarResult[Product] = await db.exec(select(Product))
     return list(result.all())
 
 
+@traced()
 async def get_product_by_id(product_id: int, db: AsyncSession) -> Product | None:
     result: Product | None = await db.get(Product, product_id)
     return result
 
 
+@traced()
 async def update_product_info(
-    product_view: ProductUpdate, product_id: int, db: AsyncSession
+    product_view: ProductUpdate,
+    product_id: int,
+    db: AsyncSession,
+    versions: set[int] | None = None,
 ) -> Product:
+    """Update the product, only when its version is one of versions if given.
+
+    The update applies to the version read: it fails with 412 when the product changed since,
+    without holding a lock on it.
+    """
     db_product: Product | None = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    check_version(db_product.version, versions, "Product was changed")
     product_data: dict[str, Any] = product_view.model_dump(exclude_unset=True)
+    await lock_catalog(db)
+    old_price = db_product.price
     db_product.sqlmodel_update(product_data)
     db.add(db_product)
-    await db.commit()
+    try:
+        # Carts are repriced in the same transaction, their subtotals stay at the current prices
+        if db_product.price != old_price:
+            await db.flush()
+            await reprice_carts(db, product_id, db_product.price - old_price)
+            await bump_catalog_version(db)
+        await db.commit()
+    except StaleDataError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Product was changed concurrently",
+        )
     await db.refresh(db_product)
     return db_product
 
 
+@traced()
 async def delete_product_by_id(product_id: int, db: AsyncSession) -> None:
     db_product: Product | None = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    await lock_catalog(db)
     await db.delete(db_product)
+    record_deletion(db, "product", product_id)
     await db.commit()
@@ -0,0 +1,24 @@
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.tracing import traced
+from app.models.popularity import ProductRanked
+from app.models.product import Product
+from app.models.recommendation import RelatedProduct
+
+
+@traced()
+async def get_related_products(
+    product_id: int, db: AsyncSession, limit: int
+) -> list[ProductRanked]:
+    result = await db.exec(
+        select(Product, RelatedProduct.score)
+        .join(RelatedProduct, col(RelatedProduct.related_product_id) == Product.id)
+        .where(RelatedProduct.product_id == product_id)
+        .order_by(col(RelatedProduct.rank))
+        .limit(limit)
+    )
+    return [
+        ProductRanked.model_validate({**product.model_dump(), "score": score})
+        for product, score in result.all()
+    ]
@@ -6,20 +6,24 @@ from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette import status
 
+from app.core.tracing import traced
 from app.models.user import User, UserCreate, UserUpdateInfo, UserUpdatePassword
 from app.utils.auth_utils import bcrypt_context
 
 
+@traced()
 async def get_all_users(db: AsyncSession) -> list[User]:
     result: ScalarResult[User] = await db.exec(select(User))
     return list(result.all())
 
 
+@traced()
 async def get_user_by_id(user_id: int, db: AsyncSession) -> User | None:
     result: User | None = await db.get(User, user_id)
     return result
 
 
+@traced()
 async def create_new_user(create_user_request: UserCreate, db: AsyncSession) -> User:
     create_user_model = User(
         email=create_user_request.email,
@@ -33,6 +37,7 @@ async def create_new_user(create_user_request: UserCreate, db: AsyncSession) ->
     return create_user_model
 
 
+@traced()
 async def update_password(user_view: UserUpdatePassword, user_id: int, db: AsyncSession) -> None:
     db_user: User | None = await db.get(User, user_id)
     if not db_user:
@@ -43,6 +48,7 @@ async def update_password(user_view: UserUpdatePassword, user_id: int, db: Async
     await db.commit()
 
 
+@traced()
 async def update_information(user_view: UserUpdateInfo, user_id: int, db: AsyncSession) -> User:
     db_user: User | None = await db.get(User, user_id)
     if not db_user:
@@ -55,6 +61,7 @@ async def update_information(user_view: UserUpdateInfo, user_id: int, db: AsyncS
     return db_user
 
 
+@traced()
 async def delete_user_by_id(user_id: int, db: AsyncSession) -> None:
     db_user: User | None = await db.get(User, user_id)
     if not db_user:
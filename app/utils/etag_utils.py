@@ -0,0 +1,29 @@
+from fastapi import HTTPException, status
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_versions(if_match: str | None) -> set[int] | None:
+    """Return the versions accepted by an If-Match header, None when any version is.
+
+    If-Match uses the strong comparison, weak tags never match.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions: set[int] = set()
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    return versions
+
+
+def check_version(version: int, expected: set[int] | None, text: str) -> None:
+    if expected is not None and version not in expected:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=text,
+            headers={"ETag": version_etag(version)},
+        )
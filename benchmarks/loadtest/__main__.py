@@ -0,0 +1,118 @@
+"""Load test the API with weighted shopper scenarios and report latency per route as JSON.
+
+Usage:
+    python -m benchmarks.loadtest run --email user@example.com --password secret \\
+        --concurrency 50 --duration 60 --label my-build --output report.json
+    python -m benchmarks.loadtest run --url http://localhost:8000 --users users.json
+    python -m benchmarks.loadtest compare baseline.json report.json --threshold 0.1
+
+Without --url the application is driven in-process through httpx.ASGITransport, using the
+database configured in config.json. Users must exist already, see benchmarks.seed.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import httpx
+
+from benchmarks.loadtest.report import compare, load_report, write_report
+from benchmarks.loadtest.runner import run_load
+from benchmarks.loadtest.scenarios import DEFAULT_WEIGHTS, SCENARIOS
+
+
+def make_client(url: str | None, concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+    from app.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://loadtest",
+        timeout=30,
+    )
+
+
+def parse_weights(value: str | None) -> dict[str, float]:
+    if not value:
+        return dict(DEFAULT_WEIGHTS)
+    weights: dict[str, float] = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def read_credentials(args: argparse.Namespace) -> list[tuple[str, str]]:
+    credentials = list(zip(args.email or [], args.password or []))
+    if args.users:
+        with open(args.users, "r") as file:
+            credentials += [(user["email"], user["password"]) for user in json.load(file)]
+    if not credentials:
+        raise SystemExit("At least one user is required, use --email/--password or --users")
+    return credentials
+
+
+async def run(args: argparse.Namespace) -> None:
+    weights = parse_weights(args.weights)
+    async with make_client(args.url, args.concurrency) as client:
+        recorder, elapsed = await run_load(
+            client,
+            read_credentials(args),
+            args.concurrency,
+            args.duration,
+            weights,
+            args.seed,
+            args.think_time,
+        )
+    report = recorder.report(
+        elapsed,
+        label=args.label,
+        target=args.url or "in-process",
+        concurrency=args.concurrency,
+        weights=weights,
+        seed=args.seed,
+    )
+    write_report(report, args.output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the load test")
+    run_parser.add_argument("--url", help="Base URL of a running server")
+    run_parser.add_argument("--email", action="append", help="Shopper email, repeatable")
+    run_parser.add_argument("--password", action="append", help="Shopper password, repeatable")
+    run_parser.add_argument("--users", help="JSON file with a list of {email, password}")
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    run_parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds")
+    run_parser.add_argument("--weights", help="e.g. browse=50,checkout=20,login=5")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--label", default="", help="Build label stored in the report")
+    run_parser.add_argument("--output", help="Report file, printed when omitted")
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        asyncio.run(run(args))
+        return
+    rows = compare(load_report(args.baseline), load_report(args.current), args.threshold)
+    print(json.dumps(rows, indent=2))
+    # A non-zero exit code lets CI fail the build on regressions
+    sys.exit(1 if any(row["regressions"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
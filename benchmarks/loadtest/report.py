@@ -0,0 +1,102 @@
+import json
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+@dataclass
+class Recorder:
+    """Collect latencies and errors per route, route names use templates such as GET /product."""
+
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def record(self, route: str, latency: float, error: bool) -> None:
+        self.latencies[route].append(latency)
+        if error:
+            self.errors[route] += 1
+
+    def report(self, elapsed: float, **metadata: Any) -> dict[str, Any]:
+        routes: dict[str, dict[str, float]] = {}
+        total = 0
+        total_errors = 0
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            count = len(values)
+            errors = self.errors.get(route, 0)
+            total += count
+            total_errors += errors
+            routes[route] = {
+                "count": count,
+                "errors": errors,
+                "error_rate": round(errors / count, 6),
+                "throughput_rps": round(count / elapsed, 3),
+                "mean_ms": round(sum(values) / count * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return {
+            **metadata,
+            "elapsed_s": round(elapsed, 3),
+            "total_requests": total,
+            "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+            "error_rate": round(total_errors / total, 6) if total else 0.0,
+            "routes": routes,
+        }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float
+) -> list[dict[str, Any]]:
+    """Compare two reports route by route.
+
+    A route regresses when its p95 or p99 latency grows, or its throughput drops, by more than
+    threshold (a fraction, 0.1 for 10%), or when its error rate increases.
+    """
+    rows: list[dict[str, Any]] = []
+    for route, new in current["routes"].items():
+        old = baseline["routes"].get(route)
+        if old is None:
+            continue
+        row: dict[str, Any] = {"route": route, "regressions": []}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "error_rate"):
+            row[key] = {"baseline": old[key], "current": new[key]}
+            if old[key]:
+                row[key]["change"] = round((new[key] - old[key]) / old[key], 4)
+        for key in ("p95_ms", "p99_ms"):
+            if old[key] and (new[key] - old[key]) / old[key] > threshold:
+                row["regressions"].append(key)
+        if old["throughput_rps"] and (
+            (old["throughput_rps"] - new["throughput_rps"]) / old["throughput_rps"] > threshold
+        ):
+            row["regressions"].append("throughput_rps")
+        if new["error_rate"] > old["error_rate"]:
+            row["regressions"].append("error_rate")
+        rows.append(row)
+    return rows
+
+
+def load_report(path: str) -> dict[str, Any]:
+    with open(path, "r") as file:
+        data: dict[str, Any] = json.load(file)
+    return data
+
+
+def write_report(report: dict[str, Any], path: str | None) -> None:
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
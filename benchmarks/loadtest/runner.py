@@ -0,0 +1,58 @@
+import asyncio
+import random
+from time import perf_counter
+
+import httpx
+
+from benchmarks.loadtest.report import Recorder
+from benchmarks.loadtest.scenarios import SCENARIOS, VirtualUser, login
+
+
+async def _worker(
+    user: VirtualUser, weights: dict[str, float], deadline: float, think_time: float
+) -> None:
+    names = list(weights)
+    cumulative = []
+    total = 0.0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+    while perf_counter() < deadline:
+        name = user.rng.choices(names, cum_weights=cumulative)[0]
+        await SCENARIOS[name](user)
+        if think_time:
+            await asyncio.sleep(user.rng.expovariate(1 / think_time))
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    credentials: list[tuple[str, str]],
+    concurrency: int,
+    duration: float,
+    weights: dict[str, float],
+    seed: int,
+    think_time: float = 0.0,
+) -> tuple[Recorder, float]:
+    """Run concurrent virtual users through weighted scenarios for a fixed duration.
+
+    Virtual users with the same credentials share the token of a single login, made before the
+    duration starts: a login verifies a bcrypt hash, which would otherwise take most of a run
+    with many users. Pass fewer credentials than the concurrency to keep the logins short.
+    """
+    recorder = Recorder()
+    users = [
+        VirtualUser(
+            client, recorder, *credentials[index % len(credentials)], random.Random(seed + index)
+        )
+        for index in range(concurrency)
+    ]
+    first = {user.email: user for user in reversed(users)}
+    # One at a time, concurrent logins would only wait for each other past their deadline
+    for user in first.values():
+        await login(user)
+    for user in users:
+        user.token = first[user.email].token
+    start = perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_worker(user, weights, deadline, think_time) for user in users))
+    return recorder, perf_counter() - start
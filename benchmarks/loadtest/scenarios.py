@@ -0,0 +1,146 @@
+import asyncio
+import random
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from benchmarks.loadtest.report import Recorder
+
+
+class VirtualUser:
+    """A shopper driving the API, every request is recorded under its route template."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        email: str,
+        password: str,
+        rng: random.Random,
+    ) -> None:
+        self.client = client
+        self.recorder = recorder
+        self.email = email
+        self.password = password
+        self.rng = rng
+        self.token: str | None = None
+        self.product_ids: list[int] = []
+        self.order_ids: list[int] = []
+
+    async def request(
+        self, method: str, url: str, route: str, **kwargs: Any
+    ) -> httpx.Response | None:
+        if self.token is not None:
+            kwargs.setdefault("headers", {})["Authorization"] = f"Bearer {self.token}"
+        start = perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(f"{method} {route}", perf_counter() - start, True)
+            return None
+        self.recorder.record(f"{method} {route}", perf_counter() - start, response.is_error)
+        return response
+
+    async def get_json(self, url: str, route: str) -> Any:
+        response = await self.request("GET", url, route)
+        if response is None or response.is_error:
+            return None
+        return response.json()
+
+
+async def login(user: VirtualUser) -> None:
+    response = await user.request(
+        "POST",
+        "/auth/login",
+        "/auth/login",
+        data={"username": user.email, "password": user.password},
+    )
+    if response is not None and not response.is_error:
+        user.token = response.json()["access_token"]
+
+
+async def browse(user: VirtualUser) -> None:
+    products = await user.get_json("/product", "/product")
+    if products:
+        user.product_ids = [product["id"] for product in products]
+    await user.get_json("/category", "/category")
+    for product_id in user.rng.sample(user.product_ids, min(3, len(user.product_ids))):
+        await user.get_json(f"/product/product/{product_id}", "/product/product/{product_id}")
+
+
+async def create_cart(user: VirtualUser) -> int | None:
+    if not user.product_ids:
+        await browse(user)
+    if not user.product_ids:
+        return None
+    response = await user.request("POST", "/cart/", "/cart/", json={})
+    if response is None or response.is_error:
+        return None
+    cart_id: int = response.json()["id"]
+    for _ in range(user.rng.randint(1, 5)):
+        await user.request(
+            "POST",
+            f"/cart/cart/{cart_id}/item",
+            "/cart/cart/{cart_id}/item",
+            json={"product_id": user.rng.choice(user.product_ids)},
+        )
+    await user.get_json(f"/cart/cart/{cart_id}", "/cart/cart/{cart_id}")
+    return cart_id
+
+
+async def shop(user: VirtualUser) -> None:
+    await create_cart(user)
+
+
+async def checkout(user: VirtualUser) -> None:
+    cart_id = await create_cart(user)
+    if cart_id is None:
+        return
+    response = await user.request(
+        "POST",
+        "/order/",
+        "/order/",
+        json={
+            "shipping_address": "1 Load Test Street",
+            "cart_id": cart_id,
+            "order_status": "pending",
+        },
+    )
+    if response is None or response.is_error:
+        return
+    order_id: int = response.json()["id"]
+    user.order_ids.append(order_id)
+    # Poll the order status the way the mobile apps do
+    for _ in range(3):
+        await user.get_json(f"/order/order/{order_id}", "/order/order/{order_id}")
+        await asyncio.sleep(0.1)
+
+
+async def order_history(user: VirtualUser) -> None:
+    orders = await user.get_json("/order", "/order")
+    if orders:
+        user.order_ids = [order["id"] for order in orders[-20:]]
+    if user.order_ids:
+        order_id = user.rng.choice(user.order_ids)
+        await user.get_json(f"/order/order/{order_id}", "/order/order/{order_id}")
+
+
+Scenario = Callable[[VirtualUser], Awaitable[None]]
+
+SCENARIOS: dict[str, Scenario] = {
+    "login": login,
+    "browse": browse,
+    "shop": shop,
+    "checkout": checkout,
+    "order_history": order_history,
+}
+
+# Share of each scenario in the traffic mix
+DEFAULT_WEIGHTS: dict[str, float] = {
+    "login": 5,
+    "browse": 45,
+    "shop": 20,
+    "checkout": 15,
+    "order_history": 15,
+}
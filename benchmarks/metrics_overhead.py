@@ -0,0 +1,65 @@
+"""Measure the per-request cost of MetricsMiddleware.
+
+The same minimal ASGI application is called directly and wrapped in the middleware, the
+difference between both timings is the overhead added to every request.
+
+Usage:
+    python -m benchmarks.metrics_overhead --requests 200000
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from types import SimpleNamespace
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import MetricsMiddleware
+
+ROUTE = SimpleNamespace(path="/order/order/{order_id}")
+
+
+async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    # Mimic the router storing the matched route, then consume the body and answer
+    scope["route"] = ROUTE
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"id": 1}'})
+
+
+async def receive() -> Message:
+    return {"type": "http.request", "body": b'{"shipping_address": "1 Main St"}'}
+
+
+async def send(_: Message) -> None:
+    return None
+
+
+async def run(app: ASGIApp, requests: int) -> float:
+    start = perf_counter()
+    for _ in range(requests):
+        scope: Scope = {"type": "http", "method": "GET", "path": "/order/order/1"}
+        await app(scope, receive, send)
+    return perf_counter() - start
+
+
+async def main(requests: int, rounds: int) -> None:
+    wrapped = MetricsMiddleware(endpoint)
+    # Warm up both paths, then keep the best round to reduce scheduler noise
+    await run(endpoint, 1000)
+    await run(wrapped, 1000)
+    baseline = min([await run(endpoint, requests) for _ in range(rounds)])
+    measured = min([await run(wrapped, requests) for _ in range(rounds)])
+    overhead_us = (measured - baseline) / requests * 1_000_000
+    print(f"requests per round: {requests}")
+    print(f"baseline:   {baseline / requests * 1_000_000:.3f} us/request")
+    print(f"middleware: {measured / requests * 1_000_000:.3f} us/request")
+    print(f"overhead:   {overhead_us:.3f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -0,0 +1,211 @@
+"""Micro-benchmarks of the hot-path building blocks, independent of the database.
+
+Covers token encoding and decoding, bcrypt hashing and verification at the configured cost,
+validation and serialization of large response models and the order amount computation.
+Results are written as JSON and can be compared with a stored baseline, the command exits
+with an error code when a benchmark got slower than the threshold.
+
+Usage:
+    python -m benchmarks.microbench --output baseline.json
+    python -m benchmarks.microbench --compare baseline.json --threshold 0.15
+    python -m benchmarks.microbench --filter token
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+from datetime import date, datetime, timedelta, timezone
+from time import perf_counter
+from typing import Any, Callable
+
+from pydantic import TypeAdapter
+
+from app.models.cart import Cart, CartItem, CartPublicWithItems
+from app.models.order import Order, OrderItem, OrderPublicWithItems, Status
+from app.models.product import Product, ProductPublic
+from app.models.user import Role
+from app.services.auth_service import create_access_token, get_current_user
+from app.services.order_service import calculate_order_items
+from app.utils.auth_utils import bcrypt_context
+
+Benchmark = Callable[[], Any]
+
+
+def make_products(size: int) -> list[Product]:
+    return [
+        Product(
+            id=product_id,
+            name=f"Product {product_id}",
+            quantity=product_id % 100,
+            description=f"Description of product {product_id}",
+            price=round(1 + product_id * 0.37 % 500, 2),
+            category_id=product_id % 20 + 1,
+        )
+        for product_id in range(1, size + 1)
+    ]
+
+
+def make_cart(size: int) -> Cart:
+    cart = Cart(id=1, user_id=1, created_date=date(2024, 1, 1))
+    cart.cart_items = [
+        CartItem(id=item_id, product_id=item_id % 50 + 1, cart_id=1, created_date=date(2024, 1, 1))
+        for item_id in range(1, size + 1)
+    ]
+    return cart
+
+
+def make_order(size: int) -> Order:
+    order = Order(
+        id=1,
+        user_id=1,
+        cart_id=1,
+        order_amount=123.45,
+        order_date=date(2024, 1, 1),
+        order_status=Status.pending,
+        shipping_address="1 Main Street",
+    )
+    order.order_items = [
+        OrderItem(
+            id=item_id,
+            order_id=1,
+            product_id=item_id,
+            quantity=2,
+            unit_price=9.99,
+            product_name=f"Product {item_id}",
+            category_id=1,
+            created_date=date(2024, 1, 1),
+        )
+        for item_id in range(1, size + 1)
+    ]
+    return order
+
+
+def build_benchmarks(size: int) -> dict[str, Benchmark]:
+    token = create_access_token("user@example.com", 1, Role.user, timedelta(minutes=20))
+    password_hash = bcrypt_context.hash("password")
+    products = make_products(size)
+    product_rows = [product.model_dump() for product in products]
+    products_adapter = TypeAdapter(list[ProductPublic])
+    public_products = products_adapter.validate_python(product_rows)
+    cart = make_cart(size)
+    order = make_order(size)
+    products_by_id = {product.id: product for product in products if product.id is not None}
+
+    return {
+        "token.create_access_token": lambda: create_access_token(
+            "user@example.com", 1, Role.user, timedelta(minutes=20)
+        ),
+        "token.get_current_user": lambda: get_current_user(token),
+        "bcrypt.hash": lambda: bcrypt_context.hash("password"),
+        "bcrypt.verify": lambda: bcrypt_context.verify("password", password_hash),
+        f"product_public.validate[{size}]": lambda: products_adapter.validate_python(product_rows),
+        f"product_public.serialize[{size}]": lambda: products_adapter.dump_json(public_products),
+        f"cart_public_with_items.validate_serialize[{size}]": lambda: (
+            CartPublicWithItems.model_validate(cart).model_dump_json()
+        ),
+        f"order_public_with_items.validate_serialize[{size}]": lambda: (
+            OrderPublicWithItems.model_validate(order).model_dump_json()
+        ),
+        f"order.calculate_order_items[{size}]": lambda: calculate_order_items(
+            cart.cart_items, products_by_id
+        ),
+    }
+
+
+def measure(benchmark: Benchmark, min_time: float, rounds: int) -> dict[str, float]:
+    # Calibrate the iterations so that a round lasts about min_time / rounds
+    iterations = 1
+    while True:
+        start = perf_counter()
+        for _ in range(iterations):
+            benchmark()
+        elapsed = perf_counter() - start
+        if elapsed >= min_time / rounds or iterations >= 1_000_000:
+            break
+        iterations *= 2 if elapsed == 0 else max(2, int(min_time / rounds / elapsed) + 1)
+    timings: list[float] = []
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(iterations):
+            benchmark()
+        timings.append((perf_counter() - start) / iterations)
+    median = statistics.median(timings)
+    return {
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if rounds > 1 else 0.0,
+        "ops_per_s": round(1 / median, 3) if median else 0.0,
+        "iterations": iterations,
+        "rounds": rounds,
+    }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float
+) -> list[dict[str, Any]]:
+    """Return the change of each benchmark's median, flagging the ones slower than threshold."""
+    rows: list[dict[str, Any]] = []
+    for name, result in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None or not old["median_us"]:
+            continue
+        change = (result["median_us"] - old["median_us"]) / old["median_us"]
+        rows.append(
+            {
+                "benchmark": name,
+                "baseline_us": old["median_us"],
+                "current_us": result["median_us"],
+                "change": round(change, 4),
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size", type=int, default=1000, help="Length of the large lists")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds per benchmark")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--filter", default="", help="Only run benchmarks containing this")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "bcrypt_rounds": int(bcrypt_context.hash("x").split("$")[2]),
+            "size": args.size,
+        },
+        "benchmarks": {},
+    }
+    for name, benchmark in build_benchmarks(args.size).items():
+        if args.filter in name:
+            results["benchmarks"][name] = measure(benchmark, args.min_time, args.rounds)
+            print(f"{name}: {results['benchmarks'][name]['median_us']} us", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            rows = compare(json.load(file), results, args.threshold)
+        print(json.dumps(rows, indent=2), file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
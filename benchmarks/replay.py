@@ -0,0 +1,187 @@
+"""Replay captured traffic against an instance and report the latency per route as JSON.
+
+The capture files written by app.core.capture are read oldest first and every request is sent
+at its recorded offset divided by --speed, whether or not the previous ones completed. Tokens
+are minted again with create_access_token for the recorded user id and role, so the target
+must share the secret key of config.json. String values of the bodies were replaced by their
+length and are replayed as filler text of the same length, login requests use the credentials
+given on the command line and are skipped otherwise.
+
+Usage:
+    python -m benchmarks.replay capture/traffic.jsonl --url http://localhost:8000 --speed 2 \\
+        --label my-build --output replay.json
+    python -m benchmarks.loadtest compare baseline.json replay.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+from datetime import timedelta
+from time import perf_counter
+from typing import Any, Iterator
+
+import httpx
+
+from app.models.user import Role
+from app.services.auth_service import create_access_token
+from benchmarks.loadtest.report import Recorder, write_report
+
+LOGIN_ROUTE = "/auth/login"
+_string_marker = re.compile(r"<str:(\d+)>")
+
+
+def capture_files(path: str) -> list[str]:
+    """Return the rotated files of a capture, oldest first (traffic.jsonl.5 ... traffic.jsonl)."""
+    backups = [name for name in glob.glob(f"{glob.escape(path)}.*") if name[-1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit(".", 1)[1]), reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def read_capture(path: str) -> Iterator[dict[str, Any]]:
+    for name in capture_files(path):
+        with open(name, "r") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def fill(shape: Any) -> Any:
+    """Rebuild a body from its shape, strings become filler text of the recorded length."""
+    if isinstance(shape, dict):
+        return {key: fill(value) for key, value in shape.items()}
+    if isinstance(shape, list):
+        return [fill(value) for value in shape]
+    if isinstance(shape, str):
+        match = _string_marker.fullmatch(shape)
+        return "x" * int(match.group(1)) if match else shape
+    return shape
+
+
+def build_request(
+    record: dict[str, Any], tokens: dict[tuple[int, str], str], login: tuple[str, str] | None
+) -> dict[str, Any] | None:
+    """Return the keyword arguments of httpx.AsyncClient.request for a captured record."""
+    url = record["route"]
+    for name, value in record["path_params"].items():
+        url = url.replace(f"{{{name}}}", str(value))
+    request: dict[str, Any] = {"method": record["method"], "url": url, "params": record["query"]}
+    body = record["body"]
+    if record["route"] == LOGIN_ROUTE:
+        if login is None:
+            return None
+        request["data"] = {"username": login[0], "password": login[1]}
+    elif isinstance(body, dict) and "__form__" in body:
+        request["data"] = fill(body["__form__"])
+    elif isinstance(body, (dict, list)):
+        request["json"] = fill(body)
+    if record["user_id"] is not None and record["role"] is not None:
+        key = (record["user_id"], record["role"])
+        if key not in tokens:
+            tokens[key] = create_access_token(
+                f"replay-{key[0]}@example.com", key[0], Role(key[1]), timedelta(hours=12)
+            )
+        request["headers"] = {"Authorization": f"Bearer {tokens[key]}"}
+    return request
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: Iterator[dict[str, Any]],
+    speed: float,
+    max_in_flight: int,
+    login: tuple[str, str] | None,
+) -> tuple[Recorder, float, int]:
+    """Send the records on their recorded schedule, returning the recorder and skipped count."""
+    recorder = Recorder()
+    tokens: dict[tuple[int, str], str] = {}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    tasks: set[asyncio.Task[None]] = set()
+    skipped = 0
+
+    async def send(route: str, request: dict[str, Any]) -> None:
+        try:
+            start = perf_counter()
+            try:
+                response = await client.request(**request)
+                error = response.is_error
+            except httpx.HTTPError:
+                error = True
+            recorder.record(route, perf_counter() - start, error)
+        finally:
+            semaphore.release()
+
+    first: float | None = None
+    start = perf_counter()
+    for record in records:
+        request = build_request(record, tokens, login)
+        if request is None:
+            skipped += 1
+            continue
+        if first is None:
+            first = record["ts"]
+        delay = (record["ts"] - first) / speed - (perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Past the in-flight limit the replay falls behind schedule instead of piling up
+        await semaphore.acquire()
+        task = asyncio.create_task(send(f"{record['method']} {record['route']}", request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return recorder, perf_counter() - start, skipped
+
+
+def make_client(url: str | None, max_in_flight: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+    from app.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://replay",
+        timeout=30,
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    login = (args.email, args.password) if args.email and args.password else None
+    async with make_client(args.url, args.max_in_flight) as client:
+        recorder, elapsed, skipped = await replay(
+            client, read_capture(args.capture), args.speed, args.max_in_flight, login
+        )
+    report = recorder.report(
+        elapsed,
+        label=args.label,
+        target=args.url or "in-process",
+        capture=args.capture,
+        speed=args.speed,
+        skipped=skipped,
+    )
+    write_report(report, args.output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("capture", help="Capture file, its rotated backups are included")
+    parser.add_argument("--url", help="Base URL of a running server")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--email", help="User for the captured login requests")
+    parser.add_argument("--password", help="Password for the captured login requests")
+    parser.add_argument("--label", default="", help="Build label stored in the report")
+    parser.add_argument("--output", help="Report file, printed when omitted")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Generate a reproducible synthetic dataset for scale testing.
+
+Volumes are configurable and the data is skewed the way real traffic is: product popularity
+follows a Zipf distribution, orders per user follow a power law and order dates follow a
+seasonal curve with weekly and end-of-year peaks. Rows are loaded with asyncpg COPY in
+parallel batches, every batch draws from its own random generator derived from --seed so the
+same arguments always produce the same data.
+
+Usage:
+    python -m benchmarks.seed --truncate --users 100000 --products 20000 --orders 10000000
+    python -m benchmarks.seed --orders 100000 --credentials-file users.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterator, Sequence
+
+import asyncpg  # type: ignore[import-untyped]
+
+from app.core.config import config
+from app.models.order import Status
+from app.models.user import Role
+from app.utils.auth_utils import bcrypt_context
+
+CART_COLUMNS = ["id", "created_date", "user_id", "last_activity", "item_count", "subtotal"]
+
+TABLES = ["orderitem", "order", "cartitem", "cart", "product", "category", "user"]
+
+
+@dataclass
+class SeedOptions:
+    users: int
+    categories: int
+    products: int
+    orders: int
+    abandoned_carts: int
+    start_date: date
+    end_date: date
+    product_skew: float
+    user_skew: float
+    max_lines: int
+    seed: int
+    batch_size: int
+    workers: int
+    password: str
+
+
+class WeightedChoice:
+    """Draw indexes from fixed weights in O(log n) with a cumulative table."""
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def draw(self, rng: random.Random) -> int:
+        return bisect.bisect_right(self.cumulative, rng.random() * self.total)
+
+
+def zipf_weights(count: int, skew: float, rng: random.Random) -> list[float]:
+    """Zipf weights 1/rank^skew, assigned to the items in a random but seeded order."""
+    weights = [1 / (rank**skew) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+def seasonal_weights(start: date, end: date) -> list[float]:
+    weights: list[float] = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        yearly = 1 + 0.3 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        weekly = 1.25 if day.weekday() >= 5 else 1.0
+        # Black Friday to Christmas
+        peak = (
+            2.0
+            if (day.month == 11 and day.day >= 20) or (day.month == 12 and day.day <= 24)
+            else 1.0
+        )
+        # The business grows over time
+        growth = 1 + offset / 365
+        weights.append(yearly * weekly * peak * growth)
+    return weights
+
+
+def order_status(rng: random.Random, age_days: int) -> Status:
+    if age_days > 14:
+        return Status.cancelled if rng.random() < 0.08 else Status.delivered
+    if age_days > 3:
+        return rng.choice([Status.shipping, Status.delivered, Status.cancelled])
+    return rng.choice([Status.pending, Status.confirmed, Status.shipping])
+
+
+def batches(count: int, size: int, first_id: int = 1) -> Iterator[tuple[int, int, int]]:
+    for index, low in enumerate(range(first_id, first_id + count, size)):
+        yield index, low, min(low + size, first_id + count)
+
+
+class Seeder:
+    def __init__(self, pool: asyncpg.Pool, options: SeedOptions) -> None:
+        self.pool = pool
+        self.options = options
+        rng = random.Random(f"{options.seed}-setup")
+        self.product_choice = WeightedChoice(
+            zipf_weights(options.products, options.product_skew, rng)
+        )
+        self.user_choice = WeightedChoice(zipf_weights(options.users, options.user_skew, rng))
+        self.date_choice = WeightedChoice(seasonal_weights(options.start_date, options.end_date))
+        self.prices = [round(rng.lognormvariate(3, 1) + 0.99, 2) for _ in range(options.products)]
+        self.categories = [rng.randint(1, options.categories) for _ in range(options.products)]
+        self.rows: dict[str, int] = {}
+
+    def rng(self, table: str, batch: int) -> random.Random:
+        return random.Random(f"{self.options.seed}-{table}-{batch}")
+
+    async def copy(self, table: str, columns: list[str], records: list[tuple[Any, ...]]) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(table, records=records, columns=columns)
+        self.rows[table] = self.rows.get(table, 0) + len(records)
+
+    async def run_parallel(self, jobs: Iterator[Callable[[], Awaitable[None]]]) -> None:
+        semaphore = asyncio.Semaphore(self.options.workers)
+
+        async def run(job: Callable[[], Awaitable[None]]) -> None:
+            async with semaphore:
+                await job()
+
+        pending: set[asyncio.Future[None]] = set()
+        for job in jobs:
+            # Keep the number of generated but not yet loaded batches bounded
+            if len(pending) >= self.options.workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            pending.add(asyncio.create_task(run(job)))
+        await asyncio.gather(*pending)
+
+    async def seed_users(self) -> None:
+        # Hashing is deliberately slow, every user shares the same hash
+        password = bcrypt_context.hash(self.options.password)
+
+        def job(index: int, low: int, high: int) -> Callable[[], Awaitable[None]]:
+            async def load() -> None:
+                records = [
+                    (
+                        user_id,
+                        f"User {user_id}",
+                        f"user{user_id}@example.com",
+                        (Role.admin if user_id == 1 else Role.user).value,
+                        password,
+                    )
+                    for user_id in range(low, high)
+                ]
+                await self.copy("user", ["id", "name", "email", "role", "password"], records)
+
+            return load
+
+        await self.run_parallel(
+            job(*batch) for batch in batches(self.options.users, self.options.batch_size)
+        )
+
+    async def seed_catalog(self) -> None:
+        categories = [(i, f"Category {i}") for i in range(1, self.options.categories + 1)]
+        await self.copy("category", ["id", "name"], categories)
+
+        def job(index: int, low: int, high: int) -> Callable[[], Awaitable[None]]:
+            async def load() -> None:
+                rng = self.rng("product", index)
+                records = [
+                    (
+                        product_id,
+                        f"Product {product_id}",
+                        rng.randint(0, 1000),
+                        f"Description of product {product_id}",
+                        self.prices[product_id - 1],
+                        self.categories[product_id - 1],
+                    )
+                    for product_id in range(low, high)
+                ]
+                columns = ["id", "name", "quantity", "description", "price", "category_id"]
+                await self.copy("product", columns, records)
+
+            return load
+
+        await self.run_parallel(
+            job(*batch) for batch in batches(self.options.products, self.options.batch_size)
+        )
+
+    def basket(self, rng: random.Random) -> dict[int, int]:
+        # Mostly small baskets with a long tail of large ones
+        lines = min(self.options.max_lines, int(rng.paretovariate(1.5)))
+        basket: dict[int, int] = {}
+        for _ in range(lines):
+            product_id = self.product_choice.draw(rng) + 1
+            basket[product_id] = basket.get(product_id, 0) + rng.choice((1, 1, 1, 2, 3))
+        return basket
+
+    def cart_row(
+        self, cart_id: int, created: date, user_id: int, basket: dict[int, int]
+    ) -> tuple[Any, ...]:
+        # Carts were last changed the day they were created, with the totals of their items
+        last_activity = datetime.combine(created, time(), timezone.utc)
+        subtotal = sum(self.prices[product_id - 1] * qty for product_id, qty in basket.items())
+        return (cart_id, created, user_id, last_activity, sum(basket.values()), subtotal)
+
+    async def seed_orders(self) -> None:
+        options = self.options
+
+        def job(index: int, low: int, high: int) -> Callable[[], Awaitable[None]]:
+            async def load() -> None:
+                rng = self.rng("order", index)
+                carts: list[tuple[Any, ...]] = []
+                cart_items: list[tuple[Any, ...]] = []
+                orders: list[tuple[Any, ...]] = []
+                order_items: list[tuple[Any, ...]] = []
+                for order_id in range(low, high):
+                    user_id = self.user_choice.draw(rng) + 1
+                    order_date = options.start_date + timedelta(days=self.date_choice.draw(rng))
+                    basket = self.basket(rng)
+                    amount = round(
+                        sum(
+                            self.prices[product_id - 1] * qty for product_id, qty in basket.items()
+                        ),
+                        2,
+                    )
+                    status = order_status(rng, (options.end_date - order_date).days)
+                    # Each order is created from its own cart, which has one row per unit
+                    carts.append(self.cart_row(order_id, order_date, user_id, basket))
+                    for product_id, quantity in basket.items():
+                        cart_items.extend([(order_date, product_id, order_id)] * quantity)
+                        order_items.append(
+                            (
+                                quantity,
+                                order_date,
+                                product_id,
+                                order_id,
+                                order_date,
+                                self.prices[product_id - 1],
+                                f"Product {product_id}",
+                                self.categories[product_id - 1],
+                            )
+                        )
+                    orders.append(
+                        (
+                            order_id,
+                            order_date,
+                            status.value,
+                            f"{order_id} Synthetic Street",
+                            order_id,
+                            amount,
+                            user_id,
+                        )
+                    )
+                await self.copy("cart", CART_COLUMNS, carts)
+                await self.copy("cartitem", ["created_date", "product_id", "cart_id"], cart_items)
+                columns = [
+                    "id",
+                    "order_date",
+                    "order_status",
+                    "shipping_address",
+                    "cart_id",
+                    "order_amount",
+                    "user_id",
+                ]
+                await self.copy("order", columns, orders)
+                columns = [
+                    "quantity",
+                    "created_date",
+                    "product_id",
+                    "order_id",
+                    "order_date",
+                    "unit_price",
+                    "product_name",
+                    "category_id",
+                ]
+                await self.copy("orderitem", columns, order_items)
+
+            return load
+
+        await self.run_parallel(
+            job(*batch) for batch in batches(options.orders, options.batch_size)
+        )
+
+    async def seed_abandoned_carts(self) -> None:
+        options = self.options
+
+        def job(index: int, low: int, high: int) -> Callable[[], Awaitable[None]]:
+            async def load() -> None:
+                rng = self.rng("cart", index)
+                carts: list[tuple[Any, ...]] = []
+                cart_items: list[tuple[Any, ...]] = []
+                for cart_id in range(low, high):
+                    created = options.start_date + timedelta(days=self.date_choice.draw(rng))
+                    user_id = self.user_choice.draw(rng) + 1
+                    basket = self.basket(rng)
+                    carts.append(self.cart_row(cart_id, created, user_id, basket))
+                    for product_id, quantity in basket.items():
+                        cart_items.extend([(created, product_id, cart_id)] * quantity)
+                await self.copy("cart", CART_COLUMNS, carts)
+                await self.copy("cartitem", ["created_date", "product_id", "cart_id"], cart_items)
+
+            return load
+
+        await self.run_parallel(
+            job(*batch)
+            for batch in batches(options.abandoned_carts, options.batch_size, options.orders + 1)
+        )
+
+    async def reset_sequences(self) -> None:
+        async with self.pool.acquire() as conn:
+            for table in TABLES:
+                await conn.execute(
+                    f"""SELECT setval(pg_get_serial_sequence('"{table}"', 'id'),
+                    COALESCE((SELECT MAX(id) FROM "{table}"), 0) + 1, false)"""
+                )
+                await conn.execute(f'ANALYZE "{table}"')
+
+
+async def seed(options: SeedOptions, dsn: str, truncate: bool) -> dict[str, int]:
+    pool = await asyncpg.create_pool(dsn, min_size=1, max_size=options.workers)
+    try:
+        if truncate:
+            tables = ", ".join(f'"{table}"' for table in TABLES)
+            await pool.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        seeder = Seeder(pool, options)
+        for step in (
+            seeder.seed_users,
+            seeder.seed_catalog,
+            seeder.seed_orders,
+            seeder.seed_abandoned_carts,
+        ):
+            start = perf_counter()
+            await step()
+            print(f"{step.__name__}: {perf_counter() - start:.1f}s {seeder.rows}")
+        await seeder.reset_sequences()
+        return seeder.rows
+    finally:
+        await pool.close()
+
+
+def write_credentials(path: str, count: int, password: str) -> None:
+    users = [
+        {"email": f"user{user_id}@example.com", "password": password}
+        for user_id in range(2, count + 2)
+    ]
+    with open(path, "w") as file:
+        json.dump(users, file, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--dsn", help="asyncpg DSN, defaults to the database of config.json")
+    parser.add_argument("--truncate", action="store_true", help="Empty the tables first")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--abandoned-carts", type=int, default=20_000)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2022, 1, 1))
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date(2024, 12, 31))
+    parser.add_argument("--product-skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--user-skew", type=float, default=0.8, help="Power law exponent")
+    parser.add_argument("--max-lines", type=int, default=20, help="Products per order")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=4, help="Parallel COPY connections")
+    parser.add_argument("--password", default="password", help="Password of every user")
+    parser.add_argument("--credentials-file", help="Write shopper credentials for load tests")
+    parser.add_argument("--credentials-count", type=int, default=100)
+    args = parser.parse_args()
+
+    options = SeedOptions(
+        users=args.users,
+        categories=args.categories,
+        products=args.products,
+        orders=args.orders,
+        abandoned_carts=args.abandoned_carts,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        product_skew=args.product_skew,
+        user_skew=args.user_skew,
+        max_lines=args.max_lines,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        password=args.password,
+    )
+    dsn = args.dsn or (
+        f"postgresql://{config.db_username}:{config.db_password}@"
+        f"{config.db_host}:{config.db_port}/{config.db_name}"
+    )
+    rows = asyncio.run(seed(options, dsn, args.truncate))
+    print(json.dumps(rows))
+    if args.credentials_file:
+        write_credentials(args.credentials_file, args.credentials_count, args.password)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import asyncio
 from logging.config import fileConfig
+from typing import Any
 
 from alembic import context
 from sqlalchemy import pool
@@ -7,11 +8,17 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from sqlmodel import SQLModel
 
+from app.core.partitioning import is_partition
 from app.models import User
+from app.models.analytics import SalesCategoryDaily, SalesDaily, SalesProductDaily
+from app.models.archive import DetachedMonth, OrderArchive
 from app.models.cart import Cart, CartItem
+from app.models.catalog import CatalogTombstone
 from app.models.category import Category
 from app.models.order import Order, OrderItem
+from app.models.popularity import ProductPopularity
 from app.models.product import Product
+from app.models.recommendation import RelatedProduct
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -34,6 +41,13 @@ target_metadata = SQLModel.metadata
 # ... etc.
 
 
+def include_object(
+    object: Any, name: str | None, type_: str, reflected: bool, compare_to: Any
+) -> bool:
+    # Partitions are managed by the migrations and the manage_partitions command
+    return not (type_ == "table" and reflected and name is not None and is_partition(name))
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -50,6 +64,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -59,7 +74,9 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection, target_metadata=target_metadata, include_object=include_object
+    )
 
     with context.begin_transaction():
         context.run_migrations()
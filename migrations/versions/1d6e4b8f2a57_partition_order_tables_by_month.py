@@ -0,0 +1,168 @@
+"""Partition order tables by month
+
+Revision ID: 1d6e4b8f2a57
+Revises: c7a05e3f9d14
+Create Date: 2026-10-19 15:12:08.402913
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import context, op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "1d6e4b8f2a57"
+down_revision: Union[str, None] = "c7a05e3f9d14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created after the current month, later ones are created by
+# python -m app.commands.manage_partitions
+MONTHS_AHEAD = 3
+
+ORDER_COLUMNS = "order_date, order_status, shipping_address, cart_id, id, order_amount, user_id"
+ORDER_ITEM_COLUMNS = "quantity, created_date, product_id, id, order_id"
+
+status_enum = postgresql.ENUM(
+    "pending", "confirmed", "cancelled", "shipping", "delivered", name="status", create_type=False
+)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _months() -> list[date]:
+    """Months from the oldest order to MONTHS_AHEAD months after the current one."""
+    current = date.today().replace(day=1)
+    first = current
+    if not context.is_offline_mode():
+        oldest = op.get_bind().execute(sa.text("SELECT min(order_date) FROM order_old")).scalar()
+        if oldest is not None:
+            first = min(first, oldest.replace(day=1))
+    months = [first]
+    while months[-1] < _add_months(current, MONTHS_AHEAD):
+        months.append(_add_months(months[-1], 1))
+    return months
+
+
+def _create_partitions(table: str, months: list[date]) -> None:
+    for month in months:
+        op.execute(
+            f'CREATE TABLE "{table}_y{month.year}m{month.month:02d}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')"
+        )
+    op.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+
+def _rename_old_tables() -> None:
+    op.drop_index(op.f("ix_orderitem_order_id"), table_name="orderitem")
+    op.rename_table("orderitem", "orderitem_old")
+    op.rename_table("order", "order_old")
+    # Primary key names are index names, which must be unique in the schema
+    op.execute("ALTER TABLE orderitem_old RENAME CONSTRAINT orderitem_pkey TO orderitem_old_pkey")
+    op.execute("ALTER TABLE order_old RENAME CONSTRAINT order_pkey TO order_old_pkey")
+
+
+def _create_order_table(partitioned: bool) -> None:
+    op.create_table(
+        "order",
+        sa.Column("order_date", sa.Date(), nullable=False),
+        sa.Column("order_status", status_enum, nullable=False),
+        sa.Column("shipping_address", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("cart_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('order_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("order_amount", sa.Float(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["cart_id"], ["cart.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint(*(("id", "order_date") if partitioned else ("id",))),
+        **({"postgresql_partition_by": "RANGE (order_date)"} if partitioned else {}),
+    )
+
+
+def _create_order_item_table(partitioned: bool) -> None:
+    columns: list[sa.schema.SchemaItem] = [
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("created_date", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('orderitem_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["product.id"]),
+    ]
+    if partitioned:
+        columns += [
+            sa.Column("order_date", sa.Date(), nullable=False),
+            sa.ForeignKeyConstraint(["order_id", "order_date"], ["order.id", "order.order_date"]),
+            sa.PrimaryKeyConstraint("id", "order_date"),
+        ]
+    else:
+        columns += [
+            sa.ForeignKeyConstraint(["order_id"], ["order.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        ]
+    op.create_table(
+        "orderitem",
+        *columns,
+        **({"postgresql_partition_by": "RANGE (order_date)"} if partitioned else {}),
+    )
+
+
+def _finish(partitioned: bool) -> None:
+    # The sequences follow the new tables, they would be dropped with the old ones otherwise
+    op.execute('ALTER SEQUENCE order_id_seq OWNED BY "order".id')
+    op.execute("ALTER SEQUENCE orderitem_id_seq OWNED BY orderitem.id")
+    op.drop_table("orderitem_old")
+    op.drop_table("order_old")
+    op.create_index(op.f("ix_orderitem_order_id"), "orderitem", ["order_id"], unique=False)
+    if partitioned:
+        op.create_index(op.f("ix_order_user_id"), "order", ["user_id"], unique=False)
+    op.execute('ANALYZE "order"')
+    op.execute("ANALYZE orderitem")
+
+
+def upgrade() -> None:
+    # Partitioning an existing table is not possible, the rows are copied to new tables
+    _rename_old_tables()
+    months = _months()
+    _create_order_table(partitioned=True)
+    _create_order_item_table(partitioned=True)
+    _create_partitions("order", months)
+    _create_partitions("orderitem", months)
+    op.execute(f'INSERT INTO "order" ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM order_old')
+    # Order items get the date of their order
+    selected = ", ".join(f"oi.{name}" for name in ORDER_ITEM_COLUMNS.split(", "))
+    op.execute(
+        f"""INSERT INTO orderitem ({ORDER_ITEM_COLUMNS}, order_date)
+        SELECT {selected}, o.order_date
+        FROM orderitem_old oi JOIN order_old o ON o.id = oi.order_id"""
+    )
+    _finish(partitioned=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_order_user_id"), table_name="order")
+    _rename_old_tables()
+    _create_order_table(partitioned=False)
+    _create_order_item_table(partitioned=False)
+    op.execute(f'INSERT INTO "order" ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM order_old')
+    op.execute(
+        f"INSERT INTO orderitem ({ORDER_ITEM_COLUMNS}) "
+        f"SELECT {ORDER_ITEM_COLUMNS} FROM orderitem_old"
+    )
+    _finish(partitioned=False)
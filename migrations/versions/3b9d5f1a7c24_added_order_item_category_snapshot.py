@@ -0,0 +1,50 @@
+"""Added order item category snapshot
+
+Revision ID: 3b9d5f1a7c24
+Revises: d2f6a8c4e173
+Create Date: 2026-10-19 22:10:37.214508
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9d5f1a7c24"
+down_revision: Union[str, None] = "d2f6a8c4e173"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("orderitem", sa.Column("category_id", sa.Integer(), nullable=True))
+    # The categories at the time of the existing orders are unknown, they get the current ones
+    op.execute(
+        """UPDATE orderitem SET category_id = p.category_id
+        FROM product p WHERE p.id = orderitem.product_id"""
+    )
+    op.alter_column("orderitem", "category_id", nullable=False)
+    # The category of an archived item whose product was deleted is null
+    op.execute(
+        """UPDATE orderarchive a SET items = (
+            SELECT jsonb_agg(
+                i.item || jsonb_build_object('category_id', p.category_id) ORDER BY i.position
+            )
+            FROM jsonb_array_elements(a.items) WITH ORDINALITY AS i (item, position)
+            LEFT JOIN product p ON p.id = CAST(i.item->>'product_id' AS integer)
+        )
+        WHERE jsonb_typeof(a.items) = 'array' AND a.items <> '[]'::jsonb"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """UPDATE orderarchive a SET items = (
+            SELECT jsonb_agg(i.item - 'category_id' ORDER BY i.position)
+            FROM jsonb_array_elements(a.items) WITH ORDINALITY AS i (item, position)
+        )
+        WHERE jsonb_typeof(a.items) = 'array' AND a.items <> '[]'::jsonb"""
+    )
+    op.drop_column("orderitem", "category_id")
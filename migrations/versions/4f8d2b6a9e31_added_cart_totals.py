@@ -0,0 +1,39 @@
+"""Added cart totals
+
+Revision ID: 4f8d2b6a9e31
+Revises: e3a7c1f5b842
+Create Date: 2026-10-19 18:47:10.226581
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4f8d2b6a9e31"
+down_revision: Union[str, None] = "e3a7c1f5b842"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("cart", sa.Column("item_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("cart", sa.Column("subtotal", sa.Float(), server_default="0", nullable=False))
+    op.execute(
+        """UPDATE cart SET item_count = totals.count, subtotal = totals.amount
+        FROM (
+            SELECT ci.cart_id, count(*) AS count, sum(p.price) AS amount
+            FROM cartitem ci JOIN product p ON p.id = ci.product_id
+            GROUP BY ci.cart_id
+        ) totals
+        WHERE cart.id = totals.cart_id"""
+    )
+    op.execute(sa.schema.CreateSequence(sa.Sequence("catalog_version_seq")))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence("catalog_version_seq")))
+    op.drop_column("cart", "subtotal")
+    op.drop_column("cart", "item_count")
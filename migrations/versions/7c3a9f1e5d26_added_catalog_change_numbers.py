@@ -0,0 +1,65 @@
+"""Added catalog change numbers
+
+Revision ID: 7c3a9f1e5d26
+Revises: b5e1d3f7a920
+Create Date: 2026-10-19 20:12:37.094512
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3a9f1e5d26"
+down_revision: Union[str, None] = "b5e1d3f7a920"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("category", "product")
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence("catalog_change_seq")))
+    # Existing rows are numbered in the order of their ids
+    for table in TABLES:
+        op.add_column(table, sa.Column("change_seq", sa.BigInteger(), nullable=True))
+        op.execute(
+            f"UPDATE {table} SET change_seq = numbered.seq FROM (SELECT id, "
+            f"nextval('catalog_change_seq') AS seq FROM (SELECT id FROM {table} ORDER BY id) ids)"
+            f" numbered WHERE {table}.id = numbered.id"
+        )
+        op.alter_column(
+            table,
+            "change_seq",
+            nullable=False,
+            server_default=sa.text("nextval('catalog_change_seq')"),
+        )
+        op.create_index(op.f(f"ix_{table}_change_seq"), table, ["change_seq"], unique=False)
+    op.create_table(
+        "catalogtombstone",
+        sa.Column("entity", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("entity_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column(
+            "change_seq",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('catalog_change_seq')"),
+            nullable=False,
+        ),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("entity", "entity_id"),
+    )
+    op.create_index(
+        op.f("ix_catalogtombstone_change_seq"), "catalogtombstone", ["change_seq"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_catalogtombstone_change_seq"), table_name="catalogtombstone")
+    op.drop_table("catalogtombstone")
+    for table in TABLES:
+        op.drop_index(op.f(f"ix_{table}_change_seq"), table_name=table)
+        op.drop_column(table, "change_seq")
+    op.execute(sa.schema.DropSequence(sa.Sequence("catalog_change_seq")))
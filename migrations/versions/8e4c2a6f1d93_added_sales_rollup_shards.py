@@ -0,0 +1,51 @@
+"""Added sales rollup shards
+
+Revision ID: 8e4c2a6f1d93
+Revises: 3b9d5f1a7c24
+Create Date: 2026-10-19 23:41:08.306915
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8e4c2a6f1d93"
+down_revision: Union[str, None] = "3b9d5f1a7c24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rollup table and the columns of its key before the shard
+KEYS = {
+    "salesdaily": ["day"],
+    "salescategorydaily": ["day", "category_id"],
+    "salesproductdaily": ["day", "product_id"],
+}
+
+
+def upgrade() -> None:
+    # The existing rows become shard 0
+    for table, keys in KEYS.items():
+        op.add_column(table, sa.Column("shard", sa.Integer(), nullable=False, server_default="0"))
+        op.alter_column(table, "shard", server_default=None)
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.create_primary_key(f"{table}_pkey", table, [*keys, "shard"])
+
+
+def downgrade() -> None:
+    # The shards of a key are summed back into one row
+    for table, keys in KEYS.items():
+        key_list = ", ".join(keys)
+        op.execute(
+            f"""WITH merged AS (
+                DELETE FROM {table} RETURNING {key_list}, revenue, order_count, units
+            )
+            INSERT INTO {table} ({key_list}, shard, revenue, order_count, units)
+            SELECT {key_list}, 0, sum(revenue), sum(order_count), sum(units)
+            FROM merged GROUP BY {key_list}"""
+        )
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.drop_column(table, "shard")
+        op.create_primary_key(f"{table}_pkey", table, keys)
@@ -0,0 +1,41 @@
+"""Added updated_at columns
+
+Revision ID: 9b4f2d7e1c63
+Revises: 6a2c9e7d4f18
+Create Date: 2026-10-19 17:21:35.160274
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b4f2d7e1c63"
+down_revision: Union[str, None] = "6a2c9e7d4f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("order", "product", "category")
+
+
+def upgrade() -> None:
+    # Existing rows get the time of the migration, the first export includes all of them
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "updated_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.text("now()"),
+                nullable=False,
+            ),
+        )
+    op.create_index(op.f("ix_order_updated_at"), "order", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_order_updated_at"), table_name="order")
+    for table in TABLES:
+        op.drop_column(table, "updated_at")
@@ -0,0 +1,59 @@
+"""Added order item price snapshot
+
+Revision ID: b5e1d3f7a920
+Revises: 4f8d2b6a9e31
+Create Date: 2026-10-19 19:30:44.581027
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b5e1d3f7a920"
+down_revision: Union[str, None] = "4f8d2b6a9e31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("orderitem", sa.Column("unit_price", sa.Float(), nullable=True))
+    op.add_column(
+        "orderitem", sa.Column("product_name", sqlmodel.sql.sqltypes.AutoString(), nullable=True)
+    )
+    # The prices at the time of the existing orders are unknown, they get the current ones
+    op.execute(
+        """UPDATE orderitem SET unit_price = p.price, product_name = p.name
+        FROM product p WHERE p.id = orderitem.product_id"""
+    )
+    op.alter_column("orderitem", "unit_price", nullable=False)
+    op.alter_column("orderitem", "product_name", nullable=False)
+    # Archived items are in a JSON array, each item gets the two keys. They have no foreign key
+    # to product: the keys of an item whose product was deleted are null, never dropped. Only
+    # non-empty arrays are updated, each element gives a row so jsonb_agg is never null
+    op.execute(
+        """UPDATE orderarchive a SET items = (
+            SELECT jsonb_agg(
+                i.item || jsonb_build_object('unit_price', p.price, 'product_name', p.name)
+                ORDER BY i.position
+            )
+            FROM jsonb_array_elements(a.items) WITH ORDINALITY AS i (item, position)
+            LEFT JOIN product p ON p.id = CAST(i.item->>'product_id' AS integer)
+        )
+        WHERE jsonb_typeof(a.items) = 'array' AND a.items <> '[]'::jsonb"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """UPDATE orderarchive a SET items = (
+            SELECT jsonb_agg(i.item - 'unit_price' - 'product_name' ORDER BY i.position)
+            FROM jsonb_array_elements(a.items) WITH ORDINALITY AS i (item, position)
+        )
+        WHERE jsonb_typeof(a.items) = 'array' AND a.items <> '[]'::jsonb"""
+    )
+    op.drop_column("orderitem", "product_name")
+    op.drop_column("orderitem", "unit_price")
@@ -0,0 +1,31 @@
+"""Added version columns
+
+Revision ID: d2f6a8c4e173
+Revises: 7c3a9f1e5d26
+Create Date: 2026-10-19 20:55:18.630449
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f6a8c4e173"
+down_revision: Union[str, None] = "7c3a9f1e5d26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("order", "product")
+
+
+def upgrade() -> None:
+    # A constant default, added without rewriting the tables
+    for table in TABLES:
+        op.add_column(table, sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_column(table, "version")
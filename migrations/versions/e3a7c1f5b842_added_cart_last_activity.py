@@ -0,0 +1,46 @@
+"""Added cart last activity
+
+Revision ID: e3a7c1f5b842
+Revises: 9b4f2d7e1c63
+Create Date: 2026-10-19 18:04:52.913406
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3a7c1f5b842"
+down_revision: Union[str, None] = "9b4f2d7e1c63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "cart",
+        sa.Column(
+            "last_activity",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    # Existing carts count as active when created or when an item was last added
+    op.execute(
+        """UPDATE cart SET last_activity = greatest(
+            CAST(cart.created_date AS timestamptz),
+            (SELECT CAST(max(ci.created_date) AS timestamptz) FROM cartitem ci
+            WHERE ci.cart_id = cart.id)
+        )"""
+    )
+    op.create_index(op.f("ix_cart_last_activity"), "cart", ["last_activity"], unique=False)
+    op.create_index(op.f("ix_order_cart_id"), "order", ["cart_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_order_cart_id"), table_name="order")
+    op.drop_index(op.f("ix_cart_last_activity"), table_name="cart")
+    op.drop_column("cart", "last_activity")
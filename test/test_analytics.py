@@ -0,0 +1,91 @@
+from datetime import date
+
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.commands.backfill_rollups import chunks
+from app.core.config import config
+from app.models.analytics import SalesDaily
+from app.models.order import Order, OrderItem
+from app.services.analytics_service import (
+    apply_order_to_rollups,
+    get_category_sales,
+    get_daily_sales,
+    order_rollup_rows,
+)
+
+
+def test_order_rollup_rows() -> None:
+    order = Order(
+        user_id=1, order_amount=25.0, order_date=date(2024, 5, 1), shipping_address="1 Main Street"
+    )
+    # Prices and categories changed since the order, the rollups use those of the items
+    items = [
+        OrderItem(product_id=1, quantity=1, unit_price=5.0, product_name="a", category_id=2),
+        OrderItem(product_id=2, quantity=2, unit_price=7.5, product_name="b", category_id=2),
+        OrderItem(product_id=3, quantity=1, unit_price=4.0, product_name="c", category_id=5),
+    ]
+
+    daily, categories, product_rows = order_rollup_rows(order, items, -1, shard=3)
+    assert daily == {
+        "day": date(2024, 5, 1),
+        "shard": 3,
+        "revenue": -25.0,
+        "order_count": -1,
+        "units": -4,
+    }
+    assert categories == [
+        {
+            "day": date(2024, 5, 1),
+            "category_id": 2,
+            "shard": 3,
+            "revenue": -20.0,
+            "order_count": -1,
+            "units": -3,
+        },
+        {
+            "day": date(2024, 5, 1),
+            "category_id": 5,
+            "shard": 3,
+            "revenue": -4.0,
+            "order_count": -1,
+            "units": -1,
+        },
+    ]
+    assert [
+        (row["product_id"], row["shard"], row["revenue"], row["units"]) for row in product_rows
+    ] == [
+        (1, 3, -5.0, -1),
+        (2, 3, -15.0, -2),
+        (3, 3, -4.0, -1),
+    ]
+
+
+def test_chunks() -> None:
+    assert chunks(date(2024, 1, 1), date(2024, 1, 10), 4) == [
+        (date(2024, 1, 1), date(2024, 1, 5)),
+        (date(2024, 1, 5), date(2024, 1, 9)),
+        (date(2024, 1, 9), date(2024, 1, 11)),
+    ]
+
+
+# Orders of a day are spread over the shards, the reads sum them
+@pytest.mark.asyncio
+async def test_sharded_rollups(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config, "rollup_shards", 4)
+    day = date(2024, 5, 1)
+    for _ in range(20):
+        order = Order(user_id=1, order_amount=5.0, order_date=day, shipping_address="Street")
+        item = OrderItem(product_id=1, quantity=2, unit_price=2.5, product_name="a", category_id=7)
+        await apply_order_to_rollups(async_session, order, [item])
+    await async_session.commit()
+
+    shards = await async_session.exec(select(SalesDaily.shard).where(SalesDaily.day == day))
+    assert 1 < len(shards.all()) <= 4
+    [daily] = await get_daily_sales(async_session, day, day)
+    assert (daily.day, daily.revenue, daily.order_count, daily.units) == (day, 100.0, 20, 40)
+    [category] = await get_category_sales(async_session, day, day)
+    assert (category.category_id, category.revenue, category.order_count) == (7, 100.0, 20)
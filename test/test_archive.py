@@ -0,0 +1,52 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.commands.archive_orders import throttle_delay
+from app.models.archive import OrderArchive
+from app.models.order import OrderPublicWithItems, Status
+
+
+def test_archived_order() -> None:
+    archived = OrderArchive(
+        id=7,
+        order_date=date(2023, 2, 1),
+        order_status=Status.delivered,
+        shipping_address="1 Main Street",
+        order_amount=12.5,
+        user_id=3,
+        items=[
+            {
+                "id": 21,
+                "quantity": 2,
+                "created_date": "2023-02-01",
+                "product_id": 4,
+                "unit_price": 6.25,
+                "product_name": "Lamp",
+            },
+            # Archived before the price snapshot, its product was deleted since
+            {
+                "id": 22,
+                "quantity": 1,
+                "created_date": "2023-02-01",
+                "product_id": 5,
+                "unit_price": None,
+                "product_name": None,
+            },
+        ],
+        archived_at=datetime.now(timezone.utc),
+    )
+    order = OrderPublicWithItems.model_validate(archived.to_order(), from_attributes=True)
+    assert (order.id, order.user_id, order.order_status) == (7, 3, Status.delivered)
+    assert [(item.id, item.product_id, item.quantity) for item in order.order_items] == [
+        (21, 4, 2),
+        (22, 5, 1),
+    ]
+    assert order.order_items[0].created_date == date(2023, 2, 1)
+    assert (order.order_items[0].unit_price, order.order_items[0].product_name) == (6.25, "Lamp")
+    assert (order.order_items[1].unit_price, order.order_items[1].product_name) == (0.0, "")
+
+
+def test_throttle_delay() -> None:
+    assert throttle_delay(0.2, 0.25) == pytest.approx(0.6)
+    assert throttle_delay(0.2, 1.0) == 0
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.core.batching import BatcherFull, MicroBatcher
+
+
+# Concurrent submissions are grouped and each caller gets the result of its own item
+@pytest.mark.asyncio
+async def test_batches_and_results() -> None:
+    batches: list[list[int]] = []
+
+    async def handler(items: list[int]) -> list[int | BaseException]:
+        batches.append(items)
+        return [ValueError(item) if item == 3 else item * 10 for item in items]
+
+    batcher: MicroBatcher[int, int] = MicroBatcher(
+        "test_results", handler, max_batch=4, max_wait=0.05, max_queue=100
+    )
+    batcher.start()
+    results = await asyncio.gather(
+        *(batcher.submit(item) for item in range(6)), return_exceptions=True
+    )
+    await batcher.stop()
+
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert results[:3] == [0, 10, 20]
+    assert isinstance(results[3], ValueError)
+    assert results[4:] == [40, 50]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_failing_handler() -> None:
+    async def handler(items: list[int]) -> list[int | BaseException]:
+        raise RuntimeError("down")
+
+    batcher: MicroBatcher[int, int] = MicroBatcher(
+        "test_full", handler, max_batch=10, max_wait=0.0, max_queue=2
+    )
+    futures = [batcher.enqueue(1), batcher.enqueue(2)]
+    with pytest.raises(BatcherFull):
+        batcher.enqueue(3)
+
+    # The items queued before stopping are still processed
+    batcher.start()
+    await batcher.stop()
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
@@ -0,0 +1,59 @@
+import json
+import logging
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import BaseModel
+
+from app.core.capture import CaptureMiddleware, body_shape
+from app.core.log import record_user
+from benchmarks.replay import build_request, fill
+
+
+class Item(BaseModel):
+    name: str
+    quantity: int
+
+
+def current_user() -> int:
+    record_user(7, "user")
+    return 7
+
+
+def test_body_shape() -> None:
+    shape = body_shape({"email": "john@example.com", "quantity": 2, "tags": ["a", None, True]})
+    assert shape == {"email": "<str:16>", "quantity": 2, "tags": ["<str:1>", None, True]}
+    assert fill(shape) == {"email": "x" * 16, "quantity": 2, "tags": ["x", None, True]}
+
+
+# Captured requests keep the route, parameters and user but no string values
+@pytest.mark.asyncio
+async def test_capture_middleware(caplog: pytest.LogCaptureFixture) -> None:
+    captured_app = FastAPI()
+
+    @captured_app.post("/item/{item_id}")
+    async def update_item(item_id: int, item: Item, _: int = Depends(current_user)) -> Item:
+        return item
+
+    captured_app.add_middleware(CaptureMiddleware, sample_rate=1.0)
+    with caplog.at_level(logging.INFO, logger="app.capture"):
+        async with AsyncClient(
+            transport=ASGITransport(app=captured_app), base_url="http://localhost:8081"
+        ) as client:
+            await client.post("/item/3?page=2", json={"name": "secret", "quantity": 5})
+            await client.get("/unknown")
+    records = [json.loads(record.message) for record in caplog.records]
+    assert len(records) == 1
+    record = records[0]
+    assert record["route"] == "/item/{item_id}"
+    assert record["path_params"] == {"item_id": "3"}
+    assert record["query"] == {"page": "2"}
+    assert record["body"] == {"name": "<str:6>", "quantity": 5}
+    assert (record["user_id"], record["role"], record["status"]) == (7, "user", 200)
+
+    request = build_request(record, {}, None)
+    assert request is not None
+    assert request["url"] == "/item/3"
+    assert request["json"] == {"name": "xxxxxx", "quantity": 5}
+    assert request["headers"]["Authorization"].startswith("Bearer ")
@@ -0,0 +1,181 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Coroutine
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.cart import Cart, CartItem, CartItemCreate
+from app.models.category import Category
+from app.models.order import Order, OrderCreate, Status
+from app.models.product import Product, ProductUpdate
+from app.models.user import Role, TokenUser, User
+from app.services.cart_service import (
+    CartWrite,
+    add_item,
+    delete_item,
+    get_cart_quote,
+    group_cart_writes,
+)
+from app.services.cart_sweep_service import SWEEP_BATCH, CartSweeper
+from app.services.order_service import create_new_order
+from app.services.product_service import update_product_info
+
+
+# Runs of additions and removals keep the order of the writes
+def test_group_cart_writes() -> None:
+    item = CartItemCreate(product_id=1)
+    writes = [
+        CartWrite(1, 1, item=item),
+        CartWrite(2, 2, item=item),
+        CartWrite(1, 1, item_id=5),
+        CartWrite(1, 1, item=item),
+        CartWrite(2, 2, item=item),
+    ]
+    assert group_cart_writes(writes) == [writes[:2], writes[2:3], writes[3:]]
+    assert group_cart_writes([]) == []
+
+
+# Idle carts are deleted with their items, carts of an order and recent carts are kept
+@pytest.mark.asyncio
+async def test_sweep_expired_carts(
+    normal_user: User, async_session: AsyncSession, test_engine: AsyncEngine
+) -> None:
+    category = Category(name="Books")
+    product = Product(name="Novel", quantity=5, description="", price=9.5, category=category)
+    old = datetime.now(timezone.utc) - timedelta(days=40)
+    idle = Cart(user_id=normal_user.id, last_activity=old)
+    ordered = Cart(user_id=normal_user.id, last_activity=old)
+    recent = Cart(user_id=normal_user.id)
+    async_session.add_all([product, idle, ordered, recent])
+    await async_session.flush()
+    async_session.add(CartItem(product_id=product.id, cart_id=idle.id))
+    async_session.add(
+        Order(
+            shipping_address="Street",
+            cart_id=ordered.id,
+            order_amount=9.5,
+            user_id=normal_user.id,
+            order_status=Status.pending,
+        )
+    )
+    await async_session.commit()
+
+    sweeper = CartSweeper(test_engine, ttl_days=30, interval=3600, batch_size=1)
+    assert await sweeper.sweep() == 1
+    result = await async_session.exec(select(Cart.id))
+    assert set(result.all()) == {ordered.id, recent.id}
+
+
+# A cart write or a checkout waiting for the sweeper deleting the cart answers 404
+@pytest.mark.asyncio
+async def test_cart_write_during_sweep(
+    normal_user: User, async_session: AsyncSession, test_engine: AsyncEngine
+) -> None:
+    product = Product(name="Novel", quantity=5, description="", price=9.5)
+    async_session.add_all([Category(name="Books", products=[product])])
+    await async_session.commit()
+    assert product.id is not None and normal_user.id is not None
+    user_id = normal_user.id
+    old = datetime.now(timezone.utc) - timedelta(days=40)
+    # The test engine autocommits, the locks need transactions
+    engine = test_engine.execution_options(isolation_level="READ COMMITTED")
+
+    def add(cart_id: int) -> Callable[[AsyncSession], Coroutine[Any, Any, Any]]:
+        return lambda db: add_item(cart_id, CartItemCreate(product_id=product.id), db, user_id)
+
+    def checkout(cart_id: int) -> Callable[[AsyncSession], Coroutine[Any, Any, Any]]:
+        order = OrderCreate(shipping_address="Street", cart_id=cart_id, order_status=Status.pending)
+        return lambda db: create_new_order(order, db, user_id)
+
+    for write in (add, checkout):
+        cart = Cart(user_id=user_id, last_activity=old)
+        async_session.add(cart)
+        await async_session.flush()
+        async_session.add(CartItem(product_id=product.id, cart_id=cart.id))
+        await async_session.commit()
+        assert cart.id is not None
+        async with engine.connect() as sweeper, AsyncSession(engine) as db:
+            cutoff = old + timedelta(days=10)
+            result = await sweeper.execute(text(SWEEP_BATCH), {"cutoff": cutoff, "limit": 10})
+            assert result.one() == (1, 1)
+            task = asyncio.create_task(write(cart.id)(db))
+            await asyncio.sleep(0.2)
+            assert not task.done()
+            await sweeper.commit()
+            with pytest.raises(HTTPException) as error:
+                await task
+            assert error.value.status_code == 404
+
+
+# Totals follow the item changes and price changes, the quote prices the lines
+@pytest.mark.asyncio
+async def test_cart_totals_and_quote(normal_user: User, async_session: AsyncSession) -> None:
+    lamp = Product(name="Lamp", quantity=5, description="", price=10.0)
+    mug = Product(name="Mug", quantity=5, description="", price=2.5)
+    category = Category(name="Home", products=[lamp, mug])
+    cart = Cart(user_id=normal_user.id)
+    async_session.add_all([category, cart])
+    await async_session.commit()
+    assert cart.id is not None and lamp.id is not None and mug.id is not None
+    assert normal_user.id is not None
+    user = TokenUser(username=normal_user.email, id=normal_user.id, role=Role.user)
+
+    for product_id in (lamp.id, lamp.id, mug.id):
+        await add_item(cart.id, CartItemCreate(product_id=product_id), async_session, user.id)
+    item = (await async_session.exec(select(CartItem).where(CartItem.product_id == mug.id))).one()
+    await delete_item(cart.id, item.id or 0, async_session, user.id)
+    await update_product_info(ProductUpdate(price=12.0), lamp.id, async_session)
+
+    quote = await get_cart_quote(cart.id, async_session, user)
+    assert (quote.item_count, quote.subtotal) == (2, 24.0)
+    assert [(line.product_id, line.quantity, line.amount) for line in quote.lines] == [
+        (lamp.id, 2, 24.0)
+    ]
+    assert quote.catalog_version == 1
+
+
+# An order placed from a quote is charged the sum of its items, also once the quote is stale
+@pytest.mark.asyncio
+async def test_order_from_quote(normal_user: User, async_session: AsyncSession) -> None:
+    lamp = Product(name="Lamp", quantity=5, description="", price=10.0)
+    mug = Product(name="Mug", quantity=5, description="", price=2.5)
+    category = Category(name="Home", products=[lamp, mug])
+    carts = [Cart(user_id=normal_user.id), Cart(user_id=normal_user.id)]
+    async_session.add_all([category, *carts])
+    await async_session.commit()
+    assert lamp.id is not None and mug.id is not None and normal_user.id is not None
+    user = TokenUser(username=normal_user.email, id=normal_user.id, role=Role.user)
+
+    for cart in carts:
+        assert cart.id is not None
+        for product_id in (lamp.id, lamp.id, mug.id):
+            await add_item(cart.id, CartItemCreate(product_id=product_id), async_session, user.id)
+    cart_ids = [cart.id for cart in carts]
+    # Checkout loads the carts with their items like in the session of a new request
+    async_session.expunge_all()
+
+    quote = await get_cart_quote(cart_ids[0] or 0 or 0, async_session, user)
+    order = await create_new_order(
+        OrderCreate(shipping_address="Street", cart_id=cart_ids[0], order_status=Status.pending),
+        async_session,
+        user.id,
+    )
+    items = order.order_items or []
+    assert order.order_amount == quote.subtotal == 22.5
+    assert order.order_amount == sum(item.unit_price * item.quantity for item in items)
+
+    quote = await get_cart_quote(cart_ids[1] or 0, async_session, user)
+    await update_product_info(ProductUpdate(price=12.0), lamp.id, async_session)
+    order = await create_new_order(
+        OrderCreate(shipping_address="Street", cart_id=cart_ids[1], order_status=Status.pending),
+        async_session,
+        user.id,
+    )
+    items = order.order_items or []
+    assert quote.subtotal == 22.5
+    assert order.order_amount == sum(item.unit_price * item.quantity for item in items) == 26.5
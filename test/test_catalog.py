@@ -0,0 +1,42 @@
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.category import CategoryCreate
+from app.models.product import ProductCreate, ProductUpdate
+from app.services.catalog_service import get_catalog_changes
+from app.services.category_service import create_new_category
+from app.services.product_service import (
+    create_new_product,
+    delete_product_by_id,
+    update_product_info,
+)
+
+
+# Changes come in order across products, categories and deletions, page by page
+@pytest.mark.asyncio
+async def test_catalog_changes(async_session: AsyncSession) -> None:
+    category = await create_new_category(CategoryCreate(name="Home"), async_session)
+    assert category.id is not None
+    lamp = await create_new_product(
+        ProductCreate(name="Lamp", quantity=1, description="", price=10, category_id=category.id),
+        async_session,
+    )
+    mug = await create_new_product(
+        ProductCreate(name="Mug", quantity=1, description="", price=2, category_id=category.id),
+        async_session,
+    )
+    category_id, lamp_id, mug_id = category.id, lamp.id, mug.id
+    assert lamp_id is not None and mug_id is not None
+    first = await get_catalog_changes(async_session, 0, 2)
+    assert [item.id for item in first.categories] == [category_id]
+    assert [item.id for item in first.products] == [lamp_id]
+    assert first.has_more
+
+    await update_product_info(ProductUpdate(price=12), lamp_id, async_session)
+    await delete_product_by_id(mug_id, async_session)
+    rest = await get_catalog_changes(async_session, first.next_since, 10)
+    assert [(item.id, item.price) for item in rest.products] == [(lamp_id, 12)]
+    assert [(item.entity, item.id) for item in rest.deleted] == [("product", mug_id)]
+    assert not rest.has_more
+    empty = await get_catalog_changes(async_session, rest.next_since, 10)
+    assert (empty.products, empty.deleted, empty.next_since) == ([], [], rest.next_since)
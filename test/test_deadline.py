@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.util import greenlet_spawn
+from starlette import status
+
+from app.core.deadline import (
+    DeadlineMiddleware,
+    DeadlineQueuePool,
+    deadline_exceeded,
+    deadline_scope,
+    remaining,
+)
+
+
+class QueryCanceled(Exception):
+    sqlstate = "57014"
+
+
+def deadline_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/remaining")
+    async def get_remaining() -> float | None:
+        return remaining()
+
+    @app.get("/slow")
+    async def slow() -> None:
+        await asyncio.sleep(10)
+
+    @app.get("/canceled")
+    async def canceled() -> None:
+        raise DBAPIError("SELECT", {}, QueryCanceled())
+
+    app.add_middleware(
+        DeadlineMiddleware,
+        routes=app.routes,
+        default=5.0,
+        timeouts={"GET /slow": 0.05, "GET /remaining": 0.0, "GET /missing": 1.0},
+        grace=0.0,
+    )
+    return app
+
+
+def test_deadline_scope() -> None:
+    assert remaining() is None
+    with deadline_scope(10):
+        outer = remaining()
+        assert outer is not None and 9 < outer <= 10
+        # A nested scope cannot extend the deadline
+        with deadline_scope(60):
+            inner = remaining()
+            assert inner is not None and inner <= outer
+    assert remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_middleware() -> None:
+    async with AsyncClient(
+        transport=ASGITransport(app=deadline_app()), base_url="http://localhost:8081"
+    ) as client:
+        # A budget of 0 is no deadline
+        response = await client.get("/remaining")
+        assert response.json() is None
+
+        before = deadline_exceeded.value(("/slow",))
+        response = await client.get("/slow")
+        assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+        assert response.json() == {"detail": "Deadline exceeded"}
+        assert deadline_exceeded.value(("/slow",)) == before + 1
+
+        # Statements cancelled by the statement_timeout are out of time too
+        response = await client.get("/canceled")
+        assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+
+class FakeConnection:
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def connect() -> Any:
+    return FakeConnection()
+
+
+# The pool relies on how QueuePool waits for a connection, a SQLAlchemy upgrade changing it
+# fails here rather than silently waiting for the configured pool timeout
+@pytest.mark.asyncio
+async def test_pool_checkout_deadline() -> None:
+    pool = DeadlineQueuePool(connect, pool_size=1, max_overflow=0, timeout=5)
+    assert pool.timeout() == 5
+    held = await greenlet_spawn(pool.connect)
+    start = time.monotonic()
+    with deadline_scope(0.1):
+        with pytest.raises(PoolTimeoutError):
+            await greenlet_spawn(pool.connect)
+    assert time.monotonic() - start < 1
+    assert pool.timeout() == 5
+    held.close()
+    connection = await greenlet_spawn(pool.connect)
+    connection.close()
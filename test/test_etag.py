@@ -0,0 +1,21 @@
+import pytest
+from fastapi import HTTPException
+
+from app.utils.etag_utils import check_version, if_match_versions, version_etag
+
+
+def test_if_match_versions() -> None:
+    assert if_match_versions(None) is None
+    assert if_match_versions("*") is None
+    assert if_match_versions(version_etag(3)) == {3}
+    # Weak tags never match with If-Match
+    assert if_match_versions('"2", W/"3", "x"') == {2}
+
+
+def test_check_version() -> None:
+    check_version(3, None, "Changed")
+    check_version(3, {2, 3}, "Changed")
+    with pytest.raises(HTTPException) as error:
+        check_version(4, {3}, "Changed")
+    assert error.value.status_code == 412
+    assert error.value.headers == {"ETag": '"4"'}
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.events import EventBroker, event_stream
+
+
+def event(order_id: int, user_id: int, status: str = "confirmed") -> dict[str, object]:
+    return {"order_id": order_id, "user_id": user_id, "status": status}
+
+
+# Users only get the events of their orders, admin subscriptions (None) get all of them
+@pytest.mark.asyncio
+async def test_publish_and_cap() -> None:
+    broker = EventBroker("test", max_subscribers=3, queue_size=4)
+    user = broker.subscribe(1)
+    admin = broker.subscribe(None)
+    single = broker.subscribe(1, order_id=8)
+    assert user is not None and admin is not None and single is not None
+    assert broker.subscribe(2) is None
+
+    broker.publish(event(7, 1))
+    broker.publish(event(9, 2))
+    assert [user.queue.get_nowait()["order_id"]] == [7]
+    assert user.queue.empty()
+    assert single.queue.empty()
+    assert [admin.queue.get_nowait()["order_id"] for _ in range(2)] == [7, 9]
+
+    # Notifications sent by this process are ignored
+    broker._on_notification(None, 0, "test", json.dumps({**event(8, 1), "origin": broker.origin}))
+    assert single.queue.empty()
+    broker._on_notification(None, 0, "test", json.dumps({**event(8, 1), "origin": "other"}))
+    assert single.queue.get_nowait() == event(8, 1)
+
+    broker.unsubscribe(user)
+    broker.unsubscribe(user)
+    assert broker.subscriber_count == 2
+
+
+@pytest.mark.asyncio
+async def test_event_stream() -> None:
+    broker = EventBroker("test", max_subscribers=10, queue_size=2)
+    stream = event_stream(broker, 1, None, event(7, 1, "pending"), heartbeat=0.01)
+
+    assert (await stream.__anext__()).startswith("event: status\ndata: ")
+    assert await stream.__anext__() == ": heartbeat\n\n"
+    assert broker.subscriber_count == 1
+
+    # A slow client loses events and gets an overflow event once it caught up
+    for index in range(3):
+        broker.publish(event(index, 1))
+    assert json.loads((await stream.__anext__()).split("data: ")[1])["order_id"] == 0
+    await stream.__anext__()
+    assert await stream.__anext__() == "event: overflow\ndata: {}\n\n"
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(stream.__anext__(), 1)
+    assert broker.subscriber_count == 0
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from app.services.export_service import (  # noqa: E402
+    EXPORT_TABLES,
+    read_batch,
+    write_batch,
+)
+
+TABLES = {table.name: table for table in EXPORT_TABLES}
+
+
+# NULL is an empty field, an empty string is quoted and values may span lines
+def test_read_batch() -> None:
+    data = (
+        b'1,Lamp,3,"Bright\nand warm",12.5,2,1700000000000001\n'
+        b'2,Mug,0,"",4,2,1700000000000002\n'
+    )
+    batch = read_batch(data, TABLES["product"])
+    assert batch.column("description").to_pylist() == ["Bright\nand warm", ""]
+    assert batch.schema.field("changed_at").type == pa.timestamp("us", tz="UTC")
+    assert batch.column("changed_at")[1].value == 1700000000000002
+    order = read_batch(b"5,2024-03-02,pending,Street,,9.5,1,2024-03,1\n", TABLES["order"])
+    assert order.column("cart_id").to_pylist() == [None]
+
+
+def test_write_batch_partitions(tmp_path: str) -> None:
+    data = (
+        b"1,2024-02-28,delivered,Street,4,9.5,1,2024-02,10\n"
+        b"2,2024-03-01,pending,Street,5,3,1,2024-03,20\n"
+    )
+    rows, changed, key = write_batch(data, TABLES["order"], str(tmp_path), "part-0")
+    assert (rows, changed, key) == (2, 20, 2)
+    assert sorted(os.listdir(os.path.join(tmp_path, "order"))) == [
+        "order_month=2024-02",
+        "order_month=2024-03",
+    ]
+    march = pq.read_table(os.path.join(tmp_path, "order", "order_month=2024-03"))
+    assert march.column("id").to_pylist() == [2]
+
+
+# Deletion markers are keyed by integer ids like the tables they apply to
+def test_deletion_markers(tmp_path: str) -> None:
+    data = b"7,2024-02-28,archived,2024-02,30\n"
+    rows, changed, key = write_batch(data, TABLES["order_deleted"], str(tmp_path), "part-0")
+    assert (rows, changed, key) == (1, 30, 7)
+    deleted = pq.read_table(os.path.join(tmp_path, "order_deleted", "order_month=2024-02"))
+    assert deleted.column("reason").to_pylist() == ["archived"]
+    detached = read_batch(b"1,2024-01,archive,40\n", TABLES["order_month_detached"])
+    assert detached.column("order_month").to_pylist() == ["2024-01"]
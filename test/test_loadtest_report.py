@@ -0,0 +1,23 @@
+from benchmarks.loadtest.report import Recorder, compare, percentile
+
+
+def test_percentile() -> None:
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_flags_regressions() -> None:
+    baseline = Recorder()
+    current = Recorder()
+    for _ in range(100):
+        baseline.record("GET /product", 0.010, False)
+        current.record("GET /product", 0.020, False)
+        baseline.record("GET /category", 0.010, False)
+        current.record("GET /category", 0.0101, False)
+    rows = compare(baseline.report(10), current.report(10), threshold=0.1)
+    regressions = {row["route"]: row["regressions"] for row in rows}
+    assert regressions["GET /product"] == ["p95_ms", "p99_ms"]
+    assert regressions["GET /category"] == []
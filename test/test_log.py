@@ -0,0 +1,60 @@
+import json
+import logging
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine, text
+
+from app.core.log import (
+    AccessLogMiddleware,
+    JsonFormatter,
+    instrument_sql_logging,
+    record_user,
+)
+
+engine = create_engine("sqlite://")
+instrument_sql_logging(engine)
+
+
+def current_user() -> int:
+    record_user(7, "user")
+    return 7
+
+
+def test_json_formatter() -> None:
+    record = logging.makeLogRecord(
+        {"name": "app.test", "levelname": "INFO", "msg": "hello %s", "args": ("world",)}
+    )
+    record.route = "/item/{item_id}"
+    data = json.loads(JsonFormatter().format(record))
+    assert data["message"] == "hello world"
+    assert data["logger"] == "app.test"
+    assert data["route"] == "/item/{item_id}"
+
+
+# One access record per request with the route, user and database usage
+@pytest.mark.asyncio
+async def test_access_log(caplog: pytest.LogCaptureFixture) -> None:
+    logged_app = FastAPI()
+
+    @logged_app.get("/item/{item_id}")
+    async def get_item(item_id: int, _: int = Depends(current_user)) -> dict[str, int]:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        return {"id": item_id}
+
+    logged_app.add_middleware(AccessLogMiddleware)
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        async with AsyncClient(
+            transport=ASGITransport(app=logged_app), base_url="http://localhost:8081"
+        ) as client:
+            await client.get("/item/3")
+    records = [record for record in caplog.records if record.name == "app.access"]
+    assert len(records) == 1
+    record = records[0]
+    assert record.__dict__["route"] == "/item/{item_id}"
+    assert record.__dict__["status"] == 200
+    assert record.__dict__["user_id"] == 7
+    assert record.__dict__["db_queries"] == 2
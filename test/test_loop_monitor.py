@@ -0,0 +1,28 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.core.loop_monitor import LoopMonitor, event_loop_blocked, event_loop_lag
+
+
+def blocking_call() -> None:
+    time.sleep(0.3)
+
+
+# A blocking call is measured as lag and its stack is logged by the watchdog
+@pytest.mark.asyncio
+async def test_blocked_loop_logs_stack(caplog: pytest.LogCaptureFixture) -> None:
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+    observed = event_loop_lag.count()
+    blocked = event_loop_blocked.value()
+    with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+    assert event_loop_lag.count() > observed
+    assert event_loop_blocked.value() == blocked + 1
+    assert "blocking_call" in caplog.text
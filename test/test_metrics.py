@@ -0,0 +1,41 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette import status
+
+from app.core.metrics import Histogram, Registry
+from app.main import app
+
+
+def test_histogram_render() -> None:
+    registry = Registry()
+    histogram: Histogram = registry.histogram(
+        "latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)
+    )
+    histogram.observe(0.05, ("/a",))
+    histogram.observe(0.5, ("/a",))
+    histogram.observe(5, ("/a",))
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert histogram.count(("/a",)) == 3
+
+
+# Requests are labelled by route template rather than by raw path
+@pytest.mark.asyncio
+async def test_metrics_route_template() -> None:
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://localhost:8081"
+    ) as client:
+        response = await client.get("/order/order/42")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        response = await client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert (
+        'http_requests_total{method="GET",route="/order/order/{order_id}",status="401"}'
+        in response.text
+    )
+    assert "/order/order/42" not in response.text
+    assert "db_pool_size" in response.text
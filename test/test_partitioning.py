@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.commands.manage_partitions import (
+    create_partitions,
+    detach_partitions,
+    explain_orders,
+)
+from app.core.partitioning import (
+    add_months,
+    is_partition,
+    partition_ddl,
+    partition_name,
+)
+from app.models.archive import DetachedMonth
+from app.models.user import Role, TokenUser
+
+
+def test_months_and_names() -> None:
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partition_name("orderitem", date(2024, 3, 1)) == "orderitem_y2024m03"
+    assert partition_ddl("order", date(2024, 12, 1)) == (
+        'CREATE TABLE IF NOT EXISTS "order_y2024m12" PARTITION OF "order" '
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
+    assert is_partition("order_y2024m12")
+    assert is_partition("orderitem_default")
+    assert not is_partition("order")
+    assert not is_partition("salesdaily")
+
+
+# The order listing over a date range only scans the partitions of its months
+@pytest.mark.asyncio
+async def test_orders_query_prunes_partitions(
+    async_session: AsyncSession, test_engine: AsyncEngine
+) -> None:
+    await create_partitions(test_engine, date(2024, 1, 1), date(2024, 6, 1))
+    months = [partition_name("order", date(2024, month, 1)) for month in range(1, 7)]
+    for user in (None, TokenUser(username="user", id=7, role=Role.user)):
+        plan = await explain_orders(test_engine, date(2024, 2, 10), date(2024, 3, 31), user)
+        scanned = [month for month in [*months, "order_default"] if f" {month} " in plan]
+        assert scanned == ["order_y2024m02", "order_y2024m03"], plan
+
+
+# Detached months are recorded for the deletion markers of the export
+@pytest.mark.asyncio
+async def test_detach_partitions_records_months(
+    async_session: AsyncSession, test_engine: AsyncEngine
+) -> None:
+    await create_partitions(test_engine, date(2024, 1, 1), date(2024, 3, 1))
+    detached = await detach_partitions(test_engine, date(2024, 3, 15), "detached_test")
+    assert detached == [
+        "orderitem_y2024m01",
+        "order_y2024m01",
+        "orderitem_y2024m02",
+        "order_y2024m02",
+    ]
+    result = await async_session.exec(select(DetachedMonth).order_by(col(DetachedMonth.month)))
+    assert [(row.month, row.schema_name) for row in result.all()] == [
+        (date(2024, 1, 1), "detached_test"),
+        (date(2024, 2, 1), "detached_test"),
+    ]
+    # The detached tables use the id sequences of the order tables dropped after the test
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA detached_test CASCADE"))
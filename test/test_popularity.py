@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from app.core.database import async_session_maker
+from app.models.popularity import WINDOW_HALF_LIFE, PopularityWindow
+from app.services.popularity_service import PopularityCounters
+
+
+def test_ranking_per_category() -> None:
+    counters = PopularityCounters(async_session_maker, top_k=2, flush_interval=30)
+    now = time.time()
+    counters.record(1, 10, 3, now)
+    counters.record(2, 10, 1, now)
+    counters.record(3, 20, 2, now)
+    counters.record(2, 10, 4, now)
+
+    top = counters.top(PopularityWindow.day, None, 5, now)
+    assert [product_id for product_id, _ in top] == [2, 1]
+    assert [score for _, score in top] == pytest.approx([5.0, 3.0])
+    assert [product_id for product_id, _ in counters.top(PopularityWindow.day, 10, 1, now)] == [2]
+    assert [product_id for product_id, _ in counters.top(PopularityWindow.day, 20, 5, now)] == [3]
+    assert counters.top(PopularityWindow.day, 30, 5, now) == []
+
+
+# Older sales weigh less, a product selling more recently overtakes
+def test_decay() -> None:
+    counters = PopularityCounters(async_session_maker, top_k=10, flush_interval=30)
+    now = time.time()
+    half_life = WINDOW_HALF_LIFE[PopularityWindow.day]
+    counters.record(1, 10, 4, now)
+    counters.record(2, 10, 3, now + half_life)
+
+    day = counters.top(PopularityWindow.day, None, 2, now + half_life)
+    assert [product_id for product_id, _ in day] == [2, 1]
+    assert [score for _, score in day] == pytest.approx([3.0, 2.0])
+    week = counters.top(PopularityWindow.week, None, 2, now + half_life)
+    assert [product_id for product_id, _ in week] == [1, 2]
+
+    # Rebasing keeps the ranking
+    later = now + 100 * half_life
+    counters.record(3, 10, 1, later)
+    day = counters.top(PopularityWindow.day, None, 3, later)
+    assert [product_id for product_id, _ in day] == [3, 2, 1]
+    assert day[0][1] == pytest.approx(1.0)
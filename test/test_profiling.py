@@ -0,0 +1,69 @@
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.datastructures import Headers
+
+from app.core.config import test_data
+from app.core.profiling import ProfileRing, ProfilingMiddleware, _is_admin_request
+from app.services.auth_service import create_access_token
+
+
+def make_app(ring: ProfileRing, sample_rate: float = 0.0) -> FastAPI:
+    profiled_app = FastAPI()
+
+    @profiled_app.get("/item/{item_id}")
+    async def get_item(item_id: int) -> dict[str, int]:
+        return {"id": item_id}
+
+    profiled_app.add_middleware(ProfilingMiddleware, ring=ring, sample_rate=sample_rate)
+    return profiled_app
+
+
+# Only admin requests flagged for profiling are written to the ring
+@pytest.mark.asyncio
+async def test_profile_admin_flag(tmp_path: Path, admin_token: str, user_token: str) -> None:
+    ring = ProfileRing(str(tmp_path), 2)
+    async with AsyncClient(
+        transport=ASGITransport(app=make_app(ring)), base_url="http://localhost:8081"
+    ) as client:
+        await client.get("/item/1")
+        await client.get("/item/1?profile=1", headers={"Authorization": f"Bearer {user_token}"})
+        admin = {"Authorization": f"Bearer {admin_token}"}
+        await client.get("/item/1", headers={**admin, "X-Profile": "0"})
+        await client.get("/item/1?profile=false", headers=admin)
+        assert ring.list() == []
+        for _ in range(3):
+            response = await client.get(
+                "/item/1", headers={"Authorization": f"Bearer {admin_token}", "X-Profile": "1"}
+            )
+            assert response.json() == {"id": 1}
+    profiles = ring.list()
+    assert len(profiles) == 2
+    assert profiles[0].name.endswith("-GET-item_item_id.pstats")
+    assert ring.path(profiles[0].name) is not None
+    assert ring.path("../config.json") is None
+
+
+# A sample rate of 1 profiles every request without any flag
+@pytest.mark.asyncio
+async def test_profile_sample_rate(tmp_path: Path) -> None:
+    ring = ProfileRing(str(tmp_path), 5)
+    async with AsyncClient(
+        transport=ASGITransport(app=make_app(ring, 1.0)), base_url="http://localhost:8081"
+    ) as client:
+        await client.get("/item/2")
+    assert len(ring.list()) == 1
+
+
+# An expired admin token cannot turn profiling on
+def test_expired_admin_token_not_profiled() -> None:
+    token = create_access_token(
+        test_data["initial_user"]["admin"]["email"],
+        test_data["initial_user"]["admin"]["id"],
+        test_data["initial_user"]["admin"]["role"],
+        timedelta(minutes=-1),
+    )
+    assert not _is_admin_request(Headers({"authorization": f"Bearer {token}"}))
@@ -0,0 +1,66 @@
+import asyncio
+import itertools
+import random
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from app.commands.build_related_products import (  # noqa: E402
+    HEADER_SIZE,
+    CooccurrenceBuilder,
+    top_neighbours,
+)
+
+
+def copy_stream(items: list[tuple[int, int]]) -> bytes:
+    """Encode (order_id, product_id) rows as a binary COPY stream."""
+    header = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    assert len(header) == HEADER_SIZE
+    rows = b"".join(struct.pack(">hiiii", 2, 4, order, 4, product) for order, product in items)
+    return header + rows + struct.pack(">h", -1)
+
+
+# Orders split across chunks and stream pieces are still counted together
+def test_cooccurrence_from_stream() -> None:
+    rng = random.Random(1)
+    orders = {order: rng.sample(range(1, 12), rng.randint(1, 4)) for order in range(1, 300)}
+    items = [(order, product) for order, products in orders.items() for product in products]
+    expected: dict[tuple[int, int], int] = {}
+    for products in orders.values():
+        for pair in itertools.permutations(products, 2):
+            expected[pair] = expected.get(pair, 0) + 1
+
+    builder = CooccurrenceBuilder(0, 12, 12, chunk_rows=7)
+    stream = copy_stream(items)
+
+    async def feed() -> None:
+        for start in range(0, len(stream), 13):
+            end = start + 13
+            await builder.feed(stream[start:end])
+
+    asyncio.run(feed())
+    builder.finish()
+    matrix = builder.matrix.toarray()
+    assert builder.orders == len(orders)
+    assert builder.counts[3] == sum(3 in products for products in orders.values())
+    for (first, second), count in expected.items():
+        assert matrix[first, second] == count
+
+
+def test_top_neighbours() -> None:
+    builder = CooccurrenceBuilder(0, 4, 4, chunk_rows=100)
+    baskets = [[1, 2], [1, 2], [1, 3], [1, 2, 3], [3]]
+    order_ids = np.array([order for order, basket in enumerate(baskets) for _ in basket])
+    product_ids = np.array([product for basket in baskets for product in basket])
+    builder.add(order_ids, product_ids)
+
+    rows, related, scores, ranks = top_neighbours(
+        builder.matrix, builder.counts, builder.orders, 0, 1, "cosine", 2
+    )
+    assert rows.tolist() == [1, 2, 3]
+    assert related.tolist() == [2, 1, 1]
+    assert ranks.tolist() == [0, 0, 0]
+    assert scores[0] == pytest.approx(3 / np.sqrt(4 * 3))
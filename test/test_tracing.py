@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.core import tracing
+from app.core.tracing import (
+    BatchSpanExporter,
+    TracingMiddleware,
+    parse_traceparent,
+    should_sample,
+    traced,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_parse_traceparent() -> None:
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    assert parse_traceparent(f"01-{TRACE_ID}-{PARENT_ID}-01-extra") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01-extra") is None
+    assert parse_traceparent(f"ff-{TRACE_ID}-{PARENT_ID}-01") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert parse_traceparent(f"00-{TRACE_ID}-xyz-01") is None
+
+
+def test_should_sample() -> None:
+    assert should_sample(TRACE_ID, 1.0)
+    assert not should_sample(TRACE_ID, 0.0)
+
+
+@traced()
+async def load_item(item_id: int) -> dict[str, int]:
+    return {"id": item_id}
+
+
+@traced()
+def current_user() -> str:
+    return "user"
+
+
+# Spans of the dependency and the service are children of the request span
+@pytest.mark.asyncio
+async def test_request_spans(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    exporter = BatchSpanExporter(str(tmp_path / "traces.jsonl"), "", 100, 60)
+    monkeypatch.setattr(tracing, "span_exporter", exporter)
+    traced_app = FastAPI()
+
+    @traced_app.get("/item/{item_id}")
+    async def get_item(item_id: int, _: str = Depends(current_user)) -> dict[str, int]:
+        return await load_item(item_id)
+
+    traced_app.add_middleware(TracingMiddleware, sample_rate=0.0)
+    exporter.start()
+    async with AsyncClient(
+        transport=ASGITransport(app=traced_app), base_url="http://localhost:8081"
+    ) as client:
+        # Not sampled locally, only the request continuing a sampled trace is recorded
+        await client.get("/item/1")
+        response = await client.get(
+            "/item/2", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+        assert response.json() == {"id": 2}
+    exporter.shutdown()
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    spans = [
+        span
+        for line in lines
+        for resource in json.loads(line)["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for span in scope["spans"]
+    ]
+    by_name = {span["name"]: span for span in spans}
+    assert set(by_name) == {
+        "GET /item/{item_id}",
+        "test_tracing.load_item",
+        "test_tracing.current_user",
+    }
+    root = by_name["GET /item/{item_id}"]
+    assert root["traceId"] == TRACE_ID
+    assert root["parentSpanId"] == PARENT_ID
+    assert by_name["test_tracing.load_item"]["parentSpanId"] == root["spanId"]
+    assert by_name["test_tracing.current_user"]["parentSpanId"] == root["spanId"]
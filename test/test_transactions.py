@@ -0,0 +1,108 @@
+from typing import Any
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import transactions
+from app.core.config import config
+from app.core.transactions import (
+    RetryBudget,
+    backoff_delay,
+    retryable_sqlstate,
+    transaction_retries,
+    transaction_retries_exhausted,
+    transactional,
+)
+
+
+class FakeError(Exception):
+    def __init__(self, sqlstate: str) -> None:
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def db_error(sqlstate: str) -> DBAPIError:
+    return DBAPIError("UPDATE cart", {}, FakeError(sqlstate))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "db_retry_base_delay", 0.0)
+    monkeypatch.setattr(config, "db_retry_attempts", 3)
+
+
+def test_retryable_sqlstate() -> None:
+    assert retryable_sqlstate(db_error("40001")) == "40001"
+    assert retryable_sqlstate(db_error("40P01")) == "40P01"
+    assert retryable_sqlstate(db_error("23505")) is None
+    assert retryable_sqlstate(ValueError()) is None
+
+
+def test_backoff_delay() -> None:
+    for attempt in range(1, 10):
+        assert 0 <= backoff_delay(attempt, 0.01, 0.2) <= min(0.2, 0.01 * 2 ** (attempt - 1))
+
+
+def test_retry_budget() -> None:
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+@pytest.mark.asyncio
+async def test_transactional_retries() -> None:
+    calls: list[int] = []
+    errors = [db_error("40P01"), db_error("40001")]
+
+    @transactional("test_retries", budget=RetryBudget(0.1, 10))
+    async def unit(db: AsyncSession, value: int) -> int:
+        calls.append(value)
+        if errors:
+            raise errors.pop(0)
+        return value * 2
+
+    before = transaction_retries.value(("test_retries", "40P01"))
+    assert await unit(AsyncSession(), 21) == 42
+    assert calls == [21, 21, 21]
+    assert transaction_retries.value(("test_retries", "40P01")) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_transactional_limits() -> None:
+    calls = 0
+
+    async def failing(db: AsyncSession) -> Any:
+        nonlocal calls
+        calls += 1
+        raise db_error("40001")
+
+    with pytest.raises(DBAPIError):
+        await transactional("test_attempts", budget=RetryBudget(0.1, 10))(failing)(AsyncSession())
+    assert calls == 3
+    assert transaction_retries_exhausted.value(("test_attempts", "attempts")) >= 1
+
+    calls = 0
+    with pytest.raises(DBAPIError):
+        await transactional("test_budget", budget=RetryBudget(0.1, 1))(failing)(db=AsyncSession())
+    assert calls == 2
+    assert transaction_retries_exhausted.value(("test_budget", "budget")) >= 1
+
+    # Other errors are never retried
+    async def conflict(db: AsyncSession) -> None:
+        nonlocal calls
+        calls += 1
+        raise db_error("23505")
+
+    calls = 0
+    with pytest.raises(DBAPIError):
+        await transactional("test_other")(conflict)(AsyncSession())
+    assert calls == 1
+    assert transactions.retry_budget.tokens <= transactions.retry_budget.capacity